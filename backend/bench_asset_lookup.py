@@ -0,0 +1,102 @@
+"""
+Benchmark of the asset fallback: suffix lookup index vs walking Assets/
+Usage: python bench_asset_lookup.py [--files N] [--lookups N] [--rounds N]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from src.services.asset_lookup import AssetLookup
+
+FOLDERS = ["Backgrounds", "Musics", "Sounds", "Characters", "Avatars", "CG", "Effects", "Old"]
+EXTENSIONS = [".png", ".jpg", ".webp", ".mp3", ".ogg"]
+
+
+def generate_tree(root: Path, rng, files):
+    """Write `files` empty assets spread over nested folders; returns their relative paths."""
+    paths = []
+    for i in range(files):
+        depth = rng.randint(1, 3)
+        folder = "/".join(f"{rng.choice(FOLDERS)}{rng.randint(0, 9)}" for _ in range(depth))
+        paths.append(f"{folder}/asset_{i:06d}{rng.choice(EXTENSIONS)}")
+    for rel in paths:
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+    return paths
+
+
+def walk_find(assets_dir: Path, asset_path: str):
+    """The fallback preview.get_asset used before the index: walk and suffix-match every file."""
+    for root, dirs, files in os.walk(assets_dir):
+        for file in files:
+            if file == asset_path or file.endswith(asset_path):
+                return Path(root) / file
+    return None
+
+
+def list_assets(assets_dir: Path):
+    return [
+        Path(root, file).relative_to(assets_dir).as_posix()
+        for root, dirs, files in os.walk(assets_dir)
+        for file in files
+    ]
+
+
+def timed(func, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the asset lookup index with the Assets/ walk")
+    parser.add_argument("--files", type=int, default=12000)
+    parser.add_argument("--lookups", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        assets_dir = Path(tmp) / "Assets"
+        paths = generate_tree(assets_dir, rng, args.files)
+        # What the walk could resolve: a file name, or the end of one
+        queries = [
+            name if rng.random() < 0.5 else name[len("asset_"):]
+            for name in (rel.rpartition("/")[2] for rel in rng.sample(paths, args.lookups))
+        ]
+        queries.append("missing.png")
+        print(f"{len(paths)} assets, {len(queries)} lookups")
+
+        build_time = timed(lambda: AssetLookup(list_assets(assets_dir)), args.rounds)
+        lookup = AssetLookup(list_assets(assets_dir))
+
+        # Both sides must agree on whether a name resolves, and to a file ending with it
+        for query in queries:
+            walked, indexed = walk_find(assets_dir, query), lookup.find(query)
+            assert (walked is None) == (indexed is None), query
+            assert indexed is None or indexed.endswith(query), (query, indexed)
+
+        def walk_all():
+            for query in queries:
+                walk_find(assets_dir, query)
+
+        def lookup_all():
+            for query in queries:
+                lookup.find(query)
+
+        walk_time = timed(walk_all, args.rounds) / len(queries)
+        lookup_time = timed(lookup_all, args.rounds) / len(queries)
+        print(f"walk     {walk_time * 1e3:9.3f} ms per lookup")
+        print(f"index    {lookup_time * 1e3:9.3f} ms per lookup (build {build_time * 1e3:.1f} ms, walk included)")
+        print(f"speedup  {walk_time / lookup_time:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
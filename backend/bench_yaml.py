@@ -0,0 +1,93 @@
+"""
+Benchmark of the libyaml and pure-Python YAML paths on generated chapters.
+Usage: python bench_yaml.py [--chapters N] [--events N] [--rounds N]
+"""
+import argparse
+import io
+import random
+import time
+
+from src.services import yaml_io
+from src.services.chapter_emitter import ChapterDumper, PureChapterDumper, write_chapter
+
+WORDS = "你好 世界 今天 天气 真好 我们 一起 去 公园 吧 hello world the quick brown fox".split()
+
+
+def generate_chapter(rng, events):
+    def line():
+        return "".join(rng.choice(WORDS) for _ in range(rng.randint(4, 30)))
+
+    chapter = []
+    for i in range(events):
+        kind = rng.choice(["narration", "dialogue", "dialogue", "choices", "set_variable"])
+        if kind == "narration":
+            chapter.append({"type": kind, "text": "\n".join(line() for _ in range(rng.randint(1, 3)))})
+        elif kind == "dialogue":
+            chapter.append({"type": kind, "character": rng.choice(["Alice", "Bob"]), "text": line(), "duration": 1.5})
+        elif kind == "choices":
+            chapter.append({"type": kind, "options": [{"text": line()} for _ in range(3)], "allow_free": False})
+        else:
+            chapter.append({"type": kind, "name": f"var{i % 7}", "value": i})
+    return {"events": chapter}
+
+
+def timed(func, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the YAML backends on generated chapters")
+    parser.add_argument("--chapters", type=int, default=20)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    chapters = [generate_chapter(rng, args.events) for _ in range(args.chapters)]
+    texts = []
+    for chapter in chapters:
+        out = io.StringIO()
+        write_chapter(chapter, out, dumper=PureChapterDumper)
+        texts.append(out.getvalue())
+    size = sum(len(text.encode("utf-8")) for text in texts)
+    print(f"{args.chapters} chapters x {args.events} events, {size / 1e6:.1f} MB of YAML, libyaml={yaml_io.LIBYAML}")
+
+    def dump_with(dumper):
+        def run():
+            for chapter in chapters:
+                write_chapter(chapter, io.StringIO(), dumper=dumper)
+        return run
+
+    def load_with(loader):
+        def run():
+            for text in texts:
+                yaml_io.load(text, loader=loader)
+        return run
+
+    backends = [("pure", PureChapterDumper, yaml_io.PureLoader)]
+    if yaml_io.LIBYAML:
+        backends.insert(0, ("libyaml", ChapterDumper, yaml_io.Loader))
+        # Parity on the benchmark data itself
+        for chapter, text in zip(chapters, texts):
+            out = io.StringIO()
+            write_chapter(chapter, out)
+            assert out.getvalue() == text, "libyaml output differs from the pure-Python emitter"
+
+    results = {}
+    for name, dumper, loader in backends:
+        results[name] = (timed(dump_with(dumper), args.rounds), timed(load_with(loader), args.rounds))
+        dump_time, load_time = results[name]
+        print(f"{name:8} dump {dump_time:7.3f}s ({size / dump_time / 1e6:6.1f} MB/s)  "
+              f"load {load_time:7.3f}s ({size / load_time / 1e6:6.1f} MB/s)")
+    if len(results) == 2:
+        print(f"speedup  dump {results['pure'][0] / results['libyaml'][0]:.1f}x  "
+              f"load {results['pure'][1] / results['libyaml'][1]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
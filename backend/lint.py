@@ -0,0 +1,55 @@
+"""
+Command line linter for scripts in the workspace.
+Usage: python lint.py [script_id ...] [--json] [--warnings]
+Exits with status 1 when any error is found.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+
+from src.services.linter import chapter_linter
+from src.services.workspace import BASE_DIR
+
+
+def format_issue(issue):
+    where = issue["chapter"]
+    if issue["location"]:
+        where += f" {issue['location']}"
+    return f"{where}: {issue['severity']}: {issue['message']} [{issue['rule']}]"
+
+
+async def lint_scripts(script_ids):
+    return {script_id: await chapter_linter.lint(script_id) for script_id in script_ids}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the chapters of workspace scripts")
+    parser.add_argument("scripts", nargs="*", help="script ids (default: every script)")
+    parser.add_argument("--json", action="store_true", help="print the reports as JSON")
+    parser.add_argument("--warnings", action="store_true", help="also print warnings")
+    args = parser.parse_args()
+
+    script_ids = args.scripts or sorted(
+        p.name for p in BASE_DIR.iterdir() if p.is_dir() and (p / "Chapters").is_dir()
+    )
+    missing = [script_id for script_id in script_ids if not (BASE_DIR / script_id).is_dir()]
+    if missing:
+        parser.error(f"script not found: {', '.join(missing)}")
+
+    reports = asyncio.run(lint_scripts(script_ids))
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+    else:
+        for script_id, report in reports.items():
+            print(f"{script_id}: {report['chapters']} chapters, {report['errors']} errors, {report['warnings']} warnings")
+            for issue in report["issues"]:
+                if issue["severity"] == "error" or args.warnings:
+                    print(f"  {format_issue(issue)}")
+    return 1 if any(report["errors"] for report in reports.values()) else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Load test: agent streaming while a large preview is built.
+Starts the API on a local port, streams a paced agent reply (the model is
+replaced by a generator that yields a chunk every --interval ms) and, at
+the same time, requests the full preview of a freshly generated script.
+Reports the gaps between streamed chunks; with every route offloaded they
+should stay close to the interval.
+Usage: python loadtest_offload.py [--chapters N] [--events N] [--previews N]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+# Keep the persisted preview manifest out of the workspace
+os.environ.setdefault("SCRIPT_EDITOR_CACHE_DIR", tempfile.mkdtemp(prefix="loadtest-cache-"))
+
+import httpx
+import uvicorn
+import yaml
+
+from src.main import app
+from src.services.ai_service import ai_service
+from src.services.workspace import BASE_DIR
+
+SCRIPT_ID = "_loadtest"
+
+
+def generate_script(chapters, events):
+    script_dir = BASE_DIR / SCRIPT_ID
+    shutil.rmtree(script_dir, ignore_errors=True)
+    (script_dir / "Chapters").mkdir(parents=True)
+    with open(script_dir / "story_config.yaml", "w", encoding="utf-8") as f:
+        yaml.safe_dump({"script_name": SCRIPT_ID, "intro_chapter": "c0.yaml"}, f)
+    for i in range(chapters):
+        chapter = {"events": [
+            {"type": "dialogue", "character": "Alice", "text": f"第{i}章的第{j}句台词，" * 4}
+            for j in range(events)
+        ] + [{"type": "chapter_end", "end_type": "linear", "next_chapter": f"c{(i + 1) % chapters}.yaml"}]}
+        with open(script_dir / "Chapters" / f"c{i}.yaml", "w", encoding="utf-8") as f:
+            yaml.safe_dump(chapter, f, allow_unicode=True)
+    return script_dir
+
+
+def paced_stream(interval, count):
+    async def chat_stream(messages, tool_handlers):
+        for i in range(count):
+            await asyncio.sleep(interval)
+            yield {"type": "content", "content": f"token {i} "}
+    return chat_stream
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def measure(base_url, chunks, previews):
+    body = {"messages": [{"role": "user", "content": "hi"}], "script_id": SCRIPT_ID,
+            "chapter_path": "c0.yaml", "chapter_content": {"events": []}, "characters": [], "assets": {}}
+    gaps = []
+    preview_times = []
+
+    async def stream():
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            async with client.stream("POST", "/api/agent/chat/stream", json=body) as response:
+                response.raise_for_status()
+                last = time.perf_counter()
+                async for line in response.aiter_lines():
+                    if line.startswith("data:"):
+                        now = time.perf_counter()
+                        gaps.append(now - last)
+                        last = now
+
+    async def preview():
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            # Let the stream get going first
+            await asyncio.sleep(0.2)
+            for _ in range(previews):
+                start = time.perf_counter()
+                response = await client.get(f"/api/preview/{SCRIPT_ID}/data")
+                response.raise_for_status()
+                preview_times.append(time.perf_counter() - start)
+
+    await asyncio.gather(stream(), preview())
+    return gaps[1:], preview_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure agent streaming while a large preview builds")
+    parser.add_argument("--chapters", type=int, default=300)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--previews", type=int, default=3)
+    parser.add_argument("--interval", type=float, default=20, help="ms between streamed chunks")
+    parser.add_argument("--chunks", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"Generating {args.chapters} chapters x {args.events} events ...")
+    script_dir = generate_script(args.chapters, args.events)
+    ai_service.is_configured = lambda: True
+    ai_service.chat_stream = paced_stream(args.interval / 1000, args.chunks)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        gaps, preview_times = asyncio.run(measure(f"http://127.0.0.1:{port}", args.chunks, args.previews))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        shutil.rmtree(script_dir, ignore_errors=True)
+
+    gaps_ms = sorted(gap * 1000 for gap in gaps)
+    p99 = gaps_ms[min(len(gaps_ms) - 1, int(len(gaps_ms) * 0.99))]
+    print(f"preview builds: {', '.join(f'{t:.2f}s' for t in preview_times)}")
+    print(f"stream chunks: {len(gaps_ms) + 1}, interval {args.interval:.0f}ms")
+    print(f"gap median {statistics.median(gaps_ms):.1f}ms  p99 {p99:.1f}ms  max {gaps_ms[-1]:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
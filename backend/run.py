@@ -2,10 +2,13 @@
 Entry point for the Script Editor API server.
 This file is used by PyInstaller to create a standalone executable.
 """
+import multiprocessing
 import uvicorn
 from src.main import app
 
 if __name__ == "__main__":
+    # Worker processes of the offload pools re-run this file when frozen
+    multiprocessing.freeze_support()
     uvicorn.run(
         app,
         host="127.0.0.1",
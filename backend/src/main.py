@@ -1,8 +1,23 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import scripts, assets, characters, preview, agent
+from .routers import scripts, assets, characters, preview, agent, analysis, search
+from .services.chapter_writer import chapter_writer
+from .services.offload import offloader
+from .services.preview_manifest import preview_manifests
+from .services.workspace import workspace_watcher
 
-app = FastAPI(title="Script Editor API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    workspace_watcher.start()
+    yield
+    # Don't lose queued chapter saves on shutdown
+    chapter_writer.shutdown()
+    preview_manifests.shutdown()
+    workspace_watcher.stop()
+    offloader.shutdown()
+
+app = FastAPI(title="Script Editor API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -11,6 +26,7 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Chapter-Version"],
 )
 
 # Include Routers
@@ -19,6 +35,8 @@ app.include_router(assets.router)
 app.include_router(characters.router)
 app.include_router(preview.router)
 app.include_router(agent.router)
+app.include_router(analysis.router)
+app.include_router(search.router)
 
 @app.get("/")
 async def root():
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Any, Dict, Union
+from typing import List, Optional, Any, Dict, Union, Literal
 
 # --- Configuration Models ---
 class ScriptSettings(BaseModel):
@@ -28,6 +28,29 @@ class Event(BaseModel):
 class Chapter(BaseModel):
     events: List[Union[Event, Dict[str, Any]]] 
 
+class EventOperation(BaseModel):
+    op: Literal["insert", "update", "move", "delete"]
+    index: int
+    event: Optional[Dict[str, Any]] = None  # insert / update
+    to: Optional[int] = None  # move: target index after removal
+
+class ChapterPatch(BaseModel):
+    base_version: str
+    operations: List[EventOperation]
+
+class ChapterBatchRequest(BaseModel):
+    paths: Optional[List[str]] = None
+    glob: Optional[str] = None  # matched against paths relative to Chapters/; * stays in one folder, ** spans folders
+
+class ReplaceRequest(BaseModel):
+    find: str
+    replace: str
+    fields: Optional[List[str]] = None  # event fields to rewrite, e.g. character; every text value when omitted
+    whole_value: bool = False  # replace only values equal to `find`
+    paths: Optional[List[str]] = None  # chapters to consider; all when omitted
+    dry_run: bool = True
+    base_versions: Optional[Dict[str, str]] = None  # chapter -> version from the dry run; conflicts abort the apply
+
 class CreateScriptRequest(BaseModel):
     name: str
     description: str
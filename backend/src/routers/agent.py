@@ -2,17 +2,19 @@
 AI Agent Router for Script Editor
 Provides API endpoints for AI-powered script writing assistance
 """
+import copy
 import json
 import os
-import yaml
+from pathlib import Path
 from typing import List, Dict, Any, Optional
 from fastapi import APIRouter, HTTPException, Body
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from ..services.ai_service import ai_service
-
-# Scripts base path
-SCRIPTS_BASE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "scripts")
+from ..services.chapter_writer import chapter_writer
+from ..services.event_schema import EVENT_TYPES
+from ..services.offload import offloader
+from ..services.workspace import BASE_DIR, workspace_watcher
 
 router = APIRouter(
     prefix="/api/agent",
@@ -69,17 +71,16 @@ def set_current_chapter_content(script_id: str, chapter_path: str, content: Dict
 def save_chapter_to_yaml(script_id: str, chapter_path: str, content: Dict[str, Any]) -> bool:
     """Save chapter content to YAML file"""
     try:
-        # Construct the full file path
-        file_path = os.path.join(SCRIPTS_BASE_PATH, script_id, chapter_path)
+        # Construct the full file path (chapter paths are relative to Chapters/)
+        file_path = os.path.join(BASE_DIR, script_id, "Chapters", chapter_path)
         
         # Ensure directory exists
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         
-        # Write to YAML file
-        with open(file_path, 'w', encoding='utf-8') as f:
-            yaml.dump(content, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
-        
-        print(f"[DEBUG] Saved chapter to: {file_path}")
+        # Queue the write; tool calls in a burst end up as one file write.
+        # The session keeps mutating `content`, so hand over a snapshot
+        chapter_writer.save(file_path, copy.deepcopy(content))
+        workspace_watcher.notify([Path(file_path)])
         return True
     except Exception as e:
         print(f"[ERROR] Failed to save chapter: {e}")
@@ -125,7 +126,7 @@ async def handle_append_event(event: Dict[str, Any], chapter_content: Dict[str,
     set_current_chapter_content(script_id, chapter_path, chapter_content)
     
     # Save to YAML file
-    save_success = save_chapter_to_yaml(script_id, chapter_path, chapter_content)
+    save_success = await offloader.run("agent", save_chapter_to_yaml, script_id, chapter_path, chapter_content)
     
     return {
         "success": save_success,
@@ -149,7 +150,7 @@ async def handle_insert_event(index: int, event: Dict[str, Any], chapter_content
     set_current_chapter_content(script_id, chapter_path, chapter_content)
     
     # Save to YAML file
-    save_success = save_chapter_to_yaml(script_id, chapter_path, chapter_content)
+    save_success = await offloader.run("agent", save_chapter_to_yaml, script_id, chapter_path, chapter_content)
     
     return {
         "success": save_success,
@@ -171,7 +172,7 @@ async def handle_update_event(index: int, event: Dict[str, Any], chapter_content
     set_current_chapter_content(script_id, chapter_path, chapter_content)
     
     # Save to YAML file
-    save_success = save_chapter_to_yaml(script_id, chapter_path, chapter_content)
+    save_success = await offloader.run("agent", save_chapter_to_yaml, script_id, chapter_path, chapter_content)
     
     return {
         "success": save_success,
@@ -193,7 +194,7 @@ async def handle_delete_event(index: int, chapter_content: Dict[str, Any], scrip
     set_current_chapter_content(script_id, chapter_path, chapter_content)
     
     # Save to YAML file
-    save_success = save_chapter_to_yaml(script_id, chapter_path, chapter_content)
+    save_success = await offloader.run("agent", save_chapter_to_yaml, script_id, chapter_path, chapter_content)
     
     return {
         "success": save_success,
@@ -379,113 +380,5 @@ async def reset_session(script_id: str, chapter_path: str):
 async def get_event_schema():
     """Get the schema for supported event types"""
     return {
-        "event_types": {
-            "narration": {
-                "description": "叙述文本",
-                "required": ["text"],
-                "fields": {
-                    "text": {"type": "string", "description": "叙述内容"},
-                    "condition": {"type": "string", "description": "变量条件表达式"},
-                    "duration": {"type": "number", "description": "持续时间"}
-                }
-            },
-            "player": {
-                "description": "玩家说话",
-                "required": ["text"],
-                "fields": {
-                    "text": {"type": "string", "description": "玩家说的话"},
-                    "condition": {"type": "string", "description": "变量条件表达式"},
-                    "duration": {"type": "number", "description": "持续时间"}
-                }
-            },
-            "dialogue": {
-                "description": "角色对话",
-                "required": ["character", "text"],
-                "fields": {
-                    "character": {"type": "string", "description": "角色名称"},
-                    "text": {"type": "string", "description": "对话内容"},
-                    "condition": {"type": "string", "description": "变量条件表达式"},
-                    "duration": {"type": "number", "description": "持续时间"}
-                }
-            },
-            "ai_dialogue": {
-                "description": "AI对话（由AI生成的动态对话）",
-                "required": ["character", "prompt"],
-                "fields": {
-                    "character": {"type": "string", "description": "角色名称"},
-                    "prompt": {"type": "string", "description": "给AI的提示"},
-                    "condition": {"type": "string", "description": "变量条件表达式"},
-                    "duration": {"type": "number", "description": "持续时间"}
-                }
-            },
-            "modify_character": {
-                "description": "修改角色（显示/隐藏/移动) 如果当前章节有角色事件但没有show_character的action，需要先显示角色",
-                "required": ["action", "character"],
-                "fields": {
-                    "action": {"type": "string", "enum": ["show_character", "hide_character", "move_character", "shake_character"], "description": "操作类型"},
-                    "character": {"type": "string", "description": "角色名称"},
-                    "emotion": {"type": "string", "description": "表情"},
-                    "condition": {"type": "string", "description": "变量条件表达式"},
-                    "duration": {"type": "number", "description": "持续时间"}
-                }
-            },
-            "background": {
-                "description": "设置背景图片",
-                "required": ["imagePath"],
-                "fields": {
-                    "imagePath": {"type": "string", "description": "背景图片路径"},
-                    "condition": {"type": "string", "description": "变量条件表达式"},
-                    "duration": {"type": "number", "description": "持续时间"}
-                }
-            },
-            "music": {
-                "description": "播放背景音乐",
-                "required": ["musicPath"],
-                "fields": {
-                    "musicPath": {"type": "string", "description": "音乐文件路径"},
-                    "condition": {"type": "string", "description": "变量条件表达式"},
-                    "duration": {"type": "number", "description": "持续时间"}
-                }
-            },
-            "input": {
-                "description": "玩家输入事件",
-                "required": ["hint"],
-                "fields": {
-                    "hint": {"type": "string", "description": "输入提示文字"},
-                    "condition": {"type": "string", "description": "变量条件表达式"},
-                    "duration": {"type": "number", "description": "持续时间"}
-                }
-            },
-            "choices": {
-                "description": "玩家选择事件",
-                "required": ["options", "allow_free"],
-                "fields": {
-                    "options": {"type": "string", "description": "选项列表"},
-                    "allow_free": {"type": "boolean", "description": "是否允许自由输入"},
-                    "condition": {"type": "string", "description": "变量条件表达式"},
-                    "duration": {"type": "number", "description": "持续时间"}
-                }
-            },
-            "set_variable": {
-                "description": "设置变量值",
-                "required": ["name", "value"],
-                "fields": {
-                    "name": {"type": "string", "description": "变量名"},
-                    "value": {"type": "any", "description": "变量值"},
-                    "condition": {"type": "string", "description": "变量条件表达式"},
-                    "duration": {"type": "number", "description": "持续时间"}
-                }
-            },
-            "chapter_end": {
-                "description": "章节结束/跳转",
-                "required": ["end_type", "next_chapter"],
-                "fields": {
-                    "end_type": {"type": "string", "enum": ["linear", "branching", "ai_judged"], "description": "结束类型"},
-                    "next_chapter": {"type": "string", "description": "下一章节路径或'end'"},
-                    "options": {"type": "string", "description": "用于branching/ai_judged的选项列表"},
-                    "condition": {"type": "string", "description": "变量条件表达式"},
-                    "duration": {"type": "number", "description": "持续时间"}
-                }
-            }
-        }
+        "event_types": EVENT_TYPES
     }
@@ -0,0 +1,37 @@
+from pathlib import Path
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, Any, List, Optional
+from ..services.linter import chapter_linter
+from ..services.simulator import MAX_STATES, simulate
+from ..services.workspace import BASE_DIR
+
+router = APIRouter(
+    prefix="/api/analysis",
+    tags=["analysis"]
+)
+
+def get_script_dir(script_id: str) -> Path:
+    script_dir = BASE_DIR / script_id
+    if not script_dir.exists():
+        raise HTTPException(status_code=404, detail="Script not found")
+    return script_dir
+
+@router.get("/{script_id}/simulate")
+async def simulate_script(script_id: str, max_states: int = Query(MAX_STATES, ge=1)) -> Dict[str, Any]:
+    """Play every branch of the script headlessly.
+
+    Reports the reachable endings with path counts and an example route,
+    loops that can never reach an ending, coverage and unreachable events.
+    """
+    get_script_dir(script_id)
+    return await simulate(script_id, max_states)
+
+@router.get("/{script_id}/lint")
+async def lint_script(script_id: str, chapter: Optional[List[str]] = Query(None)) -> Dict[str, Any]:
+    """Check every chapter (or only the given ones) against the schema and the workspace.
+
+    Results are cached per chapter; only chapters that changed, or that
+    refer to characters, assets or chapters that changed, are checked again.
+    """
+    get_script_dir(script_id)
+    return await chapter_linter.lint(script_id, chapter)
@@ -1,213 +1,278 @@
-import os
-import yaml
-import json
 from pathlib import Path
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
-from typing import List, Dict, Any
-import sys
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from typing import Dict, Any, Optional
+from itertools import islice
+from ..services.http_cache import encode_json, json_response, not_modified, quote_etag
+from ..services.offload import offloader
+from ..services.static_files import static_file_response, versioned_url
+from ..services.image_variants import VARIANT_FORMATS, image_variants
+from ..services.sprite_atlas import ATLAS_FORMATS, sprite_atlases
+from ..services.preview_manifest import preview_manifests, read_chapter
+from ..services.story_graph import resolve_chapter, story_graph
+from ..services.chapter_assets import find_asset_file, find_character_image, prefetch_plans
+from ..services.timeline import timelines
+from ..services.workspace import BASE_DIR, directory_generations, workspace_index
 
 router = APIRouter(
     prefix="/api/preview",
     tags=["preview"]
 )
 
-# Determine the base directory for scripts - same logic as scripts.py
-if getattr(sys, 'frozen', False):
-    # Running as compiled exe
-    exe_dir = Path(sys.executable).parent
-    
-    # Try multiple possible locations for scripts folder
-    possible_paths = [
-        exe_dir.parent.parent / "scripts",  # win-unpacked/scripts/ (portable)
-        exe_dir / "scripts",                 # resources/backend/scripts/
-        exe_dir.parent / "scripts",          # resources/scripts/
-    ]
-    
-    BASE_DIR = None
-    for p in possible_paths:
-        # print(f"[Preview] Checking for scripts at: {p}")
-        if p.exists():
-            BASE_DIR = p
-            # print(f"[Preview] Found scripts at: {p}")
-            break
-    
-    if BASE_DIR is None:
-        BASE_DIR = exe_dir.parent.parent / "scripts"
-        # print(f"[Preview] Defaulting scripts path to: {BASE_DIR}")
-else:
-    # Running from source
-    BASE_DIR = Path(__file__).resolve().parent.parent.parent / "scripts"
-    # print(f"[Preview] Running from source. Scripts directory: {BASE_DIR}")
-
 def get_script_dir(script_id: str) -> Path:
     script_dir = BASE_DIR / script_id
     if not script_dir.exists():
         raise HTTPException(status_code=404, detail="Script not found")
     return script_dir
 
-@router.get("/{script_id}/data")
-async def get_preview_data(script_id: str):
-    """Get all data needed for preview: config, chapters, and assets list"""
-    script_dir = get_script_dir(script_id)
-    
-    # Load story config
-    config_path = script_dir / "story_config.yaml"
-    config = {}
-    if config_path.exists():
-        with open(config_path, "r", encoding="utf-8") as f:
-            config = yaml.safe_load(f) or {}
-    
-    # Load all chapters
-    chapters_dir = script_dir / "Chapters"
-    chapters = {}
-    if chapters_dir.exists():
-        for root, dirs, files in os.walk(chapters_dir):
-            for file in files:
-                if file.endswith(".yaml") or file.endswith(".yml"):
-                    full_path = Path(root) / file
-                    rel_path = str(full_path.relative_to(chapters_dir)).replace("\\", "/")
-                    try:
-                        with open(full_path, "r", encoding="utf-8") as f:
-                            chapters[rel_path] = yaml.safe_load(f) or {"events": []}
-                    except Exception as e:
-                        chapters[rel_path] = {"events": [], "error": str(e)}
-    
-    # Get assets (images, music, etc.) from both Assets and Characters folders
-    assets = {}
-    
-    # Scan Assets folder if exists
-    assets_dir = script_dir / "Assets"
-    if assets_dir.exists():
-        for root, dirs, files in os.walk(assets_dir):
-            rel_root = Path(root).relative_to(assets_dir)
-            for file in files:
-                full_rel_path = str((rel_root / file).as_posix())
-                assets[full_rel_path] = f"/api/preview/{script_id}/assets/{full_rel_path}"
-    
-    # Scan Characters folder for avatar images
-    characters_dir = script_dir / "Characters"
-    if characters_dir.exists():
-        for char_folder in characters_dir.iterdir():
-            if char_folder.is_dir():
-                char_name = char_folder.name
-                avatar_dir = char_folder / "avatar"
-                if avatar_dir.exists():
-                    for file in avatar_dir.iterdir():
-                        if file.suffix.lower() in ['.png', '.jpg', '.jpeg', '.gif', '.webp']:
-                            # Store with multiple keys for easy lookup
-                            emotion = file.stem  # filename without extension
-                            key = f"Characters/{char_name}"
-                            assets[key] = f"/api/preview/{script_id}/character/{char_name}"
-                            assets[f"{char_name}"] = f"/api/preview/{script_id}/character/{char_name}"
-                            assets[f"Characters/{char_name}/avatar/{emotion}"] = f"/api/preview/{script_id}/character/{char_name}/{emotion}"
-    
-    # Get character definitions
-    characters = []
-    if characters_dir.exists():
-        for char_folder in characters_dir.iterdir():
-            if char_folder.is_dir():
-                char_name = char_folder.name
-                # Check for settings.txt or any config file
-                settings_file = char_folder / "settings.txt"
-                character_info = {"id": char_name, "name": char_name}
-                
-                # Also add any avatar images info
-                avatar_dir = char_folder / "avatar"
-                if avatar_dir.exists():
-                    emotions = [f.stem for f in avatar_dir.iterdir() if f.suffix.lower() in ['.png', '.jpg', '.jpeg']]
-                    character_info["emotions"] = emotions
-                
-                characters.append(character_info)
-    
+def get_start_chapter(script_id: str, config: Dict[str, Any]) -> Optional[str]:
+    """The intro chapter, or the first chapter when it is missing"""
+    chapters = workspace_index.chapters(script_id)
+    intro = config.get("intro_chapter") if isinstance(config, dict) else None
+    if isinstance(intro, str):
+        resolved = resolve_chapter(intro, set(chapters))
+        if resolved is not None:
+            return resolved
+    return chapters[0] if chapters else None
+
+def build_lazy_preview(script_id: str, since: Optional[int]) -> Optional[Dict[str, Any]]:
+    """Config, assets and characters plus the start chapter only"""
+    data = preview_manifests.get(script_id, since, sections=("config", "assets", "characters"))
+    if data is None:
+        return None
+    if "config" not in data:
+        # Unchanged since `since`, but the start chapter depends on it
+        config = preview_manifests.get(script_id, sections=("config",))
+        if config is None:
+            # The script was removed between the two reads
+            return None
+        data["config"] = config["config"]
+    start = get_start_chapter(script_id, data["config"])
+    chapters_dir = BASE_DIR / script_id / "Chapters"
+    data["lazy"] = True
+    data["start_chapter"] = start
+    data["chapters"] = {start: read_chapter(chapters_dir, start)} if start is not None else {}
+    data["chapter_count"] = len(workspace_index.chapters(script_id))
+    return data
+
+def build_chapter_page(script_id: str, near: Optional[str], offset: int, limit: int) -> Dict[str, Any]:
+    """Chapters ordered by play path distance from `near` (default: the start chapter)"""
+    if near is None:
+        config = preview_manifests.get(script_id, sections=("config",))
+        start = get_start_chapter(script_id, config["config"] if config else {})
+    else:
+        start = resolve_chapter(near, set(workspace_index.chapters(script_id)))
+        if start is None:
+            raise HTTPException(status_code=404, detail="Chapter not found")
+
+    page = list(islice(story_graph.walk(script_id, start), offset, offset + limit + 1))
+    has_more = len(page) > limit
+    page = page[:limit]
+    chapters_dir = BASE_DIR / script_id / "Chapters"
     return {
-        "config": config,
-        "chapters": chapters,
-        "assets": assets,
-        "characters": characters
+        "near": start,
+        "offset": offset,
+        "order": [{"path": path, "distance": distance} for path, distance in page],
+        "chapters": {path: read_chapter(chapters_dir, path) for path, _ in page},
+        "next_offset": offset + limit if has_more else None
     }
 
-@router.get("/{script_id}/assets/{asset_path:path}")
-async def get_asset(script_id: str, asset_path: str):
-    """Serve an asset file"""
-    script_dir = get_script_dir(script_id)
-    asset_file = script_dir / "Assets" / asset_path
+@router.get("/{script_id}/data")
+async def get_preview_data(script_id: str, request: Request, response: Response, since: Optional[int] = None,
+                           lazy: bool = False):
+    """Get all data needed for preview: config, chapters, and assets list.
+
+    With `since` (a `version` from an earlier response) only the entries
+    changed after that version are returned, plus the removed keys. With
+    `lazy` only the start chapter is included; fetch the others from
+    `/chapters`.
+    """
+    get_script_dir(script_id)
     
-    if asset_file.exists():
-        return FileResponse(asset_file)
+    etag = directory_generations.token(script_id, "story_config.yaml", "Chapters", "Assets", "Characters")
+    cached = not_modified(request, response, quote_etag(etag))
+    if cached:
+        return cached
     
-    # Try to find in subdirectories
-    for root, dirs, files in os.walk(script_dir / "Assets"):
-        for file in files:
-            if file == asset_path or file.endswith(asset_path):
-                return FileResponse(Path(root) / file)
+    if lazy:
+        data = await offloader.run("preview", build_lazy_preview, script_id, since)
+    else:
+        data = await offloader.run("preview", preview_manifests.get, script_id, since)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Script not found")
+    # A full manifest can be megabytes; encoding it on the event loop would stall streams
+    return json_response(await offloader.run("preview", encode_json, data), response)
+
+@router.get("/{script_id}/chapters")
+async def get_preview_chapters(script_id: str, request: Request, response: Response,
+                               near: Optional[str] = None,
+                               offset: int = Query(0, ge=0),
+                               limit: int = Query(8, ge=1, le=100)):
+    """Page through chapters nearest to `near` along chapter_end links.
+
+    The first entry is `near` itself, so a jump to a chapter that is not
+    loaded yet fetches it together with the chapters likely to follow.
+    Chapters that cannot be reached come last with a distance of null.
+    """
+    get_script_dir(script_id)
+    
+    etag = directory_generations.token(script_id, "story_config.yaml", "Chapters")
+    cached = not_modified(request, response, quote_etag(etag))
+    if cached:
+        return cached
+    
+    page = await offloader.run("preview", build_chapter_page, script_id, near, offset, limit)
+    return json_response(await offloader.run("preview", encode_json, page), response)
+
+def compile_chapter(compile_fn, script_id: str, chapter_path: str) -> Dict[str, Any]:
+    """Run a per-chapter compile step, mapping missing or unreadable chapters to HTTP errors"""
+    chapter = resolve_chapter(chapter_path, set(workspace_index.chapters(script_id)))
+    if chapter is None:
+        raise HTTPException(status_code=404, detail="Chapter not found")
+    try:
+        return compile_fn(script_id, chapter)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Chapter not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read chapter: {e}")
+
+@router.get("/{script_id}/prefetch/{chapter_path:path}")
+async def get_prefetch_plan(script_id: str, chapter_path: str, request: Request, response: Response):
+    """Assets a chapter needs, in order of first use, with URLs and byte sizes.
+
+    Background, music and character emotion references are resolved like
+    the asset routes resolve them; unresolved ones are listed under
+    `missing`.
+    """
+    get_script_dir(script_id)
+    
+    plan = await offloader.run("preview", compile_chapter, prefetch_plans.plan, script_id, chapter_path)
+    cached = not_modified(request, response, quote_etag(plan["etag"]))
+    if cached:
+        return cached
+    return plan
+
+@router.get("/{script_id}/timeline/{chapter_path:path}")
+async def get_chapter_timeline(script_id: str, chapter_path: str, request: Request, response: Response):
+    """A chapter compiled to a flat timeline.
+
+    Every event carries its normalized `duration`, absolute `start` and
+    `hold` (seconds until the next event), resolved asset URLs and, for
+    character changes, the resulting `stage`.
+    """
+    get_script_dir(script_id)
+    
+    timeline = await offloader.run("preview", compile_chapter, timelines.get, script_id, chapter_path)
+    cached = not_modified(request, response, quote_etag(timeline["etag"]))
+    if cached:
+        return cached
+    return timeline
+
+@router.get("/{script_id}/assets/{asset_path:path}")
+async def get_asset(script_id: str, asset_path: str, request: Request):
+    """Serve an asset file (byte ranges, revalidation and precompressed variants)"""
+    get_script_dir(script_id)
+    asset_file = await offloader.run("assets", find_asset_file, script_id, asset_path)
+    
+    if asset_file is not None:
+        return await offloader.run("assets", static_file_response, request, asset_file)
     
     raise HTTPException(status_code=404, detail=f"Asset not found: {asset_path}")
 
 
 @router.get("/{script_id}/character/{character_id}/{emotion}")
-async def get_character_emotion_image(script_id: str, character_id: str, emotion: str = "正常"):
+async def get_character_emotion_image(script_id: str, character_id: str, request: Request, emotion: str = "正常"):
     """Serve a character emotion image"""
-    script_dir = get_script_dir(script_id)
-    
-    # Try Characters/{character_id}/avatar/{emotion}.png
-    avatar_path = script_dir / "Characters" / character_id / "avatar" / f"{emotion}.png"
-    if avatar_path.exists():
-        return FileResponse(avatar_path)
-    
-    # Try with .jpg extension
-    avatar_path_jpg = script_dir / "Characters" / character_id / "avatar" / f"{emotion}.jpg"
-    if avatar_path_jpg.exists():
-        return FileResponse(avatar_path_jpg)
-    
-    # Fallback to "正常" or first available emotion
-    avatar_dir = script_dir / "Characters" / character_id / "avatar"
-    if avatar_dir.exists():
-        # Try "正常" first as default
-        normal_path = avatar_dir / "正常.png"
-        if normal_path.exists():
-            return FileResponse(normal_path)
-        
-        # Find first available image
-        for file in avatar_dir.iterdir():
-            if file.suffix.lower() in ['.png', '.jpg', '.jpeg', '.gif', '.webp']:
-                return FileResponse(file)
+    get_script_dir(script_id)
+    
+    image_file = await offloader.run("characters", find_character_image, script_id, character_id, emotion)
+    if image_file is not None:
+        return await offloader.run("characters", static_file_response, request, image_file)
     
     raise HTTPException(status_code=404, detail=f"Character image not found: {character_id}/{emotion}")
 
 
 @router.get("/{script_id}/character/{character_id}")
-async def get_character_image(script_id: str, character_id: str):
+async def get_character_image(script_id: str, character_id: str, request: Request):
     """Serve a character's default image"""
-    script_dir = get_script_dir(script_id)
-    
-    # Try Characters/{character_id}/avatar/正常.png (or similar default)
-    avatar_dir = script_dir / "Characters" / character_id / "avatar"
-    
-    if avatar_dir.exists():
-        # Try common default emotions
-        for default_name in ["正常"]:
-            for ext in [".png", ".jpg", ".jpeg"]:
-                default_path = avatar_dir / f"{default_name}{ext}"
-                if default_path.exists():
-                    return FileResponse(default_path)
-        
-        # Fallback to first available image
-        for file in avatar_dir.iterdir():
-            if file.suffix.lower() in ['.png', '.jpg', '.jpeg', '.gif', '.webp']:
-                return FileResponse(file)
+    get_script_dir(script_id)
+    
+    # Characters/{character_id}/avatar/正常.* or the first emotion available
+    image_file = await offloader.run("characters", find_character_image, script_id, character_id)
+    if image_file is not None:
+        return await offloader.run("characters", static_file_response, request, image_file)
     
     raise HTTPException(status_code=404, detail=f"Character image not found: {character_id}")
 
-@router.get("/{script_id}/character/{character_id}/{emotion}")
-async def get_character_image(script_id: str, character_id: str, emotion: str):
-    script_dir = get_script_dir(script_id)
-    avatar_dir = script_dir / "Characters" / character_id / "avatar"
+async def serve_variant(request: Request, source: Path, width: int, fmt: str) -> Response:
+    """Serve a rendered variant of `source`, or `source` itself without Pillow or for non-images"""
+    try:
+        variant = await image_variants.get(source, width, fmt)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to render variant: {str(e)}")
+    return await offloader.run("images", static_file_response, request, variant or source)
+
+@router.get("/{script_id}/variants/assets/{asset_path:path}")
+async def get_asset_variant(script_id: str, asset_path: str, request: Request,
+                            width: int = 256, fmt: str = Query("webp", alias="format")):
+    """Serve an image asset scaled down to `width` and re-encoded as `format`"""
+    get_script_dir(script_id)
+    if fmt not in VARIANT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported variant format: {fmt}")
+    asset_file = await offloader.run("assets", find_asset_file, script_id, asset_path)
+    if asset_file is None:
+        raise HTTPException(status_code=404, detail=f"Asset not found: {asset_path}")
+    return await serve_variant(request, asset_file, width, fmt)
+
+@router.get("/{script_id}/variants/character/{character_id}/{emotion}")
+async def get_character_variant(script_id: str, character_id: str, emotion: str, request: Request,
+                                width: int = 256, fmt: str = Query("webp", alias="format")):
+    """Serve a character emotion image scaled down to `width` and re-encoded as `format`"""
+    get_script_dir(script_id)
+    if fmt not in VARIANT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported variant format: {fmt}")
+    image_file = await offloader.run("characters", find_character_image, script_id, character_id, emotion)
+    if image_file is None:
+        raise HTTPException(status_code=404, detail=f"Character image not found: {character_id}/{emotion}")
+    return await serve_variant(request, image_file, width, fmt)
+
+@router.get("/{script_id}/atlas/{character_id}")
+async def get_character_atlas(script_id: str, character_id: str, request: Request, response: Response,
+                              height: int = 512, fmt: str = Query("png", alias="format")):
+    """Frame map of a sheet holding all of a character's emotion images"""
+    get_script_dir(script_id)
+    if not sprite_atlases.available:
+        raise HTTPException(status_code=501, detail="Sprite atlases require Pillow")
+    if fmt not in ATLAS_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported atlas format: {fmt}")
+    
+    try:
+        frame_map = await sprite_atlases.get(script_id, character_id, height, fmt)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to build atlas: {str(e)}")
+    if frame_map is None:
+        raise HTTPException(status_code=404, detail=f"Character images not found: {character_id}")
     
-    if avatar_dir.exists():
-        for ext in [".png", ".jpg", ".jpeg"]:
-            default_path = avatar_dir / f"{emotion}{ext}"
-            if default_path.exists():
-                return FileResponse(default_path)
+    cached = not_modified(request, response, quote_etag(frame_map["key"]))
+    if cached:
+        return cached
+    
+    sheet_name = frame_map["key"] + ATLAS_FORMATS[fmt][1]
+    sheet_url = f"/api/preview/{script_id}/atlas/{character_id}/{sheet_name}"
+    image_url = await offloader.run("images", versioned_url, sheet_url, sprite_atlases.sheet_path(frame_map["key"], fmt))
+    return dict(frame_map, image=image_url)
 
-    raise HTTPException(status_code=404, detail=f"Character image not found: {character_id}")
\ No newline at end of file
+@router.get("/{script_id}/atlas/{character_id}/{sheet_name}")
+async def get_character_atlas_sheet(script_id: str, character_id: str, sheet_name: str, request: Request):
+    """Serve an atlas sheet by the name given in its frame map"""
+    atlas_key, _, suffix = sheet_name.partition(".")
+    fmt = next((name for name, spec in ATLAS_FORMATS.items() if spec[1] == "." + suffix), None)
+    if fmt is None or not atlas_key or any(c not in "0123456789abcdef" for c in atlas_key):
+        raise HTTPException(status_code=404, detail=f"Atlas not found: {sheet_name}")
+    # Sheets are shared by content; only the character's own frame map names one here
+    if not sprite_atlases.owns(script_id, character_id, atlas_key, fmt):
+        raise HTTPException(status_code=404, detail=f"Atlas not found: {sheet_name}")
+    
+    try:
+        return await offloader.run("images", static_file_response, request, sprite_atlases.sheet_path(atlas_key, fmt))
+    except OSError:
+        raise HTTPException(status_code=404, detail=f"Atlas not found: {sheet_name}")
@@ -1,213 +1,345 @@
 import os
-import sys
-import yaml
 import json
+import asyncio
+import re
 from pathlib import Path
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Optional, Dict, Any
-from ..models import ScriptConfig, Chapter, CreateScriptRequest
-
-# Custom YAML handling for proper formatting
-# 1. Removing null fields and duration with value 0.0, convert duration to number
-def remove_null_fields(obj):
-    if isinstance(obj, dict):
-        result = {}
-        for k, v in obj.items():
-            # Skip null values
-            if v is None:
-                continue
-            # Handle duration field specially
-            if k == 'duration':
-                # Convert to float if it's a string
-                if isinstance(v, str):
-                    try:
-                        v = float(v)
-                    except (ValueError, TypeError):
-                        # drop the invalid value
-                        v = 0.0
-                # Skip if duration is 0 or 0.0
-                if v == 0:
-                    continue
-            result[k] = remove_null_fields(v)
-        return result
-    elif isinstance(obj, list):
-        return [remove_null_fields(item) for item in obj]
-    return obj
-
-
-# 2. Register custom representers
-def str_representer(dumper, data):
-    # Add | if there is multiline string
-    if '\n' in data:
-        return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='|')
-    return dumper.represent_scalar('tag:yaml.org,2002:str', data)
-
-yaml.add_representer(str, str_representer)
-
-# 3. Add blank lines between list items (events) in YAML for better readability
-def format_yaml_with_blank_lines(yaml_str: str) -> str:
-    lines = yaml_str.split('\n')
-    result = []
-    
-    for i, line in enumerate(lines):
-        # Check if this line is a list item (starts with '- ')
-        if line.startswith('- ') and i > 0:
-            # Look back to find if there was a previous list item at the same level
-            prev_idx = i - 1
-            found_previous_list_item = False
-            
-            while prev_idx >= 0:
-                prev_line = lines[prev_idx]
-                if prev_line.startswith('- '):
-                    # Found a previous list item at the same level
-                    found_previous_list_item = True
-                    break
-                elif prev_line.strip() == '':
-                    # Skip blank lines
-                    prev_idx -= 1
-                elif prev_line.startswith('  ') and not prev_line.startswith('- '):
-                    # This is a nested property of a previous list item, keep looking back
-                    prev_idx -= 1
-                elif prev_line == 'events:':
-                    # We've reached the events: header, no previous list item
-                    break
-                else:
-                    # Some other line, stop looking
-                    break
-            
-            # If we found a previous list item, add blank line before this one
-            if found_previous_list_item:
-                result.append('')
-        
-        result.append(line)
-    
-    return '\n'.join(result)
-
-def convert_multiline_strings(obj):
-    if isinstance(obj, dict):
-        return {k: convert_multiline_strings(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_multiline_strings(item) for item in obj]
-    return obj
+from ..models import ScriptConfig, Chapter, CreateScriptRequest, Event, EventOperation, ChapterPatch, ChapterBatchRequest, ReplaceRequest
+from ..services.chapter_cache import chapter_cache
+from ..services.http_cache import not_modified, quote_etag, stat_etag
+from ..services import yaml_io
+from ..services.chapter_writer import chapter_writer
+from ..services.bulk_replace import rewrite_chapter, write_batch
+from ..services.offload import offloader
+from ..services.conditions import check_chapter, iter_conditions
+from ..services.story_graph import story_graph
+from ..services.search_index import search_index
+from ..services.workspace import BASE_DIR, workspace_watcher, script_catalog, directory_generations, workspace_index
 
 router = APIRouter(
     prefix="/api/scripts",
     tags=["scripts"]
 )
 
-# Determine the base directory for scripts
-# When running as PyInstaller exe, look for scripts folder at the main app level
-# When running from source, use the project's scripts folder
-if getattr(sys, 'frozen', False):
-    # Running as compiled exe
-    exe_dir = Path(sys.executable).parent
-    
-    # Try multiple possible locations for scripts folder
-    possible_paths = [
-        exe_dir.parent.parent / "scripts",  # win-unpacked/scripts/ (portable)
-        exe_dir / "scripts",                 # resources/backend/scripts/
-        exe_dir.parent / "scripts",          # resources/scripts/
-    ]
-    
-    BASE_DIR = None
-    for p in possible_paths:
-        # print(f"[Scripts] Checking for scripts at: {p}")
-        if p.exists():
-            BASE_DIR = p
-            # print(f"[Scripts] Found scripts at: {p}")
-            break
-    
-    if BASE_DIR is None:
-        BASE_DIR = exe_dir.parent.parent / "scripts"
-        # print(f"[Scripts] Defaulting scripts path to: {BASE_DIR}")
-else:
-    # Running from source
-    BASE_DIR = Path(__file__).resolve().parent.parent.parent / "scripts"
-    #print(f"[Scripts] Running from source. Scripts directory: {BASE_DIR}")
-
 def get_script_dir(script_id: str) -> Path:
     script_dir = BASE_DIR / script_id
     if not script_dir.exists():
         raise HTTPException(status_code=404, detail="Script not found")
     return script_dir
 
+def find_chapter_file(script_id: str, chapter_path: str) -> Path:
+    chapter_file = get_script_dir(script_id) / "Chapters" / chapter_path
+    
+    if not chapter_file.name.lower().endswith(".yaml") and not chapter_file.name.lower().endswith(".yml"):
+        chapter_file = chapter_file.with_suffix(".yaml")
+
+    if not chapter_file.exists():
+        # Try yml if yaml failed
+        if chapter_file.suffix == ".yaml":
+            chapter_file = chapter_file.with_suffix(".yml")
+        
+        if not chapter_file.exists():
+            raise HTTPException(status_code=404, detail=f"Chapter file not found: {chapter_path}")
+    return chapter_file
+
+def load_chapter_record(chapters_dir: Path, chapter_path: str) -> Dict[str, Any]:
+    """One NDJSON record of a batch fetch: content and version, or the error"""
+    chapter_file = chapters_dir / chapter_path
+    if not chapter_file.name.lower().endswith(".yaml") and not chapter_file.name.lower().endswith(".yml"):
+        chapter_file = chapter_file.with_suffix(".yaml")
+        if not chapter_file.exists():
+            chapter_file = chapter_file.with_suffix(".yml")
+    try:
+        content, version = chapter_cache.load_versioned(chapter_file)
+        return {"path": chapter_path, "version": version, "content": content}
+    except FileNotFoundError:
+        return {"path": chapter_path, "error": f"Chapter file not found: {chapter_path}"}
+    except Exception as e:
+        return {"path": chapter_path, "error": str(e)}
+
+def remove_chapter_file(chapter_file: Path):
+    chapter_writer.discard(chapter_file)
+    chapter_file.unlink()
+    chapter_cache.invalidate(chapter_file)
+
+def apply_event_operations(chapter: Optional[Dict[str, Any]], operations: List[EventOperation]) -> Dict[str, Any]:
+    """Apply ordered event operations to a copy of `chapter`.
+
+    Only the chapter dict and its events list are copied; untouched events
+    are shared with the cached original. Raises ValueError on a bad index
+    or an invalid event, in which case nothing has been changed.
+    """
+    updated = dict(chapter or {})
+    events = list(updated.get("events") or [])
+    
+    for n, operation in enumerate(operations):
+        size = len(events)
+        index = operation.index
+        
+        if operation.op in ("insert", "update") and operation.event is None:
+            raise ValueError(f"Operation {n}: '{operation.op}' requires an event")
+        
+        if operation.op == "insert":
+            if index < 0 or index > size:
+                raise ValueError(f"Operation {n}: invalid index {index}. Chapter has {size} events.")
+            events.insert(index, Event.model_validate(operation.event).model_dump())
+        elif index < 0 or index >= size:
+            raise ValueError(f"Operation {n}: invalid index {index}. Chapter has {size} events.")
+        elif operation.op == "update":
+            events[index] = Event.model_validate(operation.event).model_dump()
+        elif operation.op == "move":
+            if operation.to is None or operation.to < 0 or operation.to >= size:
+                raise ValueError(f"Operation {n}: invalid target index {operation.to}. Chapter has {size} events.")
+            events.insert(operation.to, events.pop(index))
+        elif operation.op == "delete":
+            events.pop(index)
+    
+    updated["events"] = events
+    return updated
+
 @router.get("/", response_model=List[ScriptConfig])
 async def list_scripts():
-    scripts = []
-    if not BASE_DIR.exists():
-        return []
-    
-    for item in BASE_DIR.iterdir():
-        if item.is_dir():
-            config_path = item / "story_config.yaml"
-            if config_path.exists():
-                try:
-                    with open(config_path, "r", encoding="utf-8") as f:
-                        data = yaml.safe_load(f)
-                        if isinstance(data, dict):
-                            data['id'] = item.name
-                            scripts.append(data)
-                except Exception as e:
-                    print(f"Failed to load {config_path}: {e}")
-    return scripts
+    return await offloader.run("scripts", script_catalog.list_scripts)
 
 @router.get("/{script_id}", response_model=ScriptConfig)
-async def get_script(script_id: str):
+async def get_script(script_id: str, request: Request, response: Response):
     script_dir = get_script_dir(script_id)
-    config_path = script_dir / "story_config.yaml"
-    
-    if not config_path.exists():
-         raise HTTPException(status_code=404, detail="Config not found")
 
     try:
-        with open(config_path, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f)
-            data['id'] = script_id
-            return data
+        st = await offloader.run("scripts", os.stat, script_dir / "story_config.yaml")
+    except OSError:
+        raise HTTPException(status_code=404, detail="Config not found")
+    cached = not_modified(request, response, stat_etag(st))
+    if cached:
+        return cached
+
+    try:
+        data = await offloader.run("scripts", script_catalog.get_script, script_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    if data is None:
+         raise HTTPException(status_code=404, detail="Config not found")
+    return data
+
 @router.get("/{script_id}/chapters")
-async def list_chapters(script_id: str):
-    script_dir = get_script_dir(script_id)
+async def list_chapters(script_id: str, request: Request, response: Response):
+    get_script_dir(script_id)
+    
+    cached = not_modified(request, response, quote_etag(directory_generations.token(script_id, "Chapters")))
+    if cached:
+        return cached
 
-    chapters_dir = script_dir / "Chapters"
+    return await offloader.run("chapters", workspace_index.chapters, script_id)
+
+def compile_glob(glob: str) -> re.Pattern:
+    """Regex for a path glob: `*` and `?` stay within one folder, `**` spans folders"""
+    parts = []
+    i, n = 0, len(glob)
+    while i < n:
+        ch = glob[i]
+        if glob.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if glob.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if ch == "*":
+            parts.append("[^/]*")
+        elif ch == "?":
+            parts.append("[^/]")
+        elif ch == "[":
+            end = glob.find("]", i + 2 if glob.startswith("[!", i) or glob.startswith("[]", i) else i + 1)
+            if end == -1:
+                parts.append(re.escape(ch))
+            else:
+                body = glob[i + 1:end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                # A class never matches the folder separator
+                parts.append(f"(?!/)[{body}]")
+                i = end + 1
+                continue
+        else:
+            parts.append(re.escape(ch))
+        i += 1
+    return re.compile("".join(parts))
+
+@router.post("/{script_id}/batch/chapters")
+async def batch_chapters(script_id: str, batch: ChapterBatchRequest):
+    """Stream several chapters as NDJSON, one record per chapter as soon as it is parsed"""
+    chapters_dir = get_script_dir(script_id) / "Chapters"
     
-    if not chapters_dir.exists():
-        return []
+    paths = list(batch.paths or [])
+    if batch.glob:
+        matched = await offloader.run("batch", workspace_index.chapters, script_id)
+        pattern = compile_glob(batch.glob)
+        paths.extend(p for p in matched if pattern.fullmatch(p) and p not in paths)
     
-    chapters = []
-    for root, dirs, files in os.walk(chapters_dir):
-        for file in files:
-            if file.endswith(".yaml") or file.endswith(".yml"):
-                full_path = Path(root) / file
-                rel_path = full_path.relative_to(chapters_dir)
-                chapters.append(str(rel_path).replace("\\", "/"))
-    return chapters
+    async def generate():
+        # The batch route limit bounds how many chapters are parsed at once
+        pending = [offloader.run("batch", load_chapter_record, chapters_dir, p) for p in paths]
+        for next_done in asyncio.as_completed(pending):
+            record = await next_done
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
-@router.get("/{script_id}/chapters/{chapter_path:path}")
-async def get_chapter(script_id: str, chapter_path: str):
-    script_dir = get_script_dir(script_id)
-    chapters_dir = script_dir / "Chapters"
-    chapter_file = chapters_dir / chapter_path
+def check_script_conditions(script_id: str, chapters_dir: Path) -> Dict[str, Any]:
+    """Compile every condition of every chapter; report the ones that fail"""
+    problems = []
+    checked = 0
+    for chapter_path in workspace_index.chapters(script_id):
+        try:
+            chapter = chapter_cache.load(chapters_dir / chapter_path)
+        except Exception as e:
+            problems.append({"chapter": chapter_path, "event": None, "location": None, "condition": None,
+                             "error": f"Failed to read chapter: {e}", "column": None})
+            continue
+        checked += sum(1 for _ in iter_conditions(chapter))
+        problems.extend({"chapter": chapter_path, **problem} for problem in check_chapter(chapter))
+    return {"conditions": checked, "errors": problems}
+
+@router.get("/{script_id}/conditions")
+async def check_conditions(script_id: str, request: Request, response: Response):
+    """Syntax-check the condition expressions of all chapters, with event locations"""
+    chapters_dir = get_script_dir(script_id) / "Chapters"
     
-    if not chapter_file.name.lower().endswith(".yaml") and not chapter_file.name.lower().endswith(".yml"):
-        chapter_file = chapter_file.with_suffix(".yaml")
+    cached = not_modified(request, response, quote_etag(directory_generations.token(script_id, "Chapters")))
+    if cached:
+        return cached
+    
+    return await offloader.run("chapters", check_script_conditions, script_id, chapters_dir)
 
-    if not chapter_file.exists():
-         # Try yml if yaml failed
-         if chapter_file.suffix == ".yaml":
-             chapter_file = chapter_file.with_suffix(".yml")
-         
-         if not chapter_file.exists():
-            raise HTTPException(status_code=404, detail=f"Chapter file not found: {chapter_path}")
+@router.get("/{script_id}/graph")
+async def get_chapter_graph(script_id: str, request: Request, response: Response):
+    """Chapters and the conditional edges between them, for the flow canvas"""
+    get_script_dir(script_id)
+    
+    cached = not_modified(request, response, quote_etag(directory_generations.token(script_id, "Chapters")))
+    if cached:
+        return cached
+    
+    return await offloader.run("chapters", story_graph.graph, script_id)
+
+@router.get("/{script_id}/chapters/{chapter_path:path}")
+async def get_chapter(script_id: str, chapter_path: str, request: Request, response: Response):
+    chapter_file = await offloader.run("chapters", find_chapter_file, script_id, chapter_path)
 
     try:
-        with open(chapter_file, "r", encoding="utf-8") as f:
-            content = yaml.safe_load(f)
-            return content
+        current = await offloader.run("chapters", chapter_cache.version, chapter_file)
+        cached = not_modified(request, response, quote_etag(current))
+        if cached:
+            return cached
+        content, version = await offloader.run("chapters", chapter_cache.load_versioned, chapter_file)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    # Base version for PATCH requests
+    response.headers["X-Chapter-Version"] = version
+    return content
+
+def prepare_replace(script_id: str, chapters_dir: Path, request: ReplaceRequest) -> List[tuple]:
+    """Chapters a replace has to read, with queued saves flushed to disk, and their versions"""
+    candidates = search_index.candidate_chapters(script_id, request.find, request.whole_value)
+    if candidates is None:
+        candidates = workspace_index.chapters(script_id)
+    if request.paths is not None:
+        wanted = set(request.paths)
+        candidates = [p for p in candidates if p in wanted]
+    
+    items = []
+    for chapter_path in candidates:
+        chapter_file = chapters_dir / chapter_path
+        # The workers read the file itself
+        chapter_writer.flush(chapter_file)
+        try:
+            items.append((chapter_path, chapter_file, chapter_cache.version(chapter_file)))
+        except OSError:
+            continue
+    return items
+
+@router.post("/{script_id}/replace")
+async def replace_in_chapters(script_id: str, request: ReplaceRequest):
+    """Find and replace across chapters.
+
+    A dry run streams NDJSON: one record per matching chapter with its
+    changes and a unified diff, then a summary. Otherwise every matching
+    chapter is rewritten in one batch, or none is when a chapter cannot be
+    read or changed since `base_versions` (or since it was read).
+    """
+    chapters_dir = get_script_dir(script_id) / "Chapters"
+    if not request.find:
+        raise HTTPException(status_code=400, detail="find must not be empty")
+    
+    items = await offloader.run("batch", prepare_replace, script_id, chapters_dir, request)
+    versions = {chapter_path: version for chapter_path, _, version in items}
+    jobs = [
+        offloader.run_cpu("batch", rewrite_chapter, str(chapter_file), chapter_path,
+                          request.find, request.replace, request.fields, request.whole_value)
+        for chapter_path, chapter_file, _ in items
+    ]
+    
+    if request.dry_run:
+        async def generate():
+            chapters = replacements = 0
+            for next_done in asyncio.as_completed(jobs):
+                result = await next_done
+                if "error" in result:
+                    yield json.dumps(result, ensure_ascii=False) + "\n"
+                    continue
+                if not result["changes"]:
+                    continue
+                chapters += 1
+                replacements += len(result["changes"])
+                record = {
+                    "chapter": result["chapter"],
+                    "version": versions[result["chapter"]],
+                    "replacements": len(result["changes"]),
+                    "changes": result["changes"],
+                    "diff": result["diff"],
+                }
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+            summary = {"checked": len(items), "chapters": chapters, "replacements": replacements}
+            yield json.dumps({"summary": summary}, ensure_ascii=False) + "\n"
+        
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+    
+    results = await asyncio.gather(*jobs)
+    errors = [result for result in results if "error" in result]
+    if errors:
+        raise HTTPException(status_code=400, detail={"message": "Some chapters could not be read", "errors": errors})
+    
+    changed = [result for result in results if result["text"] is not None]
+    if request.base_versions is not None:
+        conflicts = [r["chapter"] for r in changed if request.base_versions.get(r["chapter"]) != versions[r["chapter"]]]
+        if conflicts:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Chapters were modified since the dry run", "chapters": conflicts}
+            )
+    
+    files = [(chapters_dir / r["chapter"], versions[r["chapter"]], r["text"]) for r in changed]
+    try:
+        new_versions = await offloader.run("batch", write_batch, files)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    workspace_watcher.notify([chapter_file for chapter_file, _, _ in files])
+    
+    return {
+        "status": "success",
+        "chapters": [
+            {"chapter": r["chapter"], "version": new_versions[str(chapters_dir / r["chapter"])], "replacements": len(r["changes"])}
+            for r in changed
+        ],
+        "replacements": sum(len(r["changes"]) for r in changed),
+    }
 
 @router.post("/{script_id}/chapters/{chapter_path:path}")
 async def save_chapter(script_id: str, chapter_path: str, chapter: Chapter):
@@ -218,28 +350,45 @@ async def save_chapter(script_id: str, chapter_path: str, chapter: Chapter):
     if not chapter_file.name.lower().endswith(".yaml") and not chapter_file.name.lower().endswith(".yml"):
         chapter_file = chapter_file.with_suffix(".yaml")
         
-    chapter_file.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        # Queued write: rapid saves of the same chapter are coalesced and the
+        # file is replaced atomically; reads see the new content immediately.
+        # New files are written right away, so this runs off the event loop
+        await offloader.run("chapters", chapter_file.parent.mkdir, parents=True, exist_ok=True)
+        version = await offloader.run("chapters", chapter_writer.save, chapter_file, chapter.model_dump())
+        workspace_watcher.notify([chapter_file])
+        return {"status": "success", "version": version}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.patch("/{script_id}/chapters/{chapter_path:path}")
+async def patch_chapter(script_id: str, chapter_path: str, patch: ChapterPatch):
+    """Apply event-level edits (insert / update / move / delete by index)"""
+    chapter_file = await offloader.run("chapters", find_chapter_file, script_id, chapter_path)
     
     try:
-        chapter_data = chapter.model_dump()
-        
-        # 1. Remove all null fields from events
-        chapter_data = remove_null_fields(chapter_data)
-        
-        # 2. Convert multiline strings to use literal block scalar
-        chapter_data = convert_multiline_strings(chapter_data)
-        
-        # Generate YAML string first
-        yaml_str = yaml.dump(chapter_data, allow_unicode=True, sort_keys=False, default_flow_style=False)
-        
-        # Add blank lines between events for readability
-        yaml_str = format_yaml_with_blank_lines(yaml_str)
-        
-        with open(chapter_file, "w", encoding="utf-8") as f:
-            f.write(yaml_str)
-        return {"status": "success"}
+        content, version = await offloader.run("chapters", chapter_cache.load_versioned, chapter_file)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if patch.base_version != version:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Chapter was modified since base_version", "version": version}
+        )
+    
+    try:
+        updated = apply_event_operations(content, patch.operations)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        version = await offloader.run("chapters", chapter_writer.save, chapter_file, updated)
+        workspace_watcher.notify([chapter_file])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return {"status": "success", "version": version, "total_events": len(updated["events"])}
 
 @router.delete("/{script_id}/chapters/{chapter_path:path}")
 async def delete_chapter(script_id: str, chapter_path: str):
@@ -249,25 +398,72 @@ async def delete_chapter(script_id: str, chapter_path: str):
     if not chapters_dir.exists():
         raise HTTPException(status_code=404, detail="Chapters directory not found")
     
-    chapter_file = chapters_dir / chapter_path
-    
-    if not chapter_file.name.lower().endswith(".yaml") and not chapter_file.name.lower().endswith(".yml"):
-        chapter_file = chapter_file.with_suffix(".yaml")
-    
-    if not chapter_file.exists():
-        # Try .yml extension if .yaml didn't work
-        if chapter_file.suffix == ".yaml":
-            chapter_file = chapter_file.with_suffix(".yml")
-        
-        if not chapter_file.exists():
-            raise HTTPException(status_code=404, detail=f"Chapter file not found: {chapter_path}")
+    chapter_file = await offloader.run("chapters", find_chapter_file, script_id, chapter_path)
     
     try:
-        chapter_file.unlink()
+        await offloader.run("chapters", remove_chapter_file, chapter_file)
+        workspace_watcher.notify([chapter_file])
         return {"status": "success", "message": f"Chapter {chapter_path} deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete chapter: {str(e)}")
 
+@router.post("/flush")
+async def flush_chapters():
+    """Write every queued chapter save to disk now"""
+    result = await offloader.run("chapters", chapter_writer.flush)
+    if result["errors"]:
+        raise HTTPException(status_code=500, detail=result["errors"])
+    return {"status": "success", "written": result["written"]}
+
+def create_script_files(request: CreateScriptRequest, script_dir: Path) -> Path:
+    """Lay out a new script folder and return the path of its story_config.yaml"""
+    script_name = request.name
+    
+    # Create directory structure
+    script_dir.mkdir(parents=True, exist_ok=True)
+
+    # Create subdirectories
+    (script_dir / "Assets").mkdir(exist_ok=True)
+
+    # Create Assets subdirectories
+    (script_dir / "Assets" / "Backgrounds").mkdir(exist_ok=True)
+    (script_dir / "Assets" / "Musics").mkdir(exist_ok=True)
+    (script_dir / "Assets" / "Sounds").mkdir(exist_ok=True)
+
+    (script_dir / "Characters").mkdir(exist_ok=True)
+    (script_dir / "Chapters").mkdir(exist_ok=True)
+
+    # Create the intro chapter directory and file
+    intro_chapter_path = Path(request.intro_chapter)
+    intro_chapter_dir = script_dir / "Chapters" / intro_chapter_path.parent
+    intro_chapter_dir.mkdir(parents=True, exist_ok=True)
+
+    # Create empty YAML file for the intro chapter
+    intro_chapter_file = intro_chapter_dir / intro_chapter_path.name
+    if not intro_chapter_file.suffix:
+        intro_chapter_file = intro_chapter_file.with_suffix(".yaml")
+
+    # Create empty chapter with events array
+    empty_chapter = {"events": []}
+    with open(intro_chapter_file, "w", encoding="utf-8") as f:
+        yaml_io.dump(empty_chapter, f)
+
+    # Create story_config.yaml with the specified format
+    story_config_path = script_dir / "story_config.yaml"
+    story_config = {
+        "script_name": script_name,
+        "intro_chapter": request.intro_chapter,
+        "description": request.description,
+        "script_settings": {
+            "user_name": request.user_name,
+            "user_subtitle": request.user_subtitle
+        }
+    }
+
+    with open(story_config_path, "w", encoding="utf-8") as f:
+        yaml_io.dump(story_config, f)
+    return story_config_path
+
 @router.post("/create")
 async def create_script(request: CreateScriptRequest):
     script_name = request.name
@@ -278,50 +474,8 @@ async def create_script(request: CreateScriptRequest):
         raise HTTPException(status_code=400, detail="Script with this name already exists")
     
     try:
-        # Create directory structure
-        script_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Create subdirectories
-        (script_dir / "Assets").mkdir(exist_ok=True)
-
-        # Create Assets subdirectories
-        (script_dir / "Assets" / "Backgrounds").mkdir(exist_ok=True)
-        (script_dir / "Assets" / "Musics").mkdir(exist_ok=True)
-        (script_dir / "Assets" / "Sounds").mkdir(exist_ok=True)
-
-        (script_dir / "Characters").mkdir(exist_ok=True)
-        (script_dir / "Chapters").mkdir(exist_ok=True)
-        
-        # Create the intro chapter directory and file
-        intro_chapter_path = Path(request.intro_chapter)
-        intro_chapter_dir = script_dir / "Chapters" / intro_chapter_path.parent
-        intro_chapter_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Create empty YAML file for the intro chapter
-        intro_chapter_file = intro_chapter_dir / intro_chapter_path.name
-        if not intro_chapter_file.suffix:
-            intro_chapter_file = intro_chapter_file.with_suffix(".yaml")
-        
-        # Create empty chapter with events array
-        empty_chapter = {"events": []}
-        with open(intro_chapter_file, "w", encoding="utf-8") as f:
-            yaml.dump(empty_chapter, f, allow_unicode=True, sort_keys=False)
-        
-        # Create story_config.yaml with the specified format
-        story_config_path = script_dir / "story_config.yaml"
-        story_config = {
-            "script_name": script_name,
-            "intro_chapter": request.intro_chapter,
-            "description": request.description,
-            "script_settings": {
-                "user_name": request.user_name,
-                "user_subtitle": request.user_subtitle
-            }
-        }
-        
-        with open(story_config_path, "w", encoding="utf-8") as f:
-            yaml.dump(story_config, f, allow_unicode=True, sort_keys=False, default_flow_style=False)
-
+        story_config_path = await offloader.run("scripts", create_script_files, request, script_dir)
+        workspace_watcher.notify([script_dir, story_config_path])
         
         return {
             "status": "success",
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, Any, Optional
+from ..services.offload import offloader
+from ..services.search_index import search_index
+from ..services.workspace import BASE_DIR
+
+router = APIRouter(
+    prefix="/api/search",
+    tags=["search"]
+)
+
+@router.get("")
+async def search_events(
+    q: str = Query(..., min_length=1),
+    script: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+) -> Dict[str, Any]:
+    """Search the text, prompts, hints and options of every event.
+
+    Every term of the query must appear in an event; results are ranked
+    and point at the script, chapter and event index.
+    """
+    if script is not None and not (BASE_DIR / script).exists():
+        raise HTTPException(status_code=404, detail="Script not found")
+    return await offloader.run("search", search_index.search, q, script, limit, offset)
@@ -0,0 +1,64 @@
+"""
+Lookup index for asset paths that do not match a file exactly
+Answers "which asset does this name refer to" with a dictionary hit on the
+basename or a binary search over reversed paths, instead of walking Assets/
+"""
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional
+
+
+class AssetLookup:
+    """Asset files (relative to Assets/) indexed by basename and by suffix.
+
+    Suffix matches are plain string suffixes of the relative path, so
+    `room.png` finds `Backgrounds/myroom.png` and `Backgrounds/room.png`
+    finds `Old/Backgrounds/room.png`. An exact basename beats a suffix
+    match, and ties are broken by sort order so answers are stable.
+    """
+
+    def __init__(self, paths: Iterable[str] = ()):
+        self._by_name: Dict[str, List[str]] = {}
+        self._reversed: List[str] = []
+        for path in paths:
+            self._by_name.setdefault(path.rpartition("/")[2], []).append(path)
+            self._reversed.append(path[::-1])
+        for names in self._by_name.values():
+            names.sort()
+        self._reversed.sort()
+
+    def __len__(self) -> int:
+        return len(self._reversed)
+
+    def add(self, path: str):
+        reversed_path = path[::-1]
+        i = bisect_left(self._reversed, reversed_path)
+        if i < len(self._reversed) and self._reversed[i] == reversed_path:
+            return
+        self._reversed.insert(i, reversed_path)
+        insort(self._by_name.setdefault(path.rpartition("/")[2], []), path)
+
+    def remove(self, path: str):
+        reversed_path = path[::-1]
+        i = bisect_left(self._reversed, reversed_path)
+        if i == len(self._reversed) or self._reversed[i] != reversed_path:
+            return
+        del self._reversed[i]
+        name = path.rpartition("/")[2]
+        names = self._by_name[name]
+        names.remove(path)
+        if not names:
+            del self._by_name[name]
+
+    def find(self, asset_path: str) -> Optional[str]:
+        """Best match for `asset_path`: exact basename first, then any path ending with it."""
+        asset_path = asset_path.replace("\\", "/").strip("/")
+        if not asset_path:
+            return None
+        names = self._by_name.get(asset_path)
+        if names:
+            return names[0]
+        key = asset_path[::-1]
+        i = bisect_left(self._reversed, key)
+        if i < len(self._reversed) and self._reversed[i].startswith(key):
+            return self._reversed[i][::-1]
+        return None
@@ -0,0 +1,267 @@
+"""
+Find and replace across the chapters of a script
+Chapters that may contain the literal are looked up in the search index,
+parsed and rewritten in the worker pool, and either reported as unified
+diffs (dry run) or written back together: every new file is staged next to
+its chapter first and only then moved into place, after checking that no
+chapter changed since it was read. Only the changed scalars are rewritten
+in the file text, so comments, quoting and key order survive a replace
+"""
+import copy
+import difflib
+import io
+import os
+import stat
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import yaml
+from yaml.emitter import Emitter
+from yaml.nodes import MappingNode, ScalarNode, SequenceNode
+from yaml.resolver import Resolver
+
+from . import yaml_io
+from .chapter_cache import chapter_cache, stat_version
+from .chapter_emitter import write_chapter
+
+# Fields left alone unless asked for by name: rewriting them changes what an event is
+PROTECTED_FIELDS = ("type",)
+
+# Only used to tell which styles a new value can be written in
+_analyzer = Emitter(None, allow_unicode=True)
+
+
+def replace_values(chapter: Any, find: str, replace: str, fields: Optional[Sequence[str]] = None,
+                   whole_value: bool = False) -> List[Dict[str, Any]]:
+    """Replace `find` in the string values of a parsed chapter's events, in place.
+
+    Only values stored under one of `fields` (at any depth, e.g. `name`
+    inside option actions) are touched when given. With `whole_value`,
+    only values equal to `find` are replaced. Returns one
+    `{event, location, field, before, after}` per changed value.
+    """
+    changes: List[Dict[str, Any]] = []
+    events = chapter.get("events") if isinstance(chapter, dict) else None
+    if not isinstance(events, list) or not find:
+        return changes
+    for index, event in enumerate(events):
+        stack: List[Tuple[str, Any]] = [(f"events[{index}]", event)]
+        while stack:
+            location, node = stack.pop()
+            if isinstance(node, dict):
+                items = list(node.items())
+            elif isinstance(node, list):
+                items = list(enumerate(node))
+            else:
+                continue
+            for key, value in reversed(items):
+                path = f"{location}.{key}" if isinstance(node, dict) else f"{location}[{key}]"
+                if isinstance(value, (dict, list)):
+                    stack.append((path, value))
+                    continue
+                if not isinstance(value, str) or not isinstance(node, dict):
+                    continue
+                if fields is not None:
+                    if key not in fields:
+                        continue
+                elif key in PROTECTED_FIELDS:
+                    continue
+                if whole_value:
+                    if value != find:
+                        continue
+                    new_value = replace
+                elif find in value:
+                    new_value = value.replace(find, replace)
+                else:
+                    continue
+                node[key] = new_value
+                changes.append({"event": index, "location": path, "field": key, "before": value, "after": new_value})
+    changes.sort(key=lambda change: change["event"])
+    return changes
+
+
+def _emit(chapter: Any) -> str:
+    out = io.StringIO()
+    write_chapter(chapter, out)
+    return out.getvalue()
+
+
+def _changed_scalars(node: Any, before: Any, after: Any, loader: Any) -> List[Tuple[ScalarNode, str, bool]]:
+    """`(node, new value, inside a flow collection)` of the scalars whose value differs."""
+    found: Dict[int, Tuple[ScalarNode, str, bool]] = {}
+    stack = [(node, before, after, False)]
+    while stack:
+        node, before, after, flow = stack.pop()
+        if isinstance(node, (MappingNode, SequenceNode)):
+            flow = flow or bool(node.flow_style)
+        if isinstance(node, MappingNode) and isinstance(before, dict) and isinstance(after, dict):
+            # The last of duplicate keys is the one that was loaded
+            values = {}
+            for key_node, value_node in node.value:
+                try:
+                    values[loader.construct_object(key_node, deep=True)] = value_node
+                except (TypeError, yaml.YAMLError):
+                    continue
+            stack.extend((value_node, before[key], after[key], flow)
+                         for key, value_node in values.items() if key in before and key in after)
+        elif isinstance(node, SequenceNode) and isinstance(before, list) and isinstance(after, list):
+            stack.extend((item, old, new, flow) for item, old, new in zip(node.value, before, after))
+        elif isinstance(node, ScalarNode) and isinstance(after, str) and before != after:
+            # Aliases share their anchor's node
+            found[id(node)] = (node, after, flow)
+    return list(found.values())
+
+
+def _plain_str(value: str) -> bool:
+    return Resolver().resolve(ScalarNode, value, (True, False)) == "tag:yaml.org,2002:str"
+
+
+def _double_quoted(value: str) -> str:
+    text = yaml.dump(value, Dumper=yaml.SafeDumper, default_style='"', allow_unicode=True, width=float("inf"))
+    return text.rstrip("\n")
+
+
+def _literal_block(original: str, value: str) -> Optional[str]:
+    """`value` as a literal block in place of `original` (header and content lines only)."""
+    lines = original.split("\n")
+    chomping = lines[0].split("#", 1)[0].strip()[1:]
+    content = [line for line in lines[1:] if line.strip()]
+    if not content or chomping not in ("", "-") or not value or value[0] in " \t":
+        return None
+    if "\r" in value or not _analyzer.analyze_scalar(value).allow_block:
+        return None
+    # Clipped blocks end with exactly one line break, stripped ones with none
+    body = value.rstrip("\n")
+    if not body or len(value) - len(body) != (0 if chomping == "-" else 1):
+        return None
+    indent = content[0][:len(content[0]) - len(content[0].lstrip(" "))]
+    return lines[0] + "".join("\n" + (indent + line if line else "") for line in body.split("\n"))
+
+
+def _scalar_text(node: ScalarNode, original: str, value: str, flow: bool) -> Tuple[str, str]:
+    """The part of `original` a new value replaces, and its new source text.
+
+    The scalar keeps its style when the value can be written in it, and is
+    double-quoted otherwise.
+    """
+    if node.style in ("|", ">"):
+        # Block scalars run until the next token; keep the trailing blank lines
+        lines = original.split("\n")
+        last = max((i for i, line in enumerate(lines) if line.strip()), default=0)
+        original = "\n".join(lines[:last + 1])
+        if node.style == "|":
+            block = _literal_block(original, value)
+            if block is not None:
+                return original, block
+        return original, _double_quoted(value)
+    analysis = _analyzer.analyze_scalar(value)
+    # libyaml reports plain scalars with an empty style
+    plain = analysis.allow_flow_plain if flow else analysis.allow_block_plain
+    if not node.style and plain and not analysis.multiline and _plain_str(value):
+        return original, value
+    if node.style == "'" and analysis.allow_single_quoted and not analysis.multiline:
+        return original, "'" + value.replace("'", "''") + "'"
+    return original, _double_quoted(value)
+
+
+def splice_scalars(text: str, updated: Any) -> Optional[str]:
+    """`text` with every scalar whose value differs from `updated` rewritten in place.
+
+    Comments, quoting styles and key order are kept. Returns None when the
+    document cannot be patched this way (e.g. the result would not load
+    back as `updated`).
+    """
+    loader = yaml_io.Loader(text)
+    try:
+        node = loader.get_single_node()
+        if node is None:
+            return None
+        data = loader.construct_document(node)
+        edits = []
+        for scalar, value, flow in _changed_scalars(node, data, updated, loader):
+            start, end = scalar.start_mark.index, scalar.end_mark.index
+            original, new = _scalar_text(scalar, text[start:end], value, flow)
+            edits.append((start, start + len(original), new))
+    finally:
+        loader.dispose()
+    for start, end, new in sorted(edits, reverse=True):
+        text = text[:start] + new + text[end:]
+    try:
+        if yaml_io.load(text) != updated:
+            return None
+    except yaml.YAMLError:
+        return None
+    return text
+
+
+def rewrite_chapter(path: str, chapter: str, find: str, replace: str, fields: Optional[List[str]],
+                    whole_value: bool) -> Dict[str, Any]:
+    """Parse a chapter file and rewrite it; runs in the worker pool.
+
+    Returns `{chapter, changes, diff, text}` where `text` is the new file
+    content (None when nothing matched) and `diff` a unified diff of the
+    file as it is and as it would be written; `{chapter, error}` when the
+    file cannot be read. The new content is the file with the changed
+    values rewritten in place, or the whole chapter re-emitted when that
+    is not possible.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            before = f.read()
+        data = yaml_io.load(before) or {"events": []}
+    except Exception as e:
+        return {"chapter": chapter, "error": str(e)}
+    updated = copy.deepcopy(data)
+    changes = replace_values(updated, find, replace, fields, whole_value)
+    if not changes:
+        return {"chapter": chapter, "changes": [], "diff": "", "text": None}
+    after = splice_scalars(before, updated)
+    if after is None:
+        after = _emit(updated)
+    diff = "".join(difflib.unified_diff(
+        before.splitlines(keepends=True), after.splitlines(keepends=True),
+        fromfile=f"a/{chapter}", tofile=f"b/{chapter}",
+    ))
+    return {"chapter": chapter, "changes": changes, "diff": diff, "text": after}
+
+
+def write_batch(files: List[Tuple[Path, str, str]]) -> Dict[str, str]:
+    """Replace several files together: `(path, expected version, new text)` each.
+
+    Every file is written to a temp file beside it first; if staging fails
+    or any file's version no longer matches, nothing is replaced and
+    ValueError (version conflict) or OSError is raised. Returns the new
+    version of each path.
+    """
+    staged: List[Tuple[Path, str]] = []
+    try:
+        for path, _, text in files:
+            try:
+                mode = stat.S_IMODE(os.stat(path).st_mode)
+            except OSError:
+                mode = 0o644
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+            staged.append((path, tmp_path))
+            os.chmod(tmp_path, mode)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+        conflicts = [str(path) for path, version, _ in files if chapter_cache.version(path) != version]
+        if conflicts:
+            raise ValueError(f"Chapters were modified during the replace: {', '.join(conflicts)}")
+        for path, tmp_path in staged:
+            os.replace(tmp_path, path)
+    except BaseException:
+        for _, tmp_path in staged:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+        raise
+
+    versions = {}
+    for path, _ in staged:
+        # The cached parse is stale; the next read picks up the new file
+        chapter_cache.invalidate(path)
+        versions[str(path)] = stat_version(os.stat(path))
+    return versions
@@ -0,0 +1,163 @@
+"""
+Assets a chapter uses
+Resolves the background, music and character emotion references of chapter
+events the way the preview serves them, and compiles per-chapter prefetch
+plans: every asset once, in order of first use, with its URL and size.
+Plans are cached per chapter version and asset/character folder generation
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .chapter_cache import chapter_cache
+from .fs_watcher import DirectoryGenerations
+from .static_files import versioned_url
+from .workspace import BASE_DIR, directory_generations, workspace_index
+
+# Folder the preview prepends to an event's path, by reference kind
+PATH_PREFIXES = {"background": "Backgrounds/", "music": "Musics/"}
+# Shown from the frontend's own files, never fetched from the script
+BUILTIN_CHARACTERS = ("MAIN",)
+
+
+def find_asset_file(script_id: str, asset_path: str) -> Optional[Path]:
+    """Asset file for `asset_path`: the exact file, else the closest name or path suffix"""
+    assets_dir = BASE_DIR / script_id / "Assets"
+    asset_file = assets_dir / asset_path
+    if asset_file.is_file():
+        return asset_file
+
+    # Try to find in subdirectories by name or path suffix
+    match = workspace_index.find_asset(script_id, asset_path)
+    if match is not None:
+        return assets_dir / match
+    return None
+
+
+def find_character_image(script_id: str, character_id: str, emotion: Optional[str] = None) -> Optional[Path]:
+    """Image backing an emotion (or the default one) according to the workspace index"""
+    file = workspace_index.avatar_set(script_id, character_id).resolve(emotion)
+    if file is None:
+        return None
+    return BASE_DIR / script_id / "Characters" / character_id / "avatar" / file
+
+
+def asset_references(chapter: Any) -> List[Tuple[int, str, str, Optional[str]]]:
+    """`(event index, kind, path or character, emotion)` for each asset an event shows.
+
+    Kinds are "background", "music" and "character"; only character
+    references carry an emotion (None for the default image).
+    """
+    refs = []
+    events = chapter.get("events") if isinstance(chapter, dict) else None
+    for index, event in enumerate(events or []):
+        if not isinstance(event, dict):
+            continue
+        event_type = event.get("type")
+        if event_type == "background" and event.get("imagePath"):
+            refs.append((index, "background", str(event["imagePath"]), None))
+        elif event_type == "music" and event.get("musicPath"):
+            refs.append((index, "music", str(event["musicPath"]), None))
+        elif event_type == "modify_character" and event.get("character"):
+            character = str(event["character"])
+            emotion = event.get("emotion")
+            if character in BUILTIN_CHARACTERS:
+                continue
+            if emotion or event.get("action") == "show_character":
+                refs.append((index, "character", character, str(emotion) if emotion else None))
+    return refs
+
+
+def resolve_reference(script_id: str, kind: str, ref: str, emotion: Optional[str] = None) -> Tuple[str, Optional[str], Optional[Path]]:
+    """`(manifest key, versioned URL, file)` of a reference; URL and file are None when missing.
+
+    Keys are the ones the preview manifest uses, so a client can look the
+    asset up in its `assets` map as well.
+    """
+    if kind == "character":
+        if emotion:
+            key = f"Characters/{ref}/avatar/{emotion}"
+            url = f"/api/preview/{script_id}/character/{ref}/{emotion}"
+        else:
+            key = f"Characters/{ref}"
+            url = f"/api/preview/{script_id}/character/{ref}"
+        path = find_character_image(script_id, ref, emotion)
+    else:
+        key = PATH_PREFIXES[kind] + ref.replace("\\", "/").lstrip("/")
+        url = f"/api/preview/{script_id}/assets/{key}"
+        path = find_asset_file(script_id, key)
+    if path is None:
+        return key, None, None
+    return key, versioned_url(url, path), path
+
+
+class PrefetchPlans:
+    """Prefetch plans per chapter, rebuilt when the chapter or the script's assets change."""
+
+    def __init__(self, base_dir: Path, generations: DirectoryGenerations):
+        self.base_dir = base_dir
+        self._generations = generations
+        self._lock = threading.Lock()
+        self._plans: Dict[Tuple[str, str], Tuple[str, Dict[str, Any]]] = {}
+
+    def _build(self, script_id: str, chapter: str, data: Any, version: str) -> Dict[str, Any]:
+        planned: Dict[str, Dict[str, Any]] = {}
+        missing: Dict[str, Dict[str, Any]] = {}
+        for index, kind, ref, emotion in asset_references(data):
+            key, url, path = resolve_reference(script_id, kind, ref, emotion)
+            entry = planned.get(key) or missing.get(key)
+            if entry is not None:
+                entry["uses"] += 1
+                continue
+            entry = {"key": key, "kind": kind, "first_use": index, "uses": 1}
+            if kind == "character":
+                entry["character"] = ref
+                entry["emotion"] = emotion
+            try:
+                size = os.stat(path).st_size if path is not None else None
+            except OSError:
+                size = None
+            if size is None:
+                missing[key] = entry
+                continue
+            entry["url"] = url
+            entry["size"] = size
+            planned[key] = entry
+
+        assets = list(planned.values())
+        return {
+            "chapter": chapter,
+            "version": version,
+            "assets": assets,
+            "missing": list(missing.values()),
+            "total_bytes": sum(entry["size"] for entry in assets),
+        }
+
+    def plan(self, script_id: str, chapter: str) -> Dict[str, Any]:
+        """Prefetch plan of a chapter (relative to Chapters/).
+
+        Assets are listed once, ordered by the index of the first event that
+        uses them; references that resolve to no file are listed under
+        `missing`. The plan's `etag` changes whenever it may have. Raises
+        OSError when the chapter cannot be read. Blocking; run it through
+        the offloader.
+        """
+        path = self.base_dir / script_id / "Chapters" / chapter
+        token = self._generations.token(script_id, "Assets", "Characters")
+        version = chapter_cache.version(path)
+        key = (script_id, chapter)
+        with self._lock:
+            cached = self._plans.get(key)
+        if cached is not None and cached[0] == f"{version}.{token}":
+            return cached[1]
+
+        data, version = chapter_cache.load_versioned(path)
+        plan = self._build(script_id, chapter, data, version)
+        plan["etag"] = f"{version}.{token}"
+        with self._lock:
+            self._plans[key] = (plan["etag"], plan)
+        return plan
+
+
+prefetch_plans = PrefetchPlans(BASE_DIR, directory_generations)
@@ -0,0 +1,202 @@
+"""
+Shared cache of parsed chapter YAML
+Entries are keyed by the resolved file path and validated against mtime/size,
+and the least recently used chapters are evicted once the memory budget is hit.
+Chapters with a queued write are pinned and served from memory until the
+write lands on disk
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Tuple, Union
+
+from .offload import offloader
+
+# Memory budget for parsed chapters, in megabytes
+CHAPTER_CACHE_MB = float(os.environ.get("SCRIPT_EDITOR_CHAPTER_CACHE_MB", "64"))
+
+PathLike = Union[str, Path]
+
+# Tags save versions so tokens handed out by a previous run never match
+_PROCESS_TAG = os.urandom(3).hex()
+
+
+def estimate_size(obj: Any) -> int:
+    """Rough in-memory size of a parsed YAML document (dicts, lists, scalars)."""
+    size = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+    return size
+
+
+def stat_version(st: os.stat_result) -> str:
+    """Version token of a chapter file as found on disk."""
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+class _CacheEntry:
+    __slots__ = ("mtime_ns", "size", "data", "cost", "version", "pending")
+
+    def __init__(self, mtime_ns: int, size: int, data: Any, cost: int, version: str, pending: bool = False):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.data = data
+        self.cost = cost
+        self.version = version
+        self.pending = pending
+
+
+class ChapterCache:
+    """LRU of parsed chapters bounded by an estimated byte budget.
+
+    Cached documents are shared between callers and must be treated as
+    read-only; copy before mutating.
+
+    Every entry carries a version token. It is derived from mtime/size for
+    chapters read from disk and allocated from a counter for saves, and a
+    save keeps its token after the queued write lands so clients holding
+    it do not see a spurious conflict.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._save_counter = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(path: PathLike) -> str:
+        return os.path.realpath(path)
+
+    def load(self, path: PathLike) -> Any:
+        """Return the parsed chapter at `path`, parsing it only if it changed.
+
+        Raises OSError when the file cannot be read and yaml.YAMLError when
+        it cannot be parsed.
+        """
+        return self.load_versioned(path)[0]
+
+    def load_versioned(self, path: PathLike) -> Tuple[Any, str]:
+        """Like `load`, but also return the chapter's version token."""
+        key = self.key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.pending:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.data, entry.version
+
+        st = os.stat(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.data, entry.version
+            self.misses += 1
+
+        with open(key, "rb") as f:
+            data = offloader.parse_yaml(f.read())
+        version = stat_version(st)
+        self._store(key, _CacheEntry(st.st_mtime_ns, st.st_size, data, estimate_size(data), version))
+        return data, version
+
+    def version(self, path: PathLike) -> str:
+        """Current version token of `path` without reading or parsing it."""
+        key = self.key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.pending:
+                return entry.version
+        st = os.stat(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+                return entry.version
+        return stat_version(st)
+
+    def put(self, path: PathLike, data: Any, st: Optional[os.stat_result] = None, version: Optional[str] = None) -> str:
+        """Write-through after a save: remember `data` as the parsed form of `path`."""
+        key = self.key(path)
+        if st is None:
+            st = os.stat(key)
+        if version is None:
+            version = stat_version(st)
+        self._store(key, _CacheEntry(st.st_mtime_ns, st.st_size, data, estimate_size(data), version))
+        return version
+
+    def put_pending(self, path: PathLike, data: Any) -> str:
+        """Serve `data` for `path` until the queued write calls `put`.
+
+        Pending entries ignore the file on disk and are never evicted.
+        Returns the new version token.
+        """
+        with self._lock:
+            self._save_counter += 1
+            version = f"s{_PROCESS_TAG}-{self._save_counter:x}"
+        self._store(self.key(path), _CacheEntry(0, 0, data, estimate_size(data), version, pending=True))
+        return version
+
+    def is_pending(self, path: PathLike) -> bool:
+        with self._lock:
+            entry = self._entries.get(self.key(path))
+            return entry is not None and entry.pending
+
+    def invalidate(self, path: PathLike):
+        key = self.key(path)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._total -= entry.cost
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total = 0
+
+    def _store(self, key: str, entry: _CacheEntry):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total -= previous.cost
+            if entry.cost > self.budget_bytes and not entry.pending:
+                return
+            self._entries[key] = entry
+            self._total += entry.cost
+            if self._total > self.budget_bytes:
+                self._evict()
+
+    def _evict(self):
+        for key in list(self._entries):
+            if self._total <= self.budget_bytes:
+                break
+            entry = self._entries[key]
+            if entry.pending:
+                continue
+            del self._entries[key]
+            self._total -= entry.cost
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+chapter_cache = ChapterCache(int(CHAPTER_CACHE_MB * 1024 * 1024))
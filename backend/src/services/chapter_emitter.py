@@ -0,0 +1,152 @@
+"""
+Single-pass chapter YAML emitter
+Strips null fields and zero durations while representing, emits multiline
+strings as literal blocks and separates events with blank lines while the
+YAML is streamed into the output file
+"""
+from typing import Any, Dict, IO
+
+from . import yaml_io
+
+
+class _EventSpacer:
+    """File-like wrapper that adds a blank line between top-level list items.
+
+    A `- ` line gets a blank line in front of it when the previous
+    non-blank, non-indented line was also a `- ` line, i.e. when it starts
+    the next event of the same list. Each line is looked at exactly once.
+    """
+
+    def __init__(self, out: IO[str]):
+        self._out = out
+        self._partial = []
+        self._after_item = False
+
+    def write(self, chunk: str):
+        start = 0
+        newline = chunk.find('\n')
+        while newline != -1:
+            self._partial.append(chunk[start:newline])
+            self._emit_line(''.join(self._partial), '\n')
+            self._partial = []
+            start = newline + 1
+            newline = chunk.find('\n', start)
+        if start < len(chunk):
+            self._partial.append(chunk[start:])
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._partial:
+            self._emit_line(''.join(self._partial), '')
+            self._partial = []
+
+    def _emit_line(self, line: str, end: str):
+        if line.startswith('- '):
+            if self._after_item:
+                self._out.write('\n')
+            self._after_item = True
+        elif line.startswith('  ') or line.strip() == '':
+            # Nested content of the current item or blank line
+            pass
+        else:
+            self._after_item = False
+        self._out.write(line)
+        self._out.write(end)
+
+
+def _clean_fields(data: Dict[Any, Any]) -> Dict[Any, Any]:
+    """Shallow copy of a mapping without null fields and zero durations."""
+    clean = {}
+    for k, v in data.items():
+        # Skip null values
+        if v is None:
+            continue
+        # Handle duration field specially
+        if k == 'duration':
+            # Convert to float if it's a string
+            if isinstance(v, str):
+                try:
+                    v = float(v)
+                except (ValueError, TypeError):
+                    # drop the invalid value
+                    v = 0.0
+            # Skip if duration is 0 or 0.0
+            if v == 0:
+                continue
+        clean[k] = v
+    return clean
+
+
+def clean_chapter(data: Any) -> Any:
+    """The chapter as `write_chapter` would leave it, without emitting YAML."""
+    if isinstance(data, dict):
+        return {k: clean_chapter(v) for k, v in _clean_fields(data).items()}
+    if isinstance(data, list):
+        return [clean_chapter(item) for item in data]
+    return data
+
+
+class _ChapterRepresenter:
+    """Representer mixin that drops empty fields as it walks the chapter.
+
+    At any depth, null values are skipped, string durations are coerced to
+    float and zero durations are skipped. The cleaned copy is built on the
+    way so it can be cached without a second walk.
+    """
+
+    def ignore_aliases(self, data):
+        # The cleaned document never shares nodes, so never emit anchors
+        return True
+
+    def represent_chapter_mapping(self, data):
+        clean = _clean_fields(data)
+        node = self.represent_mapping('tag:yaml.org,2002:map', clean)
+        cleaned = self.cleaned
+        for k, v in clean.items():
+            clean[k] = cleaned.get(id(v), v)
+        cleaned[id(data)] = clean
+        return node
+
+    def represent_chapter_sequence(self, data):
+        node = self.represent_sequence('tag:yaml.org,2002:seq', data)
+        cleaned = self.cleaned
+        cleaned[id(data)] = [cleaned.get(id(item), item) for item in data]
+        return node
+
+
+class ChapterDumper(_ChapterRepresenter, yaml_io.Dumper):
+    pass
+
+
+class PureChapterDumper(_ChapterRepresenter, yaml_io.PureDumper):
+    pass
+
+
+for _dumper in (ChapterDumper, PureChapterDumper):
+    _dumper.add_representer(dict, _dumper.represent_chapter_mapping)
+    _dumper.add_representer(list, _dumper.represent_chapter_sequence)
+
+
+def write_chapter(chapter_data: Dict[str, Any], out: IO[str], dumper=None) -> Dict[str, Any]:
+    """Stream `chapter_data` into `out` in the editor's on-disk format.
+
+    Returns the cleaned chapter (what a reload of the written file yields),
+    so callers can hand it to the chapter cache.
+    """
+    if dumper is None:
+        portable = yaml_io.LIBYAML and yaml_io.emits_identically(chapter_data)
+        dumper = ChapterDumper if portable else PureChapterDumper
+
+    spacer = _EventSpacer(out)
+    emitter = dumper(spacer, allow_unicode=True, sort_keys=False, default_flow_style=False)
+    emitter.cleaned = {}
+    try:
+        emitter.open()
+        emitter.represent(chapter_data)
+        emitter.close()
+    finally:
+        emitter.dispose()
+    spacer.close()
+    return emitter.cleaned.get(id(chapter_data), chapter_data)
@@ -0,0 +1,227 @@
+"""
+Write-behind queue for chapter files
+Saves to the same file within a short window are coalesced into one write,
+and every write goes through a temp file plus os.replace so a crash never
+leaves a truncated chapter behind
+"""
+import atexit
+import os
+import stat
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, IO, List, Optional, TypeVar, Union
+
+from .chapter_cache import chapter_cache
+from .chapter_emitter import clean_chapter, write_chapter
+
+# Seconds a save may wait for further saves to the same file
+WRITE_DELAY = float(os.environ.get("SCRIPT_EDITOR_WRITE_DELAY", "0.3"))
+# Upper bound on how long a file that keeps being saved can stay unwritten
+MAX_WRITE_DELAY = float(os.environ.get("SCRIPT_EDITOR_MAX_WRITE_DELAY", "2.0"))
+# fsync files (and their directory) before reporting them written
+FSYNC = os.environ.get("SCRIPT_EDITOR_FSYNC", "0") == "1"
+
+PathLike = Union[str, Path]
+T = TypeVar("T")
+
+
+def atomic_write(path: PathLike, writer: Callable[[IO[str]], T], fsync: bool = FSYNC) -> T:
+    """Write a text file via a sibling temp file and os.replace."""
+    path = Path(path)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            result = writer(f)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    if fsync and hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    return result
+
+
+class _WriteJob:
+    __slots__ = ("path", "data", "seq", "version", "first_queued", "due")
+
+    def __init__(self, path: Path, data: Dict[str, Any], seq: int, version: Optional[str], first_queued: float, due: float):
+        self.path = path
+        self.data = data
+        self.seq = seq
+        self.version = version
+        self.first_queued = first_queued
+        self.due = due
+
+
+class ChapterWriter:
+    """Per-file write-behind queue feeding the chapter cache.
+
+    `save` pins the new content in the chapter cache right away so reads
+    see it, and the file is written once no further save for it arrived
+    for `delay` seconds (or after `max_delay` at the latest).
+    """
+
+    def __init__(self, delay: float = WRITE_DELAY, max_delay: float = MAX_WRITE_DELAY, fsync: bool = FSYNC):
+        self.delay = delay
+        self.max_delay = max_delay
+        self.fsync = fsync
+        self._pending: Dict[str, _WriteJob] = {}
+        # Sequence number of the newest save written per file, so an older
+        # job that lost a race with a flush never overwrites a newer one
+        self._seq = 0
+        self._written_seq: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def save(self, path: PathLike, data: Dict[str, Any]) -> str:
+        """Queue `data` to be written to `path` and return its version token.
+
+        The caller must not mutate `data` afterwards. New files are written
+        immediately so directory listings pick them up.
+        """
+        path = Path(path)
+        if not path.exists() or self.delay <= 0 or self._stopping:
+            return self._write_now(path, data)
+        # Serve what the file will hold, so the version token names one body
+        data = clean_chapter(data)
+
+        key = chapter_cache.key(path)
+        now = time.monotonic()
+        with self._cond:
+            previous = self._pending.get(key)
+            first_queued = previous.first_queued if previous is not None else now
+            due = min(now + self.delay, first_queued + self.max_delay)
+            self._seq += 1
+            version = chapter_cache.put_pending(path, data)
+            self._pending[key] = _WriteJob(path, data, self._seq, version, first_queued, due)
+            self._ensure_thread()
+            self._cond.notify()
+        return version
+
+    def discard(self, path: PathLike):
+        """Drop a queued write, e.g. because the chapter is being deleted."""
+        key = chapter_cache.key(path)
+        with self._cond:
+            self._pending.pop(key, None)
+            self._seq += 1
+            seq = self._seq
+        # Waits for a write of this file that may already be in flight; a job
+        # dequeued but not yet writing sees the newer sequence number and skips
+        with self._io_lock:
+            self._written_seq[key] = max(self._written_seq.get(key, 0), seq)
+
+    def flush(self, path: Optional[PathLike] = None) -> Dict[str, Any]:
+        """Write queued chapters now (all of them, or only `path`)."""
+        with self._cond:
+            if path is None:
+                jobs = list(self._pending.values())
+                self._pending.clear()
+            else:
+                job = self._pending.pop(chapter_cache.key(path), None)
+                jobs = [job] if job is not None else []
+        return self._write_jobs(jobs)
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def shutdown(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+        self._stopping = False
+
+    # --- Internals ---
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="chapter-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                now = time.monotonic()
+                next_due = min(job.due for job in self._pending.values())
+                if next_due > now:
+                    self._cond.wait(next_due - now)
+                    continue
+                due_keys = [key for key, job in self._pending.items() if job.due <= now]
+                jobs = [self._pending.pop(key) for key in due_keys]
+            self._write_jobs(jobs)
+
+    def _write_jobs(self, jobs: List[_WriteJob]) -> Dict[str, Any]:
+        written, errors = 0, []
+        for job in jobs:
+            try:
+                self._write_job(job)
+                written += 1
+            except Exception as e:
+                print(f"[Writer] Failed to write {job.path}: {e}")
+                errors.append({"path": str(job.path), "error": str(e)})
+                self._requeue(job)
+        return {"written": written, "errors": errors}
+
+    def _write_job(self, job: _WriteJob) -> Optional[str]:
+        key = chapter_cache.key(job.path)
+        with self._io_lock:
+            # Skips jobs older than the last write or discard of the file
+            if self._written_seq.get(key, 0) >= job.seq:
+                return None
+            job.path.parent.mkdir(parents=True, exist_ok=True)
+            cleaned = atomic_write(job.path, lambda f: write_chapter(job.data, f), fsync=self.fsync)
+            self._written_seq[key] = job.seq
+            st = os.stat(job.path)
+        with self._cond:
+            # A newer save is queued: keep serving that one from the cache
+            if key in self._pending:
+                return job.version
+            return chapter_cache.put(job.path, cleaned, st, version=job.version)
+
+    def _write_now(self, path: Path, data: Dict[str, Any]) -> str:
+        with self._cond:
+            self._pending.pop(chapter_cache.key(path), None)
+            self._seq += 1
+            job = _WriteJob(path, data, self._seq, None, 0, 0)
+        return self._write_job(job)
+
+    def _requeue(self, job: _WriteJob):
+        key = chapter_cache.key(job.path)
+        with self._cond:
+            if key not in self._pending:
+                job.due = time.monotonic() + self.max_delay
+                self._pending[key] = job
+                self._ensure_thread()
+                self._cond.notify()
+
+
+chapter_writer = ChapterWriter()
+atexit.register(chapter_writer.shutdown)
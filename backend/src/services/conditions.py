@@ -0,0 +1,307 @@
+"""
+Condition expressions of chapter events
+Compiles `condition` strings such as `love > 1 && met_alice` into Python
+functions once per distinct string. Only comparisons, boolean logic,
+arithmetic, literals and variable names are accepted, so evaluating a
+condition can never reach anything but the variables it is given
+"""
+import ast
+import os
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple, Union
+
+# Distinct condition strings kept compiled
+CONDITION_CACHE_SIZE = int(os.environ.get("SCRIPT_EDITOR_CONDITION_CACHE", "65536"))
+
+# Value of a variable that was never set
+UNSET = 0
+
+# JavaScript-style operators the editor accepts, and their Python spelling
+_JS_OPERATORS = (("===", "=="), ("!==", "!="), ("&&", " and "), ("||", " or "), ("!", " not "))
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+    ast.Name, ast.Load, ast.Constant, ast.Tuple, ast.List,
+)
+_OPERATORS = (ast.operator, ast.unaryop, ast.cmpop, ast.boolop)
+# Failures while evaluating (e.g. comparing a string with a number) make a condition false
+_EVAL_ERRORS = (TypeError, ValueError, ArithmeticError, MemoryError)
+# Operands `*` and `%` refuse: repeating or formatting them can build arbitrarily large values
+_SEQUENCES = (str, bytes, list, tuple)
+
+
+def _multiply(a: Any, b: Any) -> Any:
+    if isinstance(a, _SEQUENCES) or isinstance(b, _SEQUENCES):
+        raise TypeError("sequence repetition is not allowed in conditions")
+    return a * b
+
+
+def _modulo(a: Any, b: Any) -> Any:
+    if isinstance(a, _SEQUENCES):
+        raise TypeError("string formatting is not allowed in conditions")
+    return a % b
+
+
+_CHECKED_OPERATORS = {ast.Mult: "_multiply", ast.Mod: "_modulo"}
+
+
+class ConditionError(ValueError):
+    """A condition that cannot be compiled; `column` is 1-based in the original string."""
+
+    def __init__(self, source: str, message: str, column: Optional[int] = None):
+        super().__init__(f"{message} (column {column})" if column else message)
+        self.source = source
+        self.message = message
+        self.column = column
+
+
+class Condition:
+    """A compiled condition; call `evaluate` with the current variables."""
+
+    __slots__ = ("source", "names", "_func")
+
+    def __init__(self, source: str, names: FrozenSet[str], func: Callable[[Callable], Any]):
+        self.source = source
+        self.names = names
+        self._func = func
+
+    def value(self, variables: Dict[str, Any]) -> Any:
+        """Raw value of the expression; unset variables read as UNSET."""
+        return self._func(variables.get)
+
+    def evaluate(self, variables: Dict[str, Any]) -> bool:
+        """Whether the condition holds. Type errors and the like count as false."""
+        try:
+            return bool(self._func(variables.get))
+        except _EVAL_ERRORS:
+            return False
+
+    def __repr__(self) -> str:
+        return f"Condition({self.source!r})"
+
+
+def _translate(source: str) -> Tuple[str, List[int]]:
+    """Rewrite JS operators outside string literals; also returns each output character's source index.
+
+    Line breaks outside string literals become spaces, so the expression
+    parses as one line and offsets stay columns.
+    """
+    out: List[str] = []
+    origin: List[int] = []
+    quote = None
+    i, n = 0, len(source)
+    while i < n:
+        ch = source[i]
+        if quote is not None:
+            out.append(ch)
+            origin.append(i)
+            if ch == "\\" and i + 1 < n:
+                out.append(source[i + 1])
+                origin.append(i + 1)
+                i += 2
+                continue
+            if ch == quote:
+                quote = None
+            i += 1
+            continue
+        if ch in "\"'":
+            quote = ch
+            out.append(ch)
+            origin.append(i)
+            i += 1
+            continue
+        for js, py in _JS_OPERATORS:
+            if source.startswith(js, i) and not (js == "!" and source.startswith("!=", i)):
+                out.extend(py)
+                origin.extend([i] * len(py))
+                i += len(js)
+                break
+        else:
+            out.append(" " if ch in "\r\n" else ch)
+            origin.append(i)
+            i += 1
+    # A leading `!` leaves a space the parser would take for indentation
+    start = len(out) - len("".join(out).lstrip())
+    return "".join(out[start:]), origin[start:]
+
+
+class _ResolveNames(ast.NodeTransformer):
+    """Replace literal words with constants and variables with `_get(name, UNSET)`.
+
+    `*` and `%` become calls to their checked versions.
+    """
+
+    def __init__(self):
+        self.names = set()
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        checked = _CHECKED_OPERATORS.get(type(node.op))
+        if checked is None:
+            return node
+        call = ast.Call(func=ast.Name(checked, ast.Load()), args=[node.left, node.right], keywords=[])
+        return ast.copy_location(call, node)
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        if node.id in _LITERALS:
+            return ast.copy_location(ast.Constant(_LITERALS[node.id]), node)
+        self.names.add(node.id)
+        call = ast.Call(
+            func=ast.Name("_get", ast.Load()),
+            args=[ast.Constant(node.id), ast.Constant(UNSET)],
+            keywords=[],
+        )
+        return ast.copy_location(call, node)
+
+
+def _column(origin: List[int], index: int, source: str) -> int:
+    """1-based column in `source` of character `index` of the translated text."""
+    if index < len(origin):
+        return origin[max(0, index)] + 1
+    return len(source) + 1
+
+
+def _node_index(translated: str, col_offset: int) -> int:
+    # AST offsets count UTF-8 bytes
+    return len(translated.encode("utf-8")[:col_offset].decode("utf-8", "ignore"))
+
+
+def _operator_index(translated: str, left: ast.AST) -> int:
+    """Index of the operator following the operand `left`."""
+    i = _node_index(translated, left.end_col_offset)
+    while i < len(translated) and translated[i] in " \t)":
+        i += 1
+    return i
+
+
+def _operands(node: ast.AST) -> List[Tuple[ast.AST, Optional[ast.AST]]]:
+    """`(operator, operand before it)` of an operation node; None when the operator comes first."""
+    if isinstance(node, ast.BinOp):
+        return [(node.op, node.left)]
+    if isinstance(node, ast.Compare):
+        return list(zip(node.ops, [node.left] + node.comparators))
+    if isinstance(node, ast.UnaryOp):
+        return [(node.op, None)]
+    return []
+
+
+def _is_sequence(node: ast.AST) -> bool:
+    return isinstance(node, (ast.List, ast.Tuple)) or isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+
+def _compile(source: str) -> Condition:
+    translated, origin = _translate(source)
+    try:
+        tree = ast.parse(translated, mode="eval")
+    except SyntaxError as e:
+        # No offset means the expression ended too early
+        index = e.offset - 1 if e.offset else len(translated)
+        raise ConditionError(source, e.msg or "invalid syntax", _column(origin, index, source)) from None
+
+    def fail(message: str, index: int):
+        raise ConditionError(source, message, _column(origin, index, source))
+
+    for node in ast.walk(tree):
+        # Operators carry no position; they are checked with the node they belong to
+        if isinstance(node, _OPERATORS):
+            continue
+        if not isinstance(node, _ALLOWED_NODES):
+            fail(f"'{type(node).__name__}' is not allowed in conditions", _node_index(translated, node.col_offset))
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, str, bool, type(None))):
+            fail("unsupported literal", _node_index(translated, node.col_offset))
+        for op, left in _operands(node):
+            index = (_node_index(translated, node.col_offset) if left is None
+                     else _operator_index(translated, left))
+            if not isinstance(op, _ALLOWED_NODES):
+                fail(f"'{type(op).__name__}' is not allowed in conditions", index)
+            if isinstance(op, ast.Mult) and (_is_sequence(node.left) or _is_sequence(node.right)):
+                fail("sequence repetition is not allowed in conditions", index)
+            if isinstance(op, ast.Mod) and _is_sequence(node.left):
+                fail("string formatting is not allowed in conditions", index)
+
+    resolver = _ResolveNames()
+    body = resolver.visit(tree).body
+    func = ast.Expression(ast.Lambda(
+        args=ast.arguments(posonlyargs=[], args=[ast.arg("_get")], kwonlyargs=[], kw_defaults=[], defaults=[]),
+        body=body,
+    ))
+    ast.fix_missing_locations(func)
+    code = compile(func, "<condition>", "eval")
+    namespace = {"__builtins__": {}, "_multiply": _multiply, "_modulo": _modulo}
+    return Condition(source, frozenset(resolver.names), eval(code, namespace))
+
+
+@lru_cache(maxsize=CONDITION_CACHE_SIZE)
+def _cached(source: str) -> Union[Condition, Tuple[str, Optional[int]]]:
+    # Errors are cached as (message, column): a cached exception would keep
+    # its traceback, and every re-raise would make that traceback longer
+    try:
+        return _compile(source)
+    except ConditionError as e:
+        return e.message, e.column
+
+
+def compile_condition(source: str) -> Optional[Condition]:
+    """Compiled condition for `source` (None for an empty one, which always holds).
+
+    Compiling the same string again returns the cached result. Raises
+    ConditionError on syntax errors and disallowed constructs.
+    """
+    if source is None or not str(source).strip():
+        return None
+    source = str(source).strip()
+    result = _cached(source)
+    if isinstance(result, tuple):
+        raise ConditionError(source, *result)
+    return result
+
+
+def evaluate(source: Optional[str], variables: Dict[str, Any]) -> bool:
+    """Whether `source` holds for `variables`; invalid conditions count as false."""
+    try:
+        condition = compile_condition(source)
+    except ConditionError:
+        return False
+    return condition is None or condition.evaluate(variables)
+
+
+def iter_conditions(chapter: Any) -> Iterator[Tuple[int, str, Any]]:
+    """`(event index, location, condition)` for every condition in a chapter.
+
+    Conditions on options and their actions are included; locations look
+    like `events[3].options[1].actions[0]`.
+    """
+    events = chapter.get("events") if isinstance(chapter, dict) else None
+    for index, event in enumerate(events or []):
+        stack = [(f"events[{index}]", event)]
+        while stack:
+            location, node = stack.pop()
+            if isinstance(node, dict):
+                if node.get("condition") not in (None, ""):
+                    yield index, location, node["condition"]
+                for key in sorted(node, reverse=True):
+                    value = node[key]
+                    if isinstance(value, (dict, list)):
+                        stack.append((f"{location}.{key}", value))
+            elif isinstance(node, list):
+                for i in range(len(node) - 1, -1, -1):
+                    stack.append((f"{location}[{i}]", node[i]))
+
+
+def check_chapter(chapter: Any) -> List[Dict[str, Any]]:
+    """Conditions of a chapter that do not compile, with where they are."""
+    problems = []
+    for index, location, source in iter_conditions(chapter):
+        if not isinstance(source, str):
+            problems.append({"event": index, "location": location, "condition": source,
+                             "error": "condition must be a string", "column": None})
+            continue
+        try:
+            compile_condition(source)
+        except ConditionError as e:
+            problems.append({"event": index, "location": location, "condition": source,
+                             "error": e.message, "column": e.column})
+    return problems
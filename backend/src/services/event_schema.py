@@ -0,0 +1,115 @@
+"""
+Event types of chapters
+Required and optional fields of every event type, as served to the agent
+and the editor and checked by the linter
+"""
+
+EVENT_TYPES = {
+    "narration": {
+        "description": "叙述文本",
+        "required": ["text"],
+        "fields": {
+            "text": {"type": "string", "description": "叙述内容"},
+            "condition": {"type": "string", "description": "变量条件表达式"},
+            "duration": {"type": "number", "description": "持续时间"}
+        }
+    },
+    "player": {
+        "description": "玩家说话",
+        "required": ["text"],
+        "fields": {
+            "text": {"type": "string", "description": "玩家说的话"},
+            "condition": {"type": "string", "description": "变量条件表达式"},
+            "duration": {"type": "number", "description": "持续时间"}
+        }
+    },
+    "dialogue": {
+        "description": "角色对话",
+        "required": ["character", "text"],
+        "fields": {
+            "character": {"type": "string", "description": "角色名称"},
+            "text": {"type": "string", "description": "对话内容"},
+            "condition": {"type": "string", "description": "变量条件表达式"},
+            "duration": {"type": "number", "description": "持续时间"}
+        }
+    },
+    "ai_dialogue": {
+        "description": "AI对话（由AI生成的动态对话）",
+        "required": ["character", "prompt"],
+        "fields": {
+            "character": {"type": "string", "description": "角色名称"},
+            "prompt": {"type": "string", "description": "给AI的提示"},
+            "condition": {"type": "string", "description": "变量条件表达式"},
+            "duration": {"type": "number", "description": "持续时间"}
+        }
+    },
+    "modify_character": {
+        "description": "修改角色（显示/隐藏/移动) 如果当前章节有角色事件但没有show_character的action，需要先显示角色",
+        "required": ["action", "character"],
+        "fields": {
+            "action": {"type": "string", "enum": ["show_character", "hide_character", "move_character", "shake_character"], "description": "操作类型"},
+            "character": {"type": "string", "description": "角色名称"},
+            "emotion": {"type": "string", "description": "表情"},
+            "condition": {"type": "string", "description": "变量条件表达式"},
+            "duration": {"type": "number", "description": "持续时间"}
+        }
+    },
+    "background": {
+        "description": "设置背景图片",
+        "required": ["imagePath"],
+        "fields": {
+            "imagePath": {"type": "string", "description": "背景图片路径"},
+            "condition": {"type": "string", "description": "变量条件表达式"},
+            "duration": {"type": "number", "description": "持续时间"}
+        }
+    },
+    "music": {
+        "description": "播放背景音乐",
+        "required": ["musicPath"],
+        "fields": {
+            "musicPath": {"type": "string", "description": "音乐文件路径"},
+            "condition": {"type": "string", "description": "变量条件表达式"},
+            "duration": {"type": "number", "description": "持续时间"}
+        }
+    },
+    "input": {
+        "description": "玩家输入事件",
+        "required": ["hint"],
+        "fields": {
+            "hint": {"type": "string", "description": "输入提示文字"},
+            "condition": {"type": "string", "description": "变量条件表达式"},
+            "duration": {"type": "number", "description": "持续时间"}
+        }
+    },
+    "choices": {
+        "description": "玩家选择事件",
+        "required": ["options", "allow_free"],
+        "fields": {
+            "options": {"type": "string", "description": "选项列表"},
+            "allow_free": {"type": "boolean", "description": "是否允许自由输入"},
+            "condition": {"type": "string", "description": "变量条件表达式"},
+            "duration": {"type": "number", "description": "持续时间"}
+        }
+    },
+    "set_variable": {
+        "description": "设置变量值",
+        "required": ["name", "value"],
+        "fields": {
+            "name": {"type": "string", "description": "变量名"},
+            "value": {"type": "any", "description": "变量值"},
+            "condition": {"type": "string", "description": "变量条件表达式"},
+            "duration": {"type": "number", "description": "持续时间"}
+        }
+    },
+    "chapter_end": {
+        "description": "章节结束/跳转",
+        "required": ["end_type", "next_chapter"],
+        "fields": {
+            "end_type": {"type": "string", "enum": ["linear", "branching", "ai_judged"], "description": "结束类型"},
+            "next_chapter": {"type": "string", "description": "下一章节路径或'end'"},
+            "options": {"type": "string", "description": "用于branching/ai_judged的选项列表"},
+            "condition": {"type": "string", "description": "变量条件表达式"},
+            "duration": {"type": "number", "description": "持续时间"}
+        }
+    }
+}
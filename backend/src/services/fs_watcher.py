@@ -0,0 +1,195 @@
+"""
+Filesystem change feed for the scripts workspace
+Uses watchdog when it is installed and falls back to periodic polling otherwise
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog is optional
+    FileSystemEventHandler = object
+    Observer = None
+
+# Seconds between two snapshots when the polling fallback is used
+POLL_INTERVAL = float(os.environ.get("SCRIPT_EDITOR_POLL_INTERVAL", "2.0"))
+
+ChangeCallback = Callable[[Set[Path]], None]
+
+
+class _WatchdogHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "WorkspaceWatcher"):
+        self._watcher = watcher
+
+    def on_any_event(self, event):
+        if event.event_type in ("opened", "closed", "closed_no_write"):
+            return
+        paths = {Path(os.fsdecode(event.src_path))}
+        dest = getattr(event, "dest_path", None)
+        if dest:
+            paths.add(Path(os.fsdecode(dest)))
+        self._watcher.notify(p for p in paths if not self._watcher.is_ignored(p))
+
+
+class WorkspaceWatcher:
+    """Publishes sets of changed paths below `root` to subscribers.
+
+    Subscribers are called from the watcher thread (or from the caller of
+    `notify`), so they must only do cheap bookkeeping such as marking
+    entries dirty. Top-level folders named in `ignore` (e.g. the server's
+    own cache) are neither scanned nor reported.
+    """
+
+    def __init__(self, root: Path, poll_interval: float = POLL_INTERVAL, ignore: Iterable[str] = ()):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.ignore = frozenset(ignore)
+        self._subscribers: List[ChangeCallback] = []
+        self._lock = threading.Lock()
+        self._started = False
+        self._observer = None
+        self._poll_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+
+    @property
+    def mode(self) -> str:
+        if not self._started:
+            return "stopped"
+        return "watchdog" if self._observer is not None else "polling"
+
+    def is_ignored(self, path: Path) -> bool:
+        try:
+            parts = path.relative_to(self.root).parts
+        except ValueError:
+            return False
+        return bool(parts) and parts[0] in self.ignore
+
+    def subscribe(self, callback: ChangeCallback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def notify(self, paths: Iterable[Path]):
+        """Push changed paths to every subscriber.
+
+        Routes that write to the workspace call this directly so caches see
+        their own writes without waiting for the OS event or the next poll.
+        """
+        changed = {Path(p) for p in paths}
+        if not changed:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(changed)
+            except Exception as e:
+                print(f"[Watcher] Subscriber failed: {e}")
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self._stop_event.clear()
+
+        if Observer is not None and self.root.exists():
+            try:
+                observer = Observer()
+                observer.schedule(_WatchdogHandler(self), str(self.root), recursive=True)
+                observer.daemon = True
+                observer.start()
+                self._observer = observer
+                return
+            except Exception as e:
+                print(f"[Watcher] watchdog unavailable, falling back to polling: {e}")
+                self._observer = None
+
+        self._snapshot = self._take_snapshot()
+        self._poll_thread = threading.Thread(target=self._poll_loop, name="workspace-poller", daemon=True)
+        self._poll_thread.start()
+
+    def stop(self):
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+        self._stop_event.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+        if self._poll_thread is not None:
+            self._poll_thread.join(timeout=5)
+            self._poll_thread = None
+
+    # --- Polling fallback ---
+
+    def _take_snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        if not self.root.exists():
+            return snapshot
+        for root, dirs, files in os.walk(self.root):
+            if root == str(self.root):
+                dirs[:] = [name for name in dirs if name not in self.ignore]
+            for name in dirs + files:
+                full_path = os.path.join(root, name)
+                try:
+                    st = os.stat(full_path)
+                except OSError:
+                    continue
+                snapshot[full_path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def _poll_loop(self):
+        while not self._stop_event.wait(self.poll_interval):
+            current = self._take_snapshot()
+            previous = self._snapshot
+            changed = {Path(p) for p, sig in current.items() if previous.get(p) != sig}
+            changed.update(Path(p) for p in previous.keys() - current.keys())
+            self._snapshot = current
+            if changed:
+                self.notify(changed)
+
+
+class DirectoryGenerations:
+    """Change counters per script and per top-level folder of a script.
+
+    A counter is bumped for every change the watcher reports below
+    `<script>/<folder>`, so a listing of that folder can be tagged without
+    touching the disk. Tokens include a per-process tag so counters from a
+    previous run never collide with the current ones.
+    """
+
+    def __init__(self, base_dir: Path, watcher: WorkspaceWatcher):
+        self.base_dir = base_dir
+        self._watcher = watcher
+        self._tag = os.urandom(3).hex()
+        self._lock = threading.Lock()
+        self._root_count = 0
+        self._counts: Dict[Tuple[str, Optional[str]], int] = {}
+        watcher.subscribe(self._on_change)
+
+    def _on_change(self, paths: Set[Path]):
+        with self._lock:
+            for path in paths:
+                try:
+                    parts = path.relative_to(self.base_dir).parts
+                except ValueError:
+                    continue
+                if not parts:
+                    self._root_count += 1
+                    continue
+                key = (parts[0], parts[1] if len(parts) > 1 else None)
+                self._counts[key] = self._counts.get(key, 0) + 1
+
+    def token(self, script_id: str, *folders: str) -> str:
+        """Opaque token that changes whenever anything below the folders changes."""
+        self._watcher.start()
+        with self._lock:
+            values = [self._root_count, self._counts.get((script_id, None), 0)]
+            values.extend(self._counts.get((script_id, folder), 0) for folder in folders)
+        return f"{self._tag}-" + ".".join(f"{v:x}" for v in values)
@@ -0,0 +1,55 @@
+"""
+Conditional GET helpers
+Routes compute a strong ETag from cheap metadata (stat results, version
+tokens, directory generation counters) and answer 304 before reading or
+parsing anything when the client already has the current representation.
+Large JSON bodies are encoded off the event loop and sent as-is
+"""
+import json
+import os
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+
+def stat_etag(st: os.stat_result) -> str:
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def quote_etag(token: str) -> str:
+    return f'"{token}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Return a 304 response if `etag` matches, else tag `response` with it."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def encode_json(data: Any) -> bytes:
+    """JSON body as FastAPI would send it; blocking, run it through the offloader."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def json_response(body: bytes, response: Response) -> Response:
+    """Response for an encoded body, keeping the headers set on `response` (e.g. the ETag)."""
+    headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+    return Response(content=body, media_type="application/json", headers=headers)
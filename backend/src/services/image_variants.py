@@ -0,0 +1,169 @@
+"""
+Downscaled and re-encoded image variants for pickers and previews
+Variants are rendered once in the CPU process pool (Pillow is optional) and
+kept in a content-addressed cache directory that is trimmed back to its size
+budget, least recently used first
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional
+    Image = None
+    ImageOps = None
+
+from .offload import offloader
+from .static_files import content_hashes
+from .workspace import CACHE_DIR
+
+# Disk budget of the variant cache, in megabytes
+VARIANT_CACHE_MB = float(os.environ.get("SCRIPT_EDITOR_VARIANT_CACHE_MB", "256"))
+
+# format query value -> (Pillow format, file suffix, save options)
+VARIANT_FORMATS = {
+    "webp": ("WEBP", ".webp", {"quality": 80, "method": 4}),
+    "png": ("PNG", ".png", {"optimize": True}),
+    "jpeg": ("JPEG", ".jpg", {"quality": 85, "optimize": True}),
+    "jpg": ("JPEG", ".jpg", {"quality": 85, "optimize": True}),
+}
+SOURCE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp')
+MIN_WIDTH = 16
+MAX_WIDTH = 4096
+
+
+def render_variant(source: str, dest: str, width: int, fmt: str) -> int:
+    """Write `source` scaled down to `width` pixels as `fmt` to `dest`.
+
+    Runs in a worker process; returns the size of the written file.
+    """
+    pil_format, _, options = VARIANT_FORMATS[fmt]
+    with Image.open(source) as original:
+        img = ImageOps.exif_transpose(original)
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS)
+        if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        elif img.mode == "P":
+            img = img.convert("RGBA")
+        tmp_path = f"{dest}.{os.getpid()}.tmp"
+        try:
+            img.save(tmp_path, pil_format, **options)
+            os.replace(tmp_path, dest)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+    return os.path.getsize(dest)
+
+
+class VariantCache:
+    """Rendered variants stored as `<source digest>-w<width>.<ext>`.
+
+    The name only depends on the source content, so an edited image gets
+    new variants and stale ones age out through eviction. Concurrent
+    requests for the same missing variant share one render.
+    """
+
+    def __init__(self, cache_dir: Path, budget_bytes: int):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._files: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._loaded = False
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def path_for(self, name: str) -> Path:
+        return self.cache_dir / name[:2] / name
+
+    def _load(self):
+        """Pick up variants left by a previous run, oldest first (caller holds the lock)."""
+        self._loaded = True
+        found = []
+        if self.cache_dir.exists():
+            for root, dirs, files in os.walk(self.cache_dir):
+                for file in files:
+                    if file.endswith(".tmp"):
+                        continue
+                    try:
+                        st = os.stat(os.path.join(root, file))
+                    except OSError:
+                        continue
+                    found.append((st.st_mtime, file, st.st_size))
+        for _, file, size in sorted(found):
+            self._files[file] = size
+            self._total += size
+
+    def _lookup(self, name: str) -> bool:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if name not in self._files:
+                return False
+            if not self.path_for(name).exists():
+                self._total -= self._files.pop(name)
+                return False
+            self._files.move_to_end(name)
+        # Persist recency for the next run's eviction order
+        now = time.time()
+        try:
+            os.utime(self.path_for(name), (now, now))
+        except OSError:
+            pass
+        return True
+
+    def _record(self, name: str, size: int):
+        with self._lock:
+            self._total -= self._files.pop(name, 0)
+            self._files[name] = size
+            self._total += size
+            while self._total > self.budget_bytes and len(self._files) > 1:
+                oldest, oldest_size = self._files.popitem(last=False)
+                self._total -= oldest_size
+                try:
+                    os.unlink(self.path_for(oldest))
+                except OSError:
+                    pass
+
+    async def _render(self, source: Path, name: str, width: int, fmt: str) -> Path:
+        dest = self.path_for(name)
+        await offloader.run("images", dest.parent.mkdir, parents=True, exist_ok=True)
+        size = await offloader.run_cpu("images", render_variant, str(source), str(dest), width, fmt)
+        await offloader.run("images", self._record, name, size)
+        return dest
+
+    async def get(self, source: Path, width: int, fmt: str) -> Optional[Path]:
+        """Path of the variant of `source`, rendering it if needed.
+
+        Returns None when Pillow is missing or `source` is not an image the
+        cache handles; callers then serve the original.
+        """
+        if not self.available or fmt not in VARIANT_FORMATS or source.suffix.lower() not in SOURCE_SUFFIXES:
+            return None
+        width = max(MIN_WIDTH, min(MAX_WIDTH, width))
+        digest = await offloader.run("images", content_hashes.digest, source)
+        name = f"{digest}-w{width}{VARIANT_FORMATS[fmt][1]}"
+
+        if await offloader.run("images", self._lookup, name):
+            return self.path_for(name)
+
+        future = self._inflight.get(name)
+        if future is None:
+            future = asyncio.ensure_future(self._render(source, name, width, fmt))
+            self._inflight[name] = future
+            future.add_done_callback(lambda _: self._inflight.pop(name, None))
+        return await asyncio.shield(future)
+
+
+image_variants = VariantCache(CACHE_DIR / "variants", int(VARIANT_CACHE_MB * 1024 * 1024))
@@ -0,0 +1,325 @@
+"""
+Chapter linter
+Checks every chapter of a script against the event schema and the workspace
+index: required fields, characters, assets, chapter links and conditions.
+Results are cached per chapter version together with what each chapter
+refers to, so after an edit only the changed chapters and the chapters that
+depend on what changed are checked again
+"""
+import asyncio
+import threading
+from pathlib import Path
+from typing import Any, Collection, Dict, Iterable, List, Optional, Set, Tuple
+
+from .chapter_assets import BUILTIN_CHARACTERS, PATH_PREFIXES
+from .chapter_cache import chapter_cache
+from .conditions import check_chapter
+from .event_schema import EVENT_TYPES
+from .fs_watcher import WorkspaceWatcher
+from .offload import offloader
+from .story_graph import END_CHAPTER
+from .workspace import BASE_DIR, workspace_index, workspace_watcher
+
+# Chapters checked per offloaded task
+LINT_BATCH = 16
+
+# Dependency on any asset change, for references that did not resolve exactly
+ANY_ASSET = "*"
+
+SEVERITIES = ("error", "warning")
+
+Dependency = Tuple[str, str]
+
+
+def _issue(chapter: str, event: Optional[int], location: Optional[str], severity: str, rule: str, message: str) -> Dict[str, Any]:
+    return {"chapter": chapter, "event": event, "location": location,
+            "severity": severity, "rule": rule, "message": message}
+
+
+def _ancestors(rel: str) -> List[str]:
+    """`rel` and each of its parent folders, e.g. `a/b.yaml`, `a`."""
+    keys = [rel]
+    while "/" in rel:
+        rel = rel.rpartition("/")[0]
+        keys.append(rel)
+    return keys
+
+
+def _chapter_candidates(ref: str) -> List[str]:
+    """Chapter files (relative to Chapters/) a reference may point to."""
+    ref = ref.strip().replace("\\", "/")
+    if ref.startswith("Chapters/"):
+        ref = ref[len("Chapters/"):]
+    return [ref, ref + ".yaml", ref + ".yml"]
+
+
+class _Context:
+    """What the workspace index lists for a script when a lint run starts."""
+
+    __slots__ = ("script_id", "chapters", "assets", "characters")
+
+    def __init__(self, script_id: str):
+        self.script_id = script_id
+        self.chapters = set(workspace_index.chapters(script_id))
+        self.assets = set(workspace_index.asset_files(script_id))
+        self.characters = set(workspace_index.character_dirs(script_id))
+
+
+class _ScriptLint:
+    __slots__ = ("results", "dependents", "stale")
+
+    def __init__(self):
+        # chapter -> (version, issues, dependencies)
+        self.results: Dict[str, Tuple[str, List[Dict[str, Any]], Set[Dependency]]] = {}
+        # (folder, path or folder below it) -> chapters whose result depends on it
+        self.dependents: Dict[Dependency, Set[str]] = {}
+        # Chapters whose result must be recomputed even if their version is unchanged
+        self.stale: Set[str] = set()
+
+
+def check_events(chapter: str, data: Any, context: _Context) -> Tuple[List[Dict[str, Any]], Set[Dependency]]:
+    """Issues of a parsed chapter and the workspace entries they depend on."""
+    issues: List[Dict[str, Any]] = []
+    deps: Set[Dependency] = set()
+    if data is None:
+        return issues, deps
+    events = data.get("events") if isinstance(data, dict) else None
+    if not isinstance(data, dict) or not isinstance(events, (list, type(None))):
+        issues.append(_issue(chapter, None, None, "error", "invalid_chapter", "chapter must be a mapping with an events list"))
+        return issues, deps
+
+    def check_link(index: int, location: str, ref: Any):
+        if not isinstance(ref, str) or not ref.strip():
+            return
+        if ref == END_CHAPTER:
+            return
+        candidates = _chapter_candidates(ref)
+        for candidate in candidates:
+            deps.add(("Chapters", candidate))
+        if not any(candidate in context.chapters for candidate in candidates):
+            issues.append(_issue(chapter, index, location, "error", "broken_link", f"chapter '{ref}' does not exist"))
+
+    def check_character(index: int, location: str, character: Any) -> bool:
+        if not isinstance(character, str) or not character or character in BUILTIN_CHARACTERS:
+            return False
+        deps.add(("Characters", character))
+        if character not in context.characters:
+            issues.append(_issue(chapter, index, location, "error", "unknown_character", f"character '{character}' does not exist"))
+            return False
+        return True
+
+    def check_asset(index: int, location: str, kind: str, ref: Any):
+        if not isinstance(ref, str) or not ref:
+            return
+        # Prefixed the way the preview requests it
+        key = PATH_PREFIXES[kind] + ref.replace("\\", "/").lstrip("/")
+        if key in context.assets:
+            deps.add(("Assets", key))
+            return
+        deps.add(("Assets", ANY_ASSET))
+        match = workspace_index.find_asset(context.script_id, key)
+        if match is None:
+            issues.append(_issue(chapter, index, location, "error", "missing_asset", f"asset '{key}' does not exist"))
+        else:
+            issues.append(_issue(chapter, index, location, "warning", "fuzzy_asset", f"asset '{key}' only matches 'Assets/{match}'"))
+
+    for index, event in enumerate(events or []):
+        location = f"events[{index}]"
+        if not isinstance(event, dict):
+            issues.append(_issue(chapter, index, location, "error", "invalid_event", "event must be a mapping"))
+            continue
+        event_type = event.get("type")
+        schema = EVENT_TYPES.get(event_type) if isinstance(event_type, str) else None
+        if schema is None:
+            if event_type != "end":
+                # `end` is the legacy chapter_end
+                issues.append(_issue(chapter, index, location, "warning", "unknown_type", f"unknown event type '{event_type}'"))
+        else:
+            for field in schema.get("required", []):
+                if event.get(field) is None or event.get(field) == "":
+                    issues.append(_issue(chapter, index, f"{location}.{field}", "error", "missing_field",
+                                         f"{event_type} requires '{field}'"))
+            for field, spec in schema.get("fields", {}).items():
+                value = event.get(field)
+                if "enum" in spec and value is not None and value not in spec["enum"]:
+                    issues.append(_issue(chapter, index, f"{location}.{field}", "error", "invalid_value",
+                                         f"'{value}' is not one of {', '.join(spec['enum'])}"))
+
+        if event_type in ("dialogue", "ai_dialogue"):
+            check_character(index, f"{location}.character", event.get("character"))
+        elif event_type == "modify_character":
+            character = event.get("character")
+            emotion = event.get("emotion")
+            if check_character(index, f"{location}.character", character) and emotion:
+                avatar_set = workspace_index.avatar_set(context.script_id, character)
+                if avatar_set.default is None:
+                    issues.append(_issue(chapter, index, f"{location}.character", "warning", "missing_avatar",
+                                         f"character '{character}' has no avatar images"))
+                elif str(emotion) not in avatar_set.files:
+                    issues.append(_issue(chapter, index, f"{location}.emotion", "warning", "unknown_emotion",
+                                         f"'{character}' has no '{emotion}' image; '{avatar_set.default}' is shown"))
+        elif event_type == "background":
+            check_asset(index, f"{location}.imagePath", "background", event.get("imagePath"))
+        elif event_type == "music":
+            check_asset(index, f"{location}.musicPath", "music", event.get("musicPath"))
+        elif event_type == "chapter_end":
+            check_link(index, f"{location}.next_chapter", event.get("next_chapter"))
+            for i, option in enumerate(event.get("options") or []):
+                if isinstance(option, dict):
+                    check_link(index, f"{location}.options[{i}].next_chapter", option.get("next_chapter"))
+        elif event_type == "end":
+            check_link(index, f"{location}.next", event.get("next"))
+
+    for problem in check_chapter(data):
+        column = f" (column {problem['column']})" if problem["column"] else ""
+        issues.append(_issue(chapter, problem["event"], problem["location"], "error", "condition",
+                             f"{problem['error']}{column}"))
+    issues.sort(key=lambda issue: issue["event"])
+    return issues, deps
+
+
+class ChapterLinter:
+    """Lint results per chapter, invalidated by chapter versions and workspace changes."""
+
+    def __init__(self, base_dir: Path, watcher: WorkspaceWatcher):
+        self.base_dir = base_dir
+        self._lock = threading.Lock()
+        self._scripts: Dict[str, _ScriptLint] = {}
+        self._changes: Dict[str, Set[tuple]] = {}
+        watcher.subscribe(self._on_change)
+
+    def _on_change(self, paths: Set[Path]):
+        with self._lock:
+            for path in paths:
+                try:
+                    parts = path.relative_to(self.base_dir).parts
+                except ValueError:
+                    continue
+                if not parts:
+                    self._scripts.clear()
+                    self._changes.clear()
+                    return
+                if parts[0] in self._scripts:
+                    self._changes.setdefault(parts[0], set()).add(parts[1:])
+
+    def _apply_changes(self, script_id: str, state: _ScriptLint):
+        """Mark the chapters depending on queued changes as stale. Called with the lock held."""
+        for parts in self._changes.pop(script_id, ()):
+            if len(parts) < 2:
+                # A top folder (or the script) itself changed
+                folder = parts[0] if parts else None
+                for (dep_folder, _), chapters in state.dependents.items():
+                    if folder is None or dep_folder == folder:
+                        state.stale.update(chapters)
+                continue
+            folder, rel = parts[0], "/".join(parts[1:])
+            keys = _ancestors(rel)
+            if folder == "Assets":
+                keys.append(ANY_ASSET)
+            for key in keys:
+                state.stale.update(state.dependents.get((folder, key), ()))
+
+    def _store(self, state: _ScriptLint, chapter: str, result: Optional[Tuple[str, List[Dict[str, Any]], Set[Dependency]]]):
+        """Replace a chapter's result and its reverse dependencies. Called with the lock held."""
+        old = state.results.pop(chapter, None)
+        if old is not None:
+            for dep in old[2]:
+                for key in _ancestors(dep[1]):
+                    dependents = state.dependents.get((dep[0], key))
+                    if dependents is not None:
+                        dependents.discard(chapter)
+                        if not dependents:
+                            del state.dependents[(dep[0], key)]
+        if result is None:
+            return
+        state.results[chapter] = result
+        for dep in result[2]:
+            for key in _ancestors(dep[1]):
+                state.dependents.setdefault((dep[0], key), set()).add(chapter)
+
+    def _prepare(self, script_id: str) -> Tuple[_Context, List[str], List[str]]:
+        """Listing of the script's chapters and the ones that need checking."""
+        with self._lock:
+            # Registered first so changes made while listing are not lost
+            self._scripts.setdefault(script_id, _ScriptLint())
+        context = _Context(script_id)
+        chapters_dir = self.base_dir / script_id / "Chapters"
+        versions = {}
+        for chapter in context.chapters:
+            try:
+                versions[chapter] = chapter_cache.version(chapters_dir / chapter)
+            except OSError:
+                continue
+        with self._lock:
+            state = self._scripts.setdefault(script_id, _ScriptLint())
+            self._apply_changes(script_id, state)
+            for chapter in [c for c in state.results if c not in versions]:
+                self._store(state, chapter, None)
+            state.stale.intersection_update(versions)
+            stale = [
+                chapter for chapter in versions
+                if chapter in state.stale or state.results.get(chapter, (None,))[0] != versions[chapter]
+            ]
+        return context, sorted(versions), sorted(stale)
+
+    def _check_batch(self, context: _Context, chapters: Iterable[str]) -> Dict[str, Tuple[str, List[Dict[str, Any]], Set[Dependency]]]:
+        chapters_dir = self.base_dir / context.script_id / "Chapters"
+        results = {}
+        for chapter in chapters:
+            path = chapters_dir / chapter
+            try:
+                data, version = chapter_cache.load_versioned(path)
+            except OSError:
+                # Deleted since it was listed
+                continue
+            except Exception as e:
+                try:
+                    version = chapter_cache.version(path)
+                except OSError:
+                    continue
+                results[chapter] = (version, [_issue(chapter, None, None, "error", "unreadable", str(e))], set())
+                continue
+            issues, deps = check_events(chapter, data, context)
+            results[chapter] = (version, issues, deps)
+        return results
+
+    async def lint(self, script_id: str, chapters: Optional[Collection[str]] = None) -> Dict[str, Any]:
+        """Lint a script (or only `chapters` of it), rechecking only what may have changed.
+
+        Stale chapters are checked in batches on the offload threads. Issues
+        carry a severity ("error" or "warning"), a rule name and the
+        location of the offending value.
+        """
+        context, listed, stale = await offloader.run("lint", self._prepare, script_id)
+        if chapters is not None:
+            wanted = set(chapters)
+            listed = [chapter for chapter in listed if chapter in wanted]
+            stale = [chapter for chapter in stale if chapter in wanted]
+        batches = [stale[i:i + LINT_BATCH] for i in range(0, len(stale), LINT_BATCH)]
+        results = await asyncio.gather(*(
+            offloader.run("lint", self._check_batch, context, batch) for batch in batches
+        ))
+
+        issues: List[Dict[str, Any]] = []
+        with self._lock:
+            state = self._scripts.setdefault(script_id, _ScriptLint())
+            for batch in results:
+                for chapter, result in batch.items():
+                    self._store(state, chapter, result)
+                    state.stale.discard(chapter)
+            for chapter in listed:
+                result = state.results.get(chapter)
+                if result is not None:
+                    issues.extend(result[1])
+
+        counts = {severity: sum(1 for issue in issues if issue["severity"] == severity) for severity in SEVERITIES}
+        return {
+            "chapters": len(listed),
+            "checked": sum(len(batch) for batch in results),
+            "errors": counts["error"],
+            "warnings": counts["warning"],
+            "issues": issues,
+        }
+
+
+chapter_linter = ChapterLinter(BASE_DIR, workspace_watcher)
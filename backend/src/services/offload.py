@@ -0,0 +1,146 @@
+"""
+Offload layer for blocking work
+Routes run disk access and YAML parsing through a bounded thread pool so the
+event loop (and with it the agent's SSE streams) never waits on the disk.
+Large YAML documents can optionally be parsed in a process pool, and every
+route group has its own concurrency limit so one heavy endpoint cannot take
+all the workers
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from . import yaml_io
+
+# Threads for file I/O and cheap parsing
+IO_WORKERS = int(os.environ.get("SCRIPT_EDITOR_IO_WORKERS", "8"))
+# Processes for parsing large YAML documents; 0 keeps parsing in the I/O threads
+PARSE_PROCESSES = int(os.environ.get("SCRIPT_EDITOR_PARSE_PROCESSES", "0"))
+# Documents smaller than this are parsed in-thread even when processes are enabled
+PARSE_PROCESS_MIN_BYTES = int(os.environ.get("SCRIPT_EDITOR_PARSE_PROCESS_MIN_KB", "256")) * 1024
+# Processes for CPU-bound jobs such as image resizing
+CPU_PROCESSES = int(os.environ.get("SCRIPT_EDITOR_CPU_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+# Worker processes are spawned: forking while the watcher, writer and I/O threads
+# hold locks can leave the child deadlocked
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+# Concurrent offloaded calls per route group, "name=limit,..." overrides the defaults
+DEFAULT_ROUTE_LIMITS = {
+    "scripts": 4,
+    "chapters": 8,
+    "batch": 4,
+    "assets": 4,
+    "characters": 4,
+    "preview": 2,
+    "agent": 4,
+    "images": 4,
+    "analysis": max(1, CPU_PROCESSES),
+    "lint": 4,
+    "search": 4,
+}
+
+T = TypeVar("T")
+
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    limits = dict(DEFAULT_ROUTE_LIMITS)
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if not name.strip() or not value.strip():
+            continue
+        try:
+            limits[name.strip()] = max(1, int(value))
+        except ValueError:
+            print(f"[Offload] Ignoring invalid route limit: {item}")
+    return limits
+
+
+ROUTE_LIMITS = _parse_limits(os.environ.get("SCRIPT_EDITOR_ROUTE_LIMITS", ""))
+
+
+class Offloader:
+    """Shared executors plus per-route semaphores.
+
+    `run` is awaited from route handlers; the route's semaphore is taken
+    before a worker thread is, so requests above a route's limit wait on
+    the event loop without holding a thread.
+    """
+
+    def __init__(self, io_workers: int = IO_WORKERS, parse_processes: int = PARSE_PROCESSES,
+                 cpu_processes: int = CPU_PROCESSES, route_limits: Optional[Dict[str, int]] = None):
+        self.io_workers = io_workers
+        self.parse_processes = parse_processes
+        self.cpu_processes = cpu_processes
+        self.route_limits = dict(route_limits if route_limits is not None else ROUTE_LIMITS)
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._cpu_pool: Optional[ProcessPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def io_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._io_pool is None:
+                self._io_pool = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="offload-io")
+            return self._io_pool
+
+    def _semaphore(self, route: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(route)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.route_limits.get(route, self.io_workers))
+            self._semaphores[route] = semaphore
+        return semaphore
+
+    async def run(self, route: str, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run `func(*args, **kwargs)` on the I/O pool under `route`'s limit."""
+        async with self._semaphore(route):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.io_pool, functools.partial(func, *args, **kwargs))
+
+    async def run_cpu(self, route: str, func: Callable[..., T], *args: Any) -> T:
+        """Run a picklable `func(*args)` in the CPU process pool under `route`'s limit.
+
+        Falls back to the I/O threads when no processes are configured.
+        """
+        if self.cpu_processes <= 0:
+            return await self.run(route, func, *args)
+        with self._lock:
+            if self._cpu_pool is None:
+                self._cpu_pool = ProcessPoolExecutor(max_workers=self.cpu_processes, mp_context=_MP_CONTEXT)
+            pool = self._cpu_pool
+        async with self._semaphore(route):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, func, *args)
+
+    def parse_yaml(self, raw: bytes) -> Any:
+        """Parse a YAML document, in a worker process if it is large enough.
+
+        Blocking; meant to be called from an I/O thread.
+        """
+        if self.parse_processes <= 0 or len(raw) < PARSE_PROCESS_MIN_BYTES:
+            return yaml_io.load(raw)
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.parse_processes, mp_context=_MP_CONTEXT)
+            pool = self._process_pool
+        return pool.submit(yaml_io.load, raw).result()
+
+    def shutdown(self):
+        with self._lock:
+            io_pool, self._io_pool = self._io_pool, None
+            process_pool, self._process_pool = self._process_pool, None
+            cpu_pool, self._cpu_pool = self._cpu_pool, None
+        if io_pool is not None:
+            io_pool.shutdown(wait=True)
+        for pool in (process_pool, cpu_pool):
+            if pool is not None:
+                pool.shutdown(wait=True)
+
+
+offloader = Offloader()
@@ -0,0 +1,469 @@
+"""
+Incremental preview manifest per script
+Holds the config, chapters, asset URLs and characters the preview needs, each
+tagged with the manifest version it last changed in. The watcher's change
+feed marks entries dirty and a query re-reads only those, so clients can ask
+for just what changed since a version they already have. Manifests are
+persisted under the cache folder by a background thread, at most once per
+save delay, so queries never wait on the write; after a restart only files
+whose mtime/size moved are read again
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from .chapter_cache import chapter_cache, stat_version
+from .chapter_writer import atomic_write
+from .fs_watcher import WorkspaceWatcher
+from . import yaml_io
+from .static_files import ENCODINGS, versioned_url
+from .workspace import BASE_DIR, CACHE_DIR, workspace_index, workspace_watcher
+
+SECTIONS = ("config", "chapters", "assets", "characters")
+CONFIG_FILE = "story_config.yaml"
+MANIFEST_FORMAT = 1
+# Seconds a changed manifest waits before it is persisted
+SAVE_DELAY = float(os.environ.get("SCRIPT_EDITOR_MANIFEST_SAVE_DELAY", "2.0"))
+
+
+def _touched(key: str, dirty: Set[str]) -> bool:
+    """Whether `key` or one of its parent folders was reported changed."""
+    if key in dirty:
+        return True
+    i = key.find("/")
+    while i != -1:
+        if key[:i] in dirty:
+            return True
+        i = key.find("/", i + 1)
+    return False
+
+
+def read_chapter(chapters_dir: Path, rel_path: str) -> Dict[str, Any]:
+    """Parsed chapter for the preview; unreadable chapters carry their error."""
+    try:
+        return chapter_cache.load(chapters_dir / rel_path) or {"events": []}
+    except Exception as e:
+        return {"events": [], "error": str(e)}
+
+
+class _Manifest:
+    """State of one script's manifest.
+
+    `items[section][key]` is `[signature, value, version changed]` and
+    `removed[section][key]` the version a key disappeared in. `dirty[section]`
+    holds the changed keys (or folders) since the last refresh, None meaning
+    the whole section. Versions start at the creation time in milliseconds,
+    so a manifest rebuilt from scratch never reuses a version an older one
+    handed out. `unsaved` is set when the persisted copy is behind.
+    """
+
+    __slots__ = ("base", "version", "items", "removed", "dirty", "unsaved", "lock")
+
+    def __init__(self, base: Optional[int] = None):
+        self.base = base if base is not None else time.time_ns() // 1_000_000
+        self.version = self.base
+        self.items: Dict[str, Dict[str, list]] = {section: {} for section in SECTIONS}
+        self.removed: Dict[str, Dict[str, int]] = {section: {} for section in SECTIONS}
+        self.dirty: Dict[str, Optional[Set[str]]] = {section: None for section in SECTIONS}
+        self.unsaved = False
+        self.lock = threading.Lock()
+
+
+class PreviewManifests:
+    """Versioned preview manifests, refreshed on query from the change feed."""
+
+    def __init__(self, base_dir: Path, cache_dir: Path, watcher: WorkspaceWatcher, save_delay: float = SAVE_DELAY):
+        self.base_dir = base_dir
+        self.cache_dir = cache_dir
+        self.save_delay = save_delay
+        self._watcher = watcher
+        self._lock = threading.Lock()
+        self._manifests: Dict[str, _Manifest] = {}
+        # script -> monotonic time its manifest is due to be saved
+        self._save_due: Dict[str, float] = {}
+        self._save_cond = threading.Condition()
+        self._save_thread: Optional[threading.Thread] = None
+        self._stopping = False
+        watcher.subscribe(self._on_change)
+
+    def _on_change(self, paths: Set[Path]):
+        with self._lock:
+            for path in paths:
+                try:
+                    parts = path.relative_to(self.base_dir).parts
+                except ValueError:
+                    continue
+                if not parts:
+                    for manifest in self._manifests.values():
+                        self._mark(manifest, SECTIONS, None)
+                    continue
+                manifest = self._manifests.get(parts[0])
+                if manifest is None:
+                    # Loaded manifests are reconciled in full on first use
+                    continue
+                if len(parts) == 1:
+                    self._mark(manifest, SECTIONS, None)
+                elif parts[1] == CONFIG_FILE:
+                    self._mark(manifest, ("config",), None)
+                elif parts[1] == "Chapters":
+                    self._mark(manifest, ("chapters",), "/".join(parts[2:]) or None)
+                elif parts[1] == "Assets":
+                    rel = "/".join(parts[2:])
+                    # A precompressed sibling hides or reveals its original
+                    for _, suffix in ENCODINGS:
+                        if rel.endswith(suffix):
+                            self._mark(manifest, ("assets",), rel[:-len(suffix)])
+                        elif rel:
+                            self._mark(manifest, ("assets",), rel + suffix)
+                    self._mark(manifest, ("assets",), rel or None)
+                elif parts[1] == "Characters":
+                    self._mark(manifest, ("characters",), parts[2] if len(parts) > 2 else None)
+
+    @staticmethod
+    def _mark(manifest: _Manifest, sections: Iterable[str], key: Optional[str]):
+        """Mark `key` (None: everything) dirty in `sections` (caller holds the lock)."""
+        for section in sections:
+            if key is None:
+                manifest.dirty[section] = None
+            elif manifest.dirty[section] is not None:
+                manifest.dirty[section].add(key)
+
+    # --- Persistence ---
+
+    def _manifest_path(self, script_id: str) -> Path:
+        return self.cache_dir / f"{script_id}.json"
+
+    def _load(self, script_id: str) -> _Manifest:
+        try:
+            with open(self._manifest_path(script_id), "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("format") != MANIFEST_FORMAT:
+                return _Manifest()
+            manifest = _Manifest(stored["base"])
+            manifest.version = stored["version"]
+            for section in SECTIONS:
+                manifest.items[section] = stored["items"][section]
+                manifest.removed[section] = stored["removed"][section]
+            return manifest
+        except (OSError, ValueError, KeyError, TypeError):
+            return _Manifest()
+
+    def _save(self, script_id: str, manifest: _Manifest):
+        with manifest.lock:
+            if not manifest.unsaved:
+                return
+            manifest.unsaved = False
+            stored = json.dumps({
+                "format": MANIFEST_FORMAT,
+                "base": manifest.base,
+                "version": manifest.version,
+                "items": manifest.items,
+                "removed": manifest.removed,
+            }, ensure_ascii=False, default=str)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            atomic_write(self._manifest_path(script_id), lambda f: f.write(stored))
+        except OSError as e:
+            print(f"[PreviewManifest] Could not persist manifest of {script_id}: {e}")
+            # Retried after the next change
+            with manifest.lock:
+                manifest.unsaved = True
+
+    def _schedule_save(self, script_id: str):
+        """Persist a script's manifest once the save delay has passed."""
+        if self.save_delay <= 0 or self._stopping:
+            self._save_scripts([script_id])
+            return
+        with self._save_cond:
+            if script_id in self._save_due:
+                return
+            self._save_due[script_id] = time.monotonic() + self.save_delay
+            if self._save_thread is None or not self._save_thread.is_alive():
+                self._save_thread = threading.Thread(target=self._run_saves, name="manifest-saver", daemon=True)
+                self._save_thread.start()
+            self._save_cond.notify()
+
+    def _run_saves(self):
+        while True:
+            with self._save_cond:
+                while not self._save_due and not self._stopping:
+                    self._save_cond.wait()
+                if self._stopping:
+                    return
+                now = time.monotonic()
+                next_due = min(self._save_due.values())
+                if next_due > now:
+                    self._save_cond.wait(next_due - now)
+                    continue
+                due = [script_id for script_id, at in self._save_due.items() if at <= now]
+                for script_id in due:
+                    del self._save_due[script_id]
+            self._save_scripts(due)
+
+    def _save_scripts(self, script_ids: Iterable[str]):
+        for script_id in script_ids:
+            with self._lock:
+                manifest = self._manifests.get(script_id)
+            if manifest is not None:
+                self._save(script_id, manifest)
+
+    def flush(self):
+        """Persist every manifest waiting for its save now."""
+        with self._save_cond:
+            due, self._save_due = list(self._save_due), {}
+        self._save_scripts(due)
+
+    def shutdown(self):
+        with self._save_cond:
+            self._stopping = True
+            self._save_cond.notify_all()
+        if self._save_thread is not None:
+            self._save_thread.join(timeout=10)
+            self._save_thread = None
+        self.flush()
+        self._stopping = False
+
+    # --- Reading the script ---
+
+    def _read_config(self, script_dir: Path):
+        config_path = script_dir / CONFIG_FILE
+        with open(config_path, "r", encoding="utf-8") as f:
+            return yaml_io.load(f) or {}
+
+    def _asset_listing(self, script_id: str) -> List[str]:
+        asset_files = workspace_index.asset_files(script_id)
+        present = set(asset_files)
+        # Precompressed siblings are served in place of their original
+        return [
+            rel for rel in asset_files
+            if not any(rel.endswith(suffix) and rel[:-len(suffix)] in present for _, suffix in ENCODINGS)
+        ]
+
+    def _avatar_signature(self, script_dir: Path, script_id: str, char_name: str) -> str:
+        avatar_dir = script_dir / "Characters" / char_name / "avatar"
+        avatar_set = workspace_index.avatar_set(script_id, char_name)
+        return "|".join(
+            f"{file}:{stat_version(os.stat(avatar_dir / file))}"
+            for _, file in sorted(avatar_set.files.items())
+        )
+
+    def _read_character(self, script_dir: Path, script_id: str, char_name: str) -> Dict[str, Any]:
+        avatar_dir = script_dir / "Characters" / char_name / "avatar"
+        avatar_set = workspace_index.avatar_set(script_id, char_name)
+        assets = {}
+        if avatar_set.default is not None:
+            # Store with multiple keys for easy lookup
+            default_url = versioned_url(f"/api/preview/{script_id}/character/{char_name}", avatar_dir / avatar_set.resolve())
+            assets[f"Characters/{char_name}"] = default_url
+            assets[f"{char_name}"] = default_url
+        for emotion, file in avatar_set.files.items():
+            assets[f"Characters/{char_name}/avatar/{emotion}"] = versioned_url(f"/api/preview/{script_id}/character/{char_name}/{emotion}", avatar_dir / file)
+        info = {
+            "id": char_name,
+            "name": char_name,
+            "emotions": list(avatar_set.files),
+            "default_emotion": avatar_set.default,
+            "formats": avatar_set.formats,
+        }
+        return {"info": info, "assets": assets}
+
+    def _reconcile(self, manifest: _Manifest, section: str, dirty: Optional[Set[str]], listing: List[str],
+                   signature: Callable[[str], str], read: Callable[[str], Any], version: int) -> List[str]:
+        """Bring one section in line with `listing`; returns the keys that changed."""
+        items = manifest.items[section]
+        present = set(listing)
+        if dirty is None:
+            affected = present | items.keys()
+        else:
+            affected = {key for key in present | items.keys() if _touched(key, dirty)}
+
+        changed = []
+        for key in sorted(affected):
+            sig = None
+            if key in present:
+                try:
+                    sig = signature(key)
+                except OSError:
+                    pass
+            if sig is None:
+                if key in items:
+                    manifest.unsaved = True
+                    del items[key]
+                    manifest.removed[section][key] = version
+                    changed.append(key)
+                continue
+            entry = items.get(key)
+            if entry is not None and entry[0] == sig:
+                continue
+            value = read(key)
+            manifest.unsaved = True
+            if entry is not None and entry[1] == value:
+                # Touched but unchanged
+                entry[0] = sig
+                continue
+            items[key] = [sig, value, version]
+            manifest.removed[section].pop(key, None)
+            changed.append(key)
+        return changed
+
+    def _apply(self, script_id: str, manifest: _Manifest, dirty: Dict[str, Optional[Set[str]]]) -> bool:
+        """Re-read the dirty entries; returns whether anything changed."""
+        script_dir = self.base_dir / script_id
+        chapters_dir = script_dir / "Chapters"
+        assets_dir = script_dir / "Assets"
+        version = manifest.version + 1
+        changed = False
+
+        if dirty["config"] is None or dirty["config"]:
+            listing = [CONFIG_FILE] if (script_dir / CONFIG_FILE).is_file() else []
+            changed |= bool(self._reconcile(
+                manifest, "config", None, listing,
+                lambda key: stat_version(os.stat(script_dir / key)),
+                lambda key: self._read_config(script_dir), version
+            ))
+
+        if dirty["chapters"] is None or dirty["chapters"]:
+            changed |= bool(self._reconcile(
+                manifest, "chapters", dirty["chapters"], workspace_index.chapters(script_id),
+                lambda key: chapter_cache.version(chapters_dir / key),
+                lambda key: read_chapter(chapters_dir, key), version
+            ))
+
+        if dirty["assets"] is None or dirty["assets"]:
+            changed |= bool(self._reconcile(
+                manifest, "assets", dirty["assets"], self._asset_listing(script_id),
+                lambda key: stat_version(os.stat(assets_dir / key)),
+                lambda key: versioned_url(f"/api/preview/{script_id}/assets/{key}", assets_dir / key), version
+            ))
+
+        if dirty["characters"] is None or dirty["characters"]:
+            characters = manifest.items["characters"]
+            before = {key: set(entry[1]["assets"]) for key, entry in characters.items()}
+            updated = self._reconcile(
+                manifest, "characters", dirty["characters"], workspace_index.character_dirs(script_id),
+                lambda key: self._avatar_signature(script_dir, script_id, key),
+                lambda key: self._read_character(script_dir, script_id, key), version
+            )
+            # Image keys of emotions (or characters) that went away
+            for key in updated:
+                gone = before.get(key, set()) - set(characters[key][1]["assets"] if key in characters else ())
+                for asset_key in gone:
+                    manifest.removed["assets"][asset_key] = version
+            changed |= bool(updated)
+
+        if changed:
+            manifest.version = version
+        return changed
+
+    def _refresh(self, script_id: str, sections: Iterable[str] = SECTIONS) -> Optional[_Manifest]:
+        if not (self.base_dir / script_id).is_dir():
+            return None
+        self._watcher.start()
+        with self._lock:
+            manifest = self._manifests.get(script_id)
+        if manifest is None:
+            loaded = self._load(script_id)
+            with self._lock:
+                manifest = self._manifests.setdefault(script_id, loaded)
+
+        with manifest.lock:
+            with self._lock:
+                # Sections left out stay dirty for a later query
+                dirty = {section: set() for section in SECTIONS}
+                for section in sections:
+                    dirty[section] = manifest.dirty[section]
+                    manifest.dirty[section] = set()
+            try:
+                self._apply(script_id, manifest, dirty)
+            except BaseException:
+                # Keep the entries dirty so the next query retries them
+                with self._lock:
+                    for section, keys in dirty.items():
+                        if keys is None:
+                            manifest.dirty[section] = None
+                        elif manifest.dirty[section] is not None:
+                            manifest.dirty[section].update(keys)
+                raise
+            unsaved = manifest.unsaved
+        if unsaved:
+            self._schedule_save(script_id)
+        return manifest
+
+    # --- Queries ---
+
+    def get(self, script_id: str, since: Optional[int] = None,
+            sections: Iterable[str] = SECTIONS) -> Optional[Dict[str, Any]]:
+        """Preview data of a script, or only what changed after version `since`.
+
+        The full form (also used when `since` is unknown, e.g. from before
+        the manifest was rebuilt) carries every chapter, asset URL and
+        character. The incremental form carries the changed entries plus
+        the keys removed since then. Only `sections` are refreshed and
+        returned; leaving out "chapters" avoids parsing them. Returns None
+        when the script does not exist. Blocking; run it through the
+        offloader.
+        """
+        sections = tuple(sections)
+        manifest = self._refresh(script_id, sections)
+        if manifest is None:
+            return None
+
+        with manifest.lock:
+            items = manifest.items
+            full = since is None or not manifest.base <= since <= manifest.version
+            after = manifest.base - 1 if full else since
+
+            def changed(section: str) -> List[str]:
+                return sorted(key for key, entry in items[section].items() if entry[2] > after)
+
+            config = items["config"].get(CONFIG_FILE)
+            characters = [items["characters"][key][1] for key in changed("characters")]
+            assets = {key: items["assets"][key][1] for key in changed("assets")}
+            for character in characters:
+                assets.update(character["assets"])
+
+            data = {
+                "version": manifest.version,
+                "full": full,
+                "chapters": {key: items["chapters"][key][1] for key in changed("chapters")},
+                "assets": assets,
+                "characters": [character["info"] for character in characters],
+            }
+            if full:
+                data["config"] = config[1] if config is not None else {}
+                return self._select(data, sections)
+
+            data["since"] = since
+            if config is not None and config[2] > since:
+                data["config"] = config[1]
+            character_assets = set()
+            for entry in items["characters"].values():
+                character_assets.update(entry[1]["assets"])
+            data["removed"] = {
+                "config": CONFIG_FILE in manifest.removed["config"] and config is None
+                          and manifest.removed["config"][CONFIG_FILE] > since,
+                "chapters": sorted(key for key, removed in manifest.removed["chapters"].items()
+                                   if removed > since and key not in items["chapters"]),
+                "assets": sorted(key for key, removed in manifest.removed["assets"].items()
+                                 if removed > since and key not in items["assets"] and key not in character_assets),
+                "characters": sorted(key for key, removed in manifest.removed["characters"].items()
+                                     if removed > since and key not in items["characters"]),
+            }
+            data["removed"] = self._select(data["removed"], sections)
+            return self._select(data, sections)
+
+    @staticmethod
+    def _select(data: Dict[str, Any], sections: Iterable[str]) -> Dict[str, Any]:
+        """Drop the sections that were not asked for."""
+        for section in SECTIONS:
+            if section not in sections:
+                data.pop(section, None)
+        return data
+
+
+preview_manifests = PreviewManifests(BASE_DIR, CACHE_DIR / "manifests", workspace_watcher)
+atexit.register(preview_manifests.shutdown)
@@ -0,0 +1,133 @@
+"""
+In-process catalog of story_config.yaml files
+Each config is parsed once and kept until the watcher reports a change to it
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from . import yaml_io
+from .fs_watcher import WorkspaceWatcher
+
+CONFIG_FILE = "story_config.yaml"
+
+
+class _CatalogEntry:
+    __slots__ = ("mtime_ns", "size", "data", "error")
+
+    def __init__(self, mtime_ns: int, size: int, data: Optional[Dict[str, Any]], error: Optional[Exception]):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.data = data
+        self.error = error
+
+
+class ScriptCatalog:
+    """Parsed script configs keyed by (path, mtime, size).
+
+    The watcher marks scripts dirty; `list_scripts` only re-stats and
+    re-parses dirty scripts, so its cost follows the number of changes
+    instead of the number of scripts in the workspace.
+    """
+
+    def __init__(self, base_dir: Path, watcher: WorkspaceWatcher):
+        self.base_dir = base_dir
+        self._watcher = watcher
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _CatalogEntry] = {}
+        self._dirty: Set[str] = set()
+        self._needs_full_scan = True
+        self._listing: Optional[List[Dict[str, Any]]] = None
+        watcher.subscribe(self._on_change)
+
+    def _on_change(self, paths: Set[Path]):
+        with self._lock:
+            for path in paths:
+                try:
+                    parts = path.relative_to(self.base_dir).parts
+                except ValueError:
+                    continue
+                if not parts:
+                    self._needs_full_scan = True
+                elif len(parts) == 1 or parts[1] == CONFIG_FILE:
+                    self._dirty.add(parts[0])
+                else:
+                    continue
+                self._listing = None
+
+    def _load_entry(self, script_id: str) -> Optional[_CatalogEntry]:
+        config_path = self.base_dir / script_id / CONFIG_FILE
+        try:
+            st = os.stat(config_path)
+        except OSError:
+            return None
+
+        cached = self._entries.get(script_id)
+        if cached is not None and cached.mtime_ns == st.st_mtime_ns and cached.size == st.st_size:
+            return cached
+
+        data, error = None, None
+        try:
+            with open(config_path, "r", encoding="utf-8") as f:
+                data = yaml_io.load(f)
+            if not isinstance(data, dict):
+                data = None
+        except Exception as e:
+            print(f"Failed to load {config_path}: {e}")
+            error = e
+        return _CatalogEntry(st.st_mtime_ns, st.st_size, data, error)
+
+    def _refresh(self, script_id: str):
+        entry = self._load_entry(script_id)
+        if entry is self._entries.get(script_id):
+            return
+        if entry is None:
+            del self._entries[script_id]
+        else:
+            self._entries[script_id] = entry
+        self._listing = None
+
+    def list_scripts(self) -> List[Dict[str, Any]]:
+        self._watcher.start()
+        with self._lock:
+            if self._listing is not None:
+                return self._listing
+
+            if self._needs_full_scan:
+                self._needs_full_scan = False
+                present = set()
+                if self.base_dir.exists():
+                    present = {item.name for item in self.base_dir.iterdir() if item.is_dir()}
+                for script_id in self._entries.keys() - present:
+                    del self._entries[script_id]
+                self._dirty.update(present)
+
+            for script_id in self._dirty:
+                self._refresh(script_id)
+            self._dirty.clear()
+
+            self._listing = [
+                dict(entry.data, id=script_id)
+                for script_id, entry in sorted(self._entries.items())
+                if entry.data is not None
+            ]
+            return self._listing
+
+    def get_script(self, script_id: str) -> Optional[Dict[str, Any]]:
+        """Return one parsed config, re-validating it with a single stat.
+
+        Returns None when the config file does not exist and re-raises the
+        parse error when it cannot be loaded.
+        """
+        self._watcher.start()
+        with self._lock:
+            self._refresh(script_id)
+            entry = self._entries.get(script_id)
+            if entry is None:
+                return None
+            if entry.error is not None:
+                raise entry.error
+            if entry.data is None:
+                raise ValueError(f"{CONFIG_FILE} is not a mapping")
+            return dict(entry.data, id=script_id)
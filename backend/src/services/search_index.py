@@ -0,0 +1,369 @@
+"""
+Full-text search over event text
+An inverted index of the `text`, `prompt`, `hint` and option texts of every
+event in every script. Latin text is split into words; CJK text, which has
+no spaces, is indexed as single characters and overlapping character
+pairs. Every string value of a chapter is also indexed per chapter, words
+together with their character trigrams, so bulk edits can skip chapters
+that cannot contain a literal, even one that starts or ends mid-word. The
+index is
+built on the first search and then updated from workspace changes,
+re-reading only the chapters that changed
+"""
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .chapter_cache import chapter_cache
+from .fs_watcher import WorkspaceWatcher
+from .workspace import BASE_DIR, script_catalog, workspace_index, workspace_watcher
+
+# Event fields that hold searchable text
+TEXT_FIELDS = ("text", "prompt", "hint")
+# Option fields that hold searchable text
+OPTION_FIELDS = ("text", "description")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Score multiplier for events containing the query verbatim
+PHRASE_BOOST = 2.0
+
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_TOKEN_RE = re.compile(f"(?P<cjk>[{_CJK}]+)|(?P<word>[^\\W_{_CJK}]+)")
+_SPACE_RE = re.compile(r"\s+")
+# Marks the trigram terms of string values; words never contain it
+_GRAM = "#"
+
+
+def _runs(text: str) -> Iterator[Tuple[bool, str]]:
+    for match in _TOKEN_RE.finditer(text.casefold()):
+        if match.group("cjk"):
+            yield True, match.group("cjk")
+        else:
+            yield False, match.group("word")
+
+
+def tokenize(text: str) -> List[str]:
+    """Index terms of a text: words, CJK characters and CJK character pairs."""
+    terms = []
+    for cjk, run in _runs(text):
+        if not cjk:
+            terms.append(run)
+            continue
+        terms.extend(run)
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def query_terms(query: str) -> List[str]:
+    """Terms a query must match: words, and CJK pairs (single characters only when alone)."""
+    terms = []
+    for cjk, run in _runs(query):
+        if cjk and len(run) > 1:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run)
+    return list(dict.fromkeys(terms))
+
+
+def value_terms(text: str) -> Set[str]:
+    """Terms of a string value for literal lookups: index terms plus trigrams of every word."""
+    terms = set(tokenize(text))
+    for cjk, run in _runs(text):
+        if not cjk:
+            terms.update(_GRAM + run[i:i + 3] for i in range(len(run) - 2))
+    return terms
+
+
+def literal_terms(literal: str, whole_value: bool = False) -> List[str]:
+    """Terms every string value containing `literal` must have.
+
+    CJK characters and pairs, words that are cut off by neither end of the
+    literal (any word when the whole value must equal it) and, for the
+    words at the ends, their trigrams.
+    """
+    literal = literal.casefold()
+    terms = []
+    for match in _TOKEN_RE.finditer(literal):
+        run = match.group()
+        if match.group("cjk"):
+            terms.extend(run if len(run) == 1 else (run[i:i + 2] for i in range(len(run) - 1)))
+        elif whole_value or (match.start() > 0 and match.end() < len(literal)):
+            terms.append(run)
+        else:
+            terms.extend(_GRAM + run[i:i + 3] for i in range(len(run) - 2))
+    return list(dict.fromkeys(terms))
+
+
+def string_values(node: Any) -> Iterator[str]:
+    """Every string value below `node` (dict keys excluded)."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, str):
+            yield node
+        elif isinstance(node, dict):
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+
+
+def _normalize(text: str) -> str:
+    return _SPACE_RE.sub(" ", text.casefold()).strip()
+
+
+def event_texts(event: Any) -> List[Tuple[str, str]]:
+    """`(field, text)` of an event's searchable fields; options are named like `options[1]`."""
+    if not isinstance(event, dict):
+        return []
+    texts = [(field, event[field]) for field in TEXT_FIELDS if isinstance(event.get(field), str) and event[field]]
+    options = event.get("options")
+    if isinstance(options, list):
+        for i, option in enumerate(options):
+            if isinstance(option, str) and option:
+                texts.append((f"options[{i}]", option))
+            elif isinstance(option, dict):
+                texts.extend(
+                    (f"options[{i}]", option[field]) for field in OPTION_FIELDS
+                    if isinstance(option.get(field), str) and option[field]
+                )
+    elif isinstance(options, str) and options:
+        texts.append(("options", options))
+    return texts
+
+
+class _Doc:
+    __slots__ = ("script_id", "chapter", "event", "type", "fields", "normalized", "terms", "length")
+
+    def __init__(self, script_id: str, chapter: str, event: int, event_type: Any, fields: List[Tuple[str, str]]):
+        self.script_id = script_id
+        self.chapter = chapter
+        self.event = event
+        self.type = event_type if isinstance(event_type, str) else None
+        self.fields = fields
+        self.normalized = [_normalize(text) for _, text in fields]
+        terms = []
+        for _, text in fields:
+            terms.extend(tokenize(text))
+        self.terms = Counter(terms)
+        self.length = len(terms)
+
+
+class SearchIndex:
+    """Inverted index of event text across the workspace, updated per changed chapter."""
+
+    def __init__(self, base_dir: Path, watcher: WorkspaceWatcher):
+        self.base_dir = base_dir
+        self._watcher = watcher
+        # Guards the change queue; the index itself is guarded by _index_lock
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._changes: Dict[str, Optional[Set[str]]] = {}
+        self._full = True
+        self._docs: Dict[int, _Doc] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # Terms of all string values -> (script, chapter)
+        self._value_postings: Dict[str, Set[Tuple[str, str]]] = {}
+        # script -> chapter -> (version, doc ids, value terms)
+        self._chapters: Dict[str, Dict[str, Tuple[Optional[str], List[int], Set[str]]]] = {}
+        self._next_id = 0
+        self._total_length = 0
+        watcher.subscribe(self._on_change)
+
+    def _on_change(self, paths: Set[Path]):
+        with self._lock:
+            for path in paths:
+                try:
+                    parts = path.relative_to(self.base_dir).parts
+                except ValueError:
+                    continue
+                if not parts:
+                    self._full = True
+                    self._changes.clear()
+                    return
+                if parts[0] not in self._chapters:
+                    continue
+                if len(parts) == 1 or (len(parts) == 2 and parts[1] == "Chapters"):
+                    self._changes[parts[0]] = None
+                elif parts[1] == "Chapters":
+                    dirty = self._changes.setdefault(parts[0], set())
+                    if dirty is not None:
+                        dirty.add("/".join(parts[2:]))
+
+    # --- Updating ---
+
+    def _remove_chapter(self, script_id: str, chapter: str):
+        _, doc_ids, value_terms = self._chapters[script_id].pop(chapter)
+        for term in value_terms:
+            chapters = self._value_postings[term]
+            chapters.discard((script_id, chapter))
+            if not chapters:
+                del self._value_postings[term]
+        for doc_id in doc_ids:
+            doc = self._docs.pop(doc_id)
+            self._total_length -= doc.length
+            for term in doc.terms:
+                postings = self._postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self._postings[term]
+
+    def _add_chapter(self, script_id: str, chapter: str, version: Optional[str]):
+        path = self.base_dir / script_id / "Chapters" / chapter
+        doc_ids = []
+        try:
+            data, version = chapter_cache.load_versioned(path)
+        except Exception:
+            # Unreadable chapters have nothing to find until they change
+            data = None
+        events = data.get("events") if isinstance(data, dict) else None
+        for index, event in enumerate(events if isinstance(events, list) else []):
+            fields = event_texts(event)
+            if not fields:
+                continue
+            doc = _Doc(script_id, chapter, index, event.get("type"), fields)
+            doc_id = self._next_id
+            self._next_id += 1
+            self._docs[doc_id] = doc
+            self._total_length += doc.length
+            for term, count in doc.terms.items():
+                self._postings.setdefault(term, {})[doc_id] = count
+            doc_ids.append(doc_id)
+        terms = set()
+        for value in string_values(events):
+            terms |= value_terms(value)
+        for term in terms:
+            self._value_postings.setdefault(term, set()).add((script_id, chapter))
+        self._chapters[script_id][chapter] = (version, doc_ids, terms)
+
+    def _refresh_script(self, script_id: str, dirty: Optional[Set[str]]):
+        indexed = self._chapters.setdefault(script_id, {})
+        chapters = workspace_index.chapters(script_id)
+        present = set(chapters)
+        for chapter in [c for c in indexed if c not in present]:
+            self._remove_chapter(script_id, chapter)
+        for chapter in chapters:
+            cached = indexed.get(chapter)
+            if cached is not None and dirty is not None and not any(
+                chapter == key or chapter.startswith(key + "/") for key in dirty
+            ):
+                continue
+            try:
+                version = chapter_cache.version(self.base_dir / script_id / "Chapters" / chapter)
+            except OSError:
+                version = None
+            if cached is not None:
+                if version is not None and cached[0] == version:
+                    continue
+                self._remove_chapter(script_id, chapter)
+            self._add_chapter(script_id, chapter, version)
+
+    def _update(self):
+        """Apply queued changes. Called with the index lock held."""
+        self._watcher.start()
+        with self._lock:
+            changes, self._changes = self._changes, {}
+            full, self._full = self._full, False
+        try:
+            scripts = [script["id"] for script in script_catalog.list_scripts()]
+            for script_id in [s for s in self._chapters if s not in scripts]:
+                for chapter in list(self._chapters[script_id]):
+                    self._remove_chapter(script_id, chapter)
+                del self._chapters[script_id]
+            for script_id in scripts:
+                if full or script_id not in self._chapters:
+                    self._refresh_script(script_id, None)
+                elif script_id in changes:
+                    self._refresh_script(script_id, changes[script_id])
+        except BaseException:
+            with self._lock:
+                self._full = True
+            raise
+
+    # --- Searching ---
+
+    def search(self, query: str, script_id: Optional[str] = None, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """Events whose text contains every term of `query`, best first.
+
+        Results are ranked by BM25, with events that contain the query
+        verbatim ranked higher. Each result names the script, chapter
+        (relative to Chapters/) and event index, and quotes the field that
+        matched. Blocking; run it through the offloader.
+        """
+        terms = query_terms(query)
+        phrase = _normalize(query)
+        with self._index_lock:
+            self._update()
+            if not terms or not self._docs:
+                return {"query": query, "total": 0, "results": []}
+
+            postings = sorted((self._postings.get(term, {}) for term in terms), key=len)
+            candidates = set(postings[0])
+            for other in postings[1:]:
+                candidates.intersection_update(other)
+                if not candidates:
+                    break
+            if script_id is not None:
+                candidates = {doc_id for doc_id in candidates if self._docs[doc_id].script_id == script_id}
+
+            count = len(self._docs)
+            average = self._total_length / count or 1
+            idf = [math.log(1 + (count - len(p) + 0.5) / (len(p) + 0.5)) for p in postings]
+            scored = []
+            for doc_id in candidates:
+                doc = self._docs[doc_id]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * doc.length / average)
+                score = 0.0
+                for weight, term_postings in zip(idf, postings):
+                    tf = term_postings[doc_id]
+                    score += weight * tf * (BM25_K1 + 1) / (tf + norm)
+                if any(phrase in text for text in doc.normalized):
+                    score *= PHRASE_BOOST
+                scored.append((-score, doc.script_id, doc.chapter, doc.event, doc_id))
+            page = heapq.nsmallest(offset + limit, scored)[offset:]
+
+            results = []
+            for neg_score, _, _, _, doc_id in page:
+                doc = self._docs[doc_id]
+                field, text = next(
+                    (doc.fields[i] for i, text in enumerate(doc.normalized) if phrase in text),
+                    doc.fields[0],
+                )
+                results.append({
+                    "script": doc.script_id,
+                    "chapter": doc.chapter,
+                    "event": doc.event,
+                    "type": doc.type,
+                    "field": field,
+                    "text": text,
+                    "score": round(-neg_score, 4),
+                })
+            return {"query": query, "total": len(scored), "results": results}
+
+    def candidate_chapters(self, script_id: str, literal: str, whole_value: bool = False) -> Optional[List[str]]:
+        """Chapters of a script that may contain `literal` in some string value.
+
+        Uses the terms of `literal_terms`. Returns None when there are none
+        (e.g. a literal of punctuation or a two-letter fragment) and every
+        chapter has to be read.
+        """
+        terms = literal_terms(literal, whole_value)
+        if not terms:
+            return None
+        with self._index_lock:
+            self._update()
+            candidates: Optional[Set[Tuple[str, str]]] = None
+            for term in sorted(terms, key=lambda term: len(self._value_postings.get(term, ()))):
+                chapters = self._value_postings.get(term, set())
+                candidates = set(chapters) if candidates is None else candidates & chapters
+                if not candidates:
+                    break
+            return sorted(chapter for script, chapter in candidates or () if script == script_id)
+
+
+search_index = SearchIndex(BASE_DIR, workspace_watcher)
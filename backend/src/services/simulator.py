@@ -0,0 +1,409 @@
+"""
+Headless playthrough simulator
+Runs a script from its intro chapter without a player: set_variable events
+and option actions update the variables, conditions skip events, and every
+choice and chapter_end branch (ai_judged included) is taken. States are
+deduplicated by chapter, event and variables, so converging branches are
+explored once. After a short breadth-first start the frontier is split
+across the CPU process pool; the merged state graph then yields the
+reachable endings, path counts, loops without an exit and the events no
+playthrough reaches
+"""
+import asyncio
+import os
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .chapter_cache import chapter_cache
+from . import yaml_io
+from .conditions import ConditionError, compile_condition, evaluate
+from .offload import offloader
+from .story_graph import END_CHAPTER, resolve_chapter
+from .workspace import BASE_DIR, workspace_index
+
+# Upper bound on explored states per simulation
+MAX_STATES = int(os.environ.get("SCRIPT_EDITOR_SIMULATOR_MAX_STATES", "200000"))
+# Frontier partitions per CPU process
+PARTITIONS_PER_PROCESS = 4
+# Example paths listed per loop report
+MAX_LOOP_REPORTS = 20
+
+# A state is (chapter, event index, sorted variable items); an ending is
+# (None, kind, chapter, event index, detail)
+State = Tuple[Any, ...]
+Edge = Tuple[str, int, State]
+
+
+def literal_value(raw: Any) -> Tuple[bool, Any]:
+    """`(True, value)` when a set_variable value needs no variables, else `(False, text)`.
+
+    Numbers and booleans written as text are converted; other text may
+    be an expression and is resolved by `assigned_value`.
+    """
+    if not isinstance(raw, str):
+        return True, raw if isinstance(raw, (int, float, bool, type(None))) else str(raw)
+    text = raw.strip()
+    for parse in (int, float):
+        try:
+            return True, parse(text)
+        except ValueError:
+            pass
+    if text in ("true", "false"):
+        return True, text == "true"
+    return False, raw
+
+
+def assigned_value(spec: Tuple[bool, Any], variables: Dict[str, Any]) -> Any:
+    """Value a set_variable stores, from its `literal_value`.
+
+    Expressions over variables that are already set (`love + 1`) are
+    evaluated; any other text, and expressions that do not yield a
+    number, string, boolean or null (e.g. `[1, 2]`), are stored as a string.
+    """
+    is_literal, value = spec
+    if is_literal:
+        return value
+    try:
+        condition = compile_condition(value.strip())
+    except ConditionError:
+        return value
+    if condition is None or not condition.names <= variables.keys():
+        return value
+    try:
+        result = condition.value(variables)
+    except (TypeError, ValueError, ArithmeticError):
+        return value
+    # States are hashed, so variables only hold scalars
+    return result if isinstance(result, (int, float, bool, str, type(None))) else value
+
+
+def _actions(actions: Any) -> List[Tuple[str, Any]]:
+    """(name, value) of the set_variable actions of an option."""
+    result = []
+    for action in actions or []:
+        if isinstance(action, dict) and action.get("type") == "set_variable" and action.get("name"):
+            result.append((str(action["name"]), literal_value(action.get("content", action.get("value")))))
+    return result
+
+
+def compile_program(chapters: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """Reduce parsed chapters to what the simulator needs, with chapter references resolved.
+
+    Branch targets are ("chapter", path), ("end", None) or ("missing", ref).
+    """
+    present = set(chapters)
+
+    def target(ref: Any) -> Tuple[str, Optional[str]]:
+        if not isinstance(ref, str) or not ref or ref == END_CHAPTER:
+            return ("end", None)
+        resolved = resolve_chapter(ref, present)
+        return ("chapter", resolved) if resolved is not None else ("missing", ref)
+
+    program = {}
+    for path, chapter in chapters.items():
+        events = chapter.get("events") if isinstance(chapter, dict) else None
+        compiled = []
+        for event in events or []:
+            if not isinstance(event, dict):
+                compiled.append({"type": None, "condition": None})
+                continue
+            event_type = event.get("type")
+            item = {"type": event_type, "condition": event.get("condition") or None}
+            if event_type == "set_variable":
+                item["name"] = str(event.get("name") or "")
+                item["value"] = literal_value(event.get("value", event.get("content")))
+            elif event_type == "choices":
+                item["branches"] = [
+                    (str(option.get("text", i)), _actions(option.get("actions")), option.get("condition") or None)
+                    for i, option in enumerate(event.get("options") or []) if isinstance(option, dict)
+                ]
+                item["allow_free"] = event.get("allow_free") in (True, "true")
+            elif event_type in ("chapter_end", "end"):
+                options = [option for option in event.get("options") or [] if isinstance(option, dict)]
+                if event_type == "chapter_end" and event.get("end_type") in ("branching", "ai_judged") and options:
+                    item["branches"] = [
+                        (str(option.get("text", i)), target(option.get("next_chapter")),
+                         _actions(option.get("actions")), option.get("condition") or None)
+                        for i, option in enumerate(options)
+                    ]
+                else:
+                    ref = event.get("next_chapter") if event_type == "chapter_end" else event.get("next")
+                    item["branches"] = [("", target(ref), [], None)]
+            compiled.append(item)
+        program[path] = compiled
+    return program
+
+
+def _freeze(variables: Dict[str, Any]) -> tuple:
+    return tuple(sorted(variables.items()))
+
+
+def _apply(variables: Dict[str, Any], actions: List[Tuple[str, Any]]) -> Dict[str, Any]:
+    if not actions:
+        return variables
+    variables = dict(variables)
+    for name, value in actions:
+        variables[name] = assigned_value(value, variables)
+    return variables
+
+
+def step(program: Dict[str, List[Dict[str, Any]]], state: State) -> Tuple[List[Edge], List[Tuple[str, int]]]:
+    """Run from `state` to the next decision; returns the outgoing edges and the executed events.
+
+    Edges are (choice label, event index, next state or ending).
+    """
+    chapter, index, frozen = state
+    variables = dict(frozen)
+    events = program.get(chapter, [])
+    covered = []
+    while index < len(events):
+        event = events[index]
+        if event["condition"] is not None and not evaluate(event["condition"], variables):
+            index += 1
+            continue
+        covered.append((chapter, index))
+        event_type = event["type"]
+        if event_type == "set_variable":
+            if event["name"]:
+                variables[event["name"]] = assigned_value(event["value"], variables)
+        elif event_type == "choices":
+            edges = []
+            for label, actions, condition in event["branches"]:
+                if condition is None or evaluate(condition, variables):
+                    edges.append((label, index, (chapter, index + 1, _freeze(_apply(variables, actions)))))
+            if event["allow_free"]:
+                edges.append(("[free input]", index, (chapter, index + 1, _freeze(variables))))
+            if edges:
+                return edges, covered
+        elif event_type in ("chapter_end", "end"):
+            edges = []
+            for label, (kind, value), actions, condition in event["branches"]:
+                if condition is not None and not evaluate(condition, variables):
+                    continue
+                branch_variables = _apply(variables, actions)
+                if kind == "chapter":
+                    edges.append((label, index, (value, 0, _freeze(branch_variables))))
+                else:
+                    edges.append((label, index, (None, kind, chapter, index, value)))
+            if not edges:
+                edges.append(("", index, (None, "blocked", chapter, index, None)))
+            return edges, covered
+        index += 1
+    # Ran off the end of the chapter without a chapter_end
+    return [("", index, (None, "dead_end", chapter, index, None))], covered
+
+
+def explore(program: Dict[str, List[Dict[str, Any]]], roots: Iterable[State],
+            max_states: int, known: Iterable[State] = ()) -> Dict[str, Any]:
+    """Explore every state reachable from `roots` (depth first), up to `max_states`.
+
+    Runs in a worker process. States in `known` are not expanded again.
+    """
+    graph: Dict[State, List[Edge]] = {}
+    covered: Set[Tuple[str, int]] = set()
+    skip = set(known)
+    stack = list(roots)
+    truncated = False
+    while stack:
+        state = stack.pop()
+        if state in graph or state in skip:
+            continue
+        if len(graph) >= max_states:
+            truncated = True
+            break
+        edges, executed = step(program, state)
+        graph[state] = edges
+        covered.update(executed)
+        for _, _, target in edges:
+            if target[0] is not None and target not in graph:
+                stack.append(target)
+    return {"graph": graph, "covered": covered, "truncated": truncated}
+
+
+def _seed(program: Dict[str, List[Dict[str, Any]]], start: State, target: int, max_states: int):
+    """Breadth-first expansion until the frontier is wide enough to split."""
+    graph: Dict[State, List[Edge]] = {}
+    covered: Set[Tuple[str, int]] = set()
+    frontier = deque([start])
+    queued = {start}
+    while frontier and len(frontier) < target and len(graph) < max_states:
+        state = frontier.popleft()
+        edges, executed = step(program, state)
+        graph[state] = edges
+        covered.update(executed)
+        for _, _, next_state in edges:
+            if next_state[0] is not None and next_state not in graph and next_state not in queued:
+                queued.add(next_state)
+                frontier.append(next_state)
+    return graph, covered, list(frontier)
+
+
+def _analyze(program: Dict[str, List[Dict[str, Any]]], start: State, graph: Dict[State, List[Edge]],
+             covered: Set[Tuple[str, int]], truncated: bool) -> Dict[str, Any]:
+    # Shortest route to every state, for example paths
+    parents: Dict[State, Optional[Tuple[State, str, int]]] = {start: None}
+    queue = deque([start])
+    while queue:
+        state = queue.popleft()
+        for label, index, target in graph.get(state, ()):
+            if target not in parents:
+                parents[target] = (state, label, index)
+                if target[0] is not None:
+                    queue.append(target)
+
+    def path_to(node: State) -> List[Dict[str, Any]]:
+        steps = []
+        while parents.get(node) is not None:
+            node, label, index = parents[node]
+            if label:
+                steps.append({"chapter": node[0], "event": index, "choice": label})
+        steps.reverse()
+        return steps
+
+    # Depth-first order: back edges are loops, the rest is a DAG to count paths over
+    order: List[State] = []
+    visiting: Set[State] = set()
+    done: Set[State] = set()
+    back_edges: Set[Tuple[State, State]] = set()
+    stack = [(start, iter(graph.get(start, ())))]
+    visiting.add(start)
+    while stack:
+        state, edges = stack[-1]
+        for _, _, target in edges:
+            if target in visiting:
+                back_edges.add((state, target))
+            elif target not in done:
+                visiting.add(target)
+                stack.append((target, iter(graph.get(target, ()) if target[0] is not None else ())))
+                break
+        else:
+            stack.pop()
+            visiting.discard(state)
+            done.add(state)
+            order.append(state)
+    order.reverse()
+    paths_to: Dict[State, int] = {start: 1}
+    for state in order:
+        count = paths_to.get(state, 0)
+        if not count or state[0] is None:
+            continue
+        for _, _, target in graph.get(state, ()):
+            if (state, target) not in back_edges:
+                paths_to[target] = paths_to.get(target, 0) + count
+
+    # States from which no ending can be reached are stuck in a loop;
+    # states left unexplored (budget) are given the benefit of the doubt
+    reverse: Dict[State, List[State]] = {}
+    for state, edges in graph.items():
+        for _, _, target in edges:
+            reverse.setdefault(target, []).append(state)
+    can_finish = {node for node in parents if node[0] is None or node not in graph}
+    queue = deque(can_finish)
+    while queue:
+        node = queue.popleft()
+        for source in reverse.get(node, ()):
+            if source not in can_finish:
+                can_finish.add(source)
+                queue.append(source)
+    stuck = [state for state in graph if state not in can_finish and state in parents]
+    loop_entries = [
+        state for state in stuck
+        if parents[state] is None or parents[state][0] in can_finish
+    ]
+
+    endings = []
+    for node in parents:
+        if node[0] is not None:
+            continue
+        _, kind, chapter, index, detail = node
+        endings.append({
+            "kind": kind, "chapter": chapter, "event": index, "detail": detail,
+            "paths": paths_to.get(node, 0), "example": path_to(node),
+        })
+    endings.sort(key=lambda ending: (ending["chapter"], ending["event"], ending["kind"], str(ending["detail"])))
+
+    total_events = sum(len(events) for events in program.values())
+    unreachable = {}
+    for chapter, events in program.items():
+        missed = [index for index in range(len(events)) if (chapter, index) not in covered]
+        if missed:
+            unreachable[chapter] = missed
+    entered = {state[0] for state in graph}
+
+    return {
+        "start": start[0],
+        "states": len(graph),
+        "truncated": truncated,
+        "paths": sum(ending["paths"] for ending in endings),
+        "endings": endings,
+        "loops": [
+            {"chapter": state[0], "event": state[1], "variables": dict(state[2]), "example": path_to(state)}
+            for state in sorted(loop_entries, key=lambda s: (s[0], s[1], repr(s[2])))[:MAX_LOOP_REPORTS]
+        ],
+        "stuck_states": len(stuck),
+        "coverage": {
+            "events": total_events,
+            "covered": len(covered),
+            "ratio": round(len(covered) / total_events, 4) if total_events else 1.0,
+            "chapters": len(program),
+            "entered_chapters": len(entered),
+        },
+        "unreachable_chapters": sorted(chapter for chapter in program if chapter not in entered),
+        "unreachable_events": unreachable,
+    }
+
+
+def load_program(script_id: str) -> Tuple[Dict[str, List[Dict[str, Any]]], Optional[str]]:
+    """Compiled program of a script and its start chapter (intro_chapter, else the first)."""
+    script_dir = BASE_DIR / script_id
+    chapters = {}
+    for path in workspace_index.chapters(script_id):
+        try:
+            chapters[path] = chapter_cache.load(script_dir / "Chapters" / path) or {}
+        except Exception as e:
+            print(f"[Simulator] Skipping unreadable chapter {script_id}/{path}: {e}")
+            chapters[path] = {}
+    config = {}
+    config_path = script_dir / "story_config.yaml"
+    if config_path.exists():
+        try:
+            with open(config_path, "r", encoding="utf-8") as f:
+                config = yaml_io.load(f) or {}
+        except Exception as e:
+            print(f"[Simulator] Could not read {config_path}: {e}")
+    start = None
+    intro = config.get("intro_chapter") if isinstance(config, dict) else None
+    if isinstance(intro, str):
+        start = resolve_chapter(intro, set(chapters))
+    if start is None and chapters:
+        start = sorted(chapters)[0]
+    return compile_program(chapters), start
+
+
+async def simulate(script_id: str, max_states: int = MAX_STATES) -> Dict[str, Any]:
+    """Explore every playthrough of a script and report on what it can reach."""
+    program, start_chapter = await offloader.run("analysis", load_program, script_id)
+    if start_chapter is None:
+        return {"start": None, "states": 0, "truncated": False, "paths": 0, "endings": [], "loops": [],
+                "stuck_states": 0, "coverage": {"events": 0, "covered": 0, "ratio": 1.0, "chapters": 0,
+                                                "entered_chapters": 0},
+                "unreachable_chapters": [], "unreachable_events": {}}
+    start = (start_chapter, 0, ())
+
+    partitions = max(1, offloader.cpu_processes) * PARTITIONS_PER_PROCESS
+    graph, covered, frontier = await offloader.run("analysis", _seed, program, start, partitions, max_states)
+    truncated = bool(frontier) and len(graph) >= max_states
+
+    if frontier and not truncated:
+        chunks = [frontier[i::partitions] for i in range(partitions) if frontier[i::partitions]]
+        budget = max(1, (max_states - len(graph)) // len(chunks))
+        known = list(graph)
+        results = await asyncio.gather(*(
+            offloader.run_cpu("analysis", explore, program, chunk, budget, known) for chunk in chunks
+        ))
+        for result in results:
+            graph.update(result["graph"])
+            covered.update(result["covered"])
+            truncated = truncated or result["truncated"]
+
+    return await offloader.run("analysis", _analyze, program, start, graph, covered, truncated)
@@ -0,0 +1,231 @@
+"""
+Per-character sprite atlases
+Packs every avatar image of a character into one sheet plus a JSON frame map,
+so the preview loads a cast with one request per character. Sheets are
+rendered in the CPU process pool (Pillow is optional), stored under a name
+derived from the avatar contents and rebuilt only after the watcher reports
+a change below the character's folder
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional
+    Image = None
+    ImageOps = None
+
+from .fs_watcher import WorkspaceWatcher
+from .offload import offloader
+from .static_files import content_hashes
+from .workspace import BASE_DIR, CACHE_DIR, DEFAULT_EMOTION, workspace_index, workspace_watcher
+
+# format query value -> (Pillow format, file suffix, save options)
+ATLAS_FORMATS = {
+    "png": ("PNG", ".png", {"optimize": True}),
+    "webp": ("WEBP", ".webp", {"quality": 90, "method": 4}),
+}
+MAX_FRAME_HEIGHT = 2048
+MAX_SHEET_WIDTH = 4096
+PADDING = 2
+
+
+def render_atlas(sources: List[Tuple[str, str]], dest: str, height: int, fmt: str) -> Dict[str, Any]:
+    """Pack `(emotion, image path)` pairs into one sheet written to `dest`.
+
+    Frames taller than `height` are scaled down to it (0 keeps the original
+    size). Rows are filled left to right up to MAX_SHEET_WIDTH. Images that
+    cannot be decoded are left out and listed under `skipped` with the
+    error. Runs in a worker process; returns the sheet size and the frame
+    rectangles.
+    """
+    pil_format, _, options = ATLAS_FORMATS[fmt]
+    frames = []
+    skipped = {}
+    for emotion, path in sources:
+        try:
+            with Image.open(path) as original:
+                img = ImageOps.exif_transpose(original).convert("RGBA")
+        except Exception as e:
+            skipped[emotion] = str(e)
+            continue
+        if height and img.height > height:
+            width = max(1, round(img.width * height / img.height))
+            img = img.resize((width, height), Image.LANCZOS)
+        frames.append((emotion, img))
+
+    placed = {}
+    x = y = row_height = sheet_width = 0
+    for emotion, img in sorted(frames, key=lambda item: -item[1].height):
+        if x > 0 and x + img.width > MAX_SHEET_WIDTH:
+            x, y = 0, y + row_height + PADDING
+            row_height = 0
+        placed[emotion] = {"x": x, "y": y, "w": img.width, "h": img.height}
+        x += img.width + PADDING
+        row_height = max(row_height, img.height)
+        sheet_width = max(sheet_width, x - PADDING)
+
+    sheet = Image.new("RGBA", (max(1, sheet_width), max(1, y + row_height)), (0, 0, 0, 0))
+    for emotion, img in frames:
+        sheet.paste(img, (placed[emotion]["x"], placed[emotion]["y"]))
+
+    tmp_path = f"{dest}.{os.getpid()}.tmp"
+    try:
+        sheet.save(tmp_path, pil_format, **options)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return {"width": sheet.width, "height": sheet.height, "frames": placed, "skipped": skipped}
+
+
+class SpriteAtlases:
+    """Frame maps of built atlases, keyed by character, size and format.
+
+    A change counter per character (and per script, for changes above the
+    character folders) tells whether a built atlas is still current without
+    touching the avatar files.
+    """
+
+    def __init__(self, base_dir: Path, cache_dir: Path, watcher: WorkspaceWatcher):
+        self.base_dir = base_dir
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._counts: Dict[Tuple[str, Optional[str]], int] = {}
+        self._built: Dict[Tuple[str, str, int, str], Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+        self._inflight: Dict[Tuple[str, str, int, str], asyncio.Future] = {}
+        watcher.subscribe(self._on_change)
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def _on_change(self, paths: Set[Path]):
+        with self._lock:
+            for path in paths:
+                try:
+                    parts = path.relative_to(self.base_dir).parts
+                except ValueError:
+                    continue
+                if not parts:
+                    continue
+                if len(parts) >= 3 and parts[1] == "Characters":
+                    key = (parts[0], parts[2])
+                elif len(parts) <= 2:
+                    key = (parts[0], None)
+                else:
+                    continue
+                self._counts[key] = self._counts.get(key, 0) + 1
+
+    def _generation(self, script_id: str, character_id: str) -> Tuple[int, int]:
+        with self._lock:
+            return self._counts.get((script_id, None), 0), self._counts.get((script_id, character_id), 0)
+
+    def sheet_path(self, atlas_key: str, fmt: str) -> Path:
+        return self.cache_dir / f"{atlas_key}{ATLAS_FORMATS[fmt][1]}"
+
+    def owns(self, script_id: str, character_id: str, atlas_key: str, fmt: str) -> bool:
+        """Whether `atlas_key` is the sheet of one of the character's built atlases."""
+        with self._lock:
+            return any(
+                key[0] == script_id and key[1] == character_id and key[3] == fmt and built[1]["key"] == atlas_key
+                for key, built in self._built.items()
+            )
+
+    def _sources(self, script_id: str, character_id: str) -> List[Tuple[str, str, str]]:
+        """(emotion, path, content digest) for each avatar image, one file per emotion."""
+        avatar_dir = self.base_dir / script_id / "Characters" / character_id / "avatar"
+        avatar_set = workspace_index.avatar_set(script_id, character_id)
+        sources = []
+        for emotion, file in sorted(avatar_set.files.items()):
+            path = avatar_dir / file
+            try:
+                sources.append((emotion, str(path), content_hashes.digest(path)))
+            except OSError:
+                continue
+        return sources
+
+    def _load_map(self, atlas_key: str, fmt: str) -> Optional[Dict[str, Any]]:
+        """Frame map of an atlas rendered earlier (possibly by a previous run)."""
+        if not self.sheet_path(atlas_key, fmt).exists():
+            return None
+        try:
+            with open(self.cache_dir / f"{atlas_key}.json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_map(self, atlas_key: str, frame_map: Dict[str, Any]):
+        with open(self.cache_dir / f"{atlas_key}.json", "w", encoding="utf-8") as f:
+            json.dump(frame_map, f, ensure_ascii=False)
+
+    def _discard(self, atlas_key: str, fmt: str):
+        for path in (self.sheet_path(atlas_key, fmt), self.cache_dir / f"{atlas_key}.json"):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    async def _build(self, script_id: str, character_id: str, height: int, fmt: str,
+                     generation: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+        sources = await offloader.run("images", self._sources, script_id, character_id)
+        if not sources:
+            return None
+
+        h = hashlib.blake2b(digest_size=10)
+        h.update(f"{height}:{fmt}".encode())
+        for emotion, _, digest in sources:
+            h.update(f"\0{emotion}\0{digest}".encode())
+        atlas_key = h.hexdigest()
+
+        frame_map = await offloader.run("images", self._load_map, atlas_key, fmt)
+        if frame_map is None:
+            await offloader.run("images", self.cache_dir.mkdir, parents=True, exist_ok=True)
+            frame_map = await offloader.run_cpu(
+                "images", render_atlas, [(emotion, path) for emotion, path, _ in sources],
+                str(self.sheet_path(atlas_key, fmt)), height, fmt
+            )
+            names = [emotion for emotion, _, _ in sources if emotion in frame_map["frames"]]
+            frame_map["key"] = atlas_key
+            frame_map["format"] = fmt
+            frame_map["default"] = DEFAULT_EMOTION if DEFAULT_EMOTION in names else next(iter(names), None)
+            await offloader.run("images", self._save_map, atlas_key, frame_map)
+
+        key = (script_id, character_id, height, fmt)
+        with self._lock:
+            previous = self._built.get(key)
+            self._built[key] = (generation, frame_map)
+            # Identical characters (e.g. a copied script) share their sheet
+            in_use = {built[1]["key"] for built in self._built.values()}
+        if previous is not None and previous[1]["key"] not in in_use:
+            await offloader.run("images", self._discard, previous[1]["key"], fmt)
+        return frame_map
+
+    async def get(self, script_id: str, character_id: str, height: int, fmt: str) -> Optional[Dict[str, Any]]:
+        """Frame map of the character's atlas, building the sheet if needed.
+
+        Returns None when the character has no avatar images.
+        """
+        height = max(0, min(MAX_FRAME_HEIGHT, height))
+        key = (script_id, character_id, height, fmt)
+        generation = self._generation(script_id, character_id)
+        with self._lock:
+            built = self._built.get(key)
+        if built is not None and built[0] == generation:
+            return built[1]
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._build(script_id, character_id, height, fmt, generation))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+
+sprite_atlases = SpriteAtlases(BASE_DIR, CACHE_DIR / "atlases", workspace_watcher)
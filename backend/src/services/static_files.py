@@ -0,0 +1,145 @@
+"""
+File responses for assets and character images
+Files are tagged with a content hash (cached per mtime/size), so manifest URLs
+carrying `?v=<hash>` can be cached forever while plain URLs revalidate with
+304s. Byte ranges are served by FileResponse, and compressible files are
+served from a precompressed `.br`/`.gz` sibling when the client accepts it
+"""
+import hashlib
+import os
+import threading
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple, Union
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+from .http_cache import etag_matches, quote_etag
+
+PathLike = Union[str, Path]
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Precompressed siblings in order of preference: (content-coding, file suffix)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/bmp",
+    "image/svg+xml",
+    "audio/wav",
+    "audio/x-wav",
+}
+
+_CHUNK = 1024 * 1024
+
+
+def is_compressible(media_type: str) -> bool:
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+
+def accepted_encodings(request: Request) -> Set[str]:
+    """Content codings the client accepts (q=0 excluded)."""
+    accepted = set()
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class ContentHashes:
+    """Content digests of files, recomputed only when mtime or size change."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+
+    def digest(self, path: PathLike, st: Optional[os.stat_result] = None) -> str:
+        key = os.path.realpath(path)
+        if st is None:
+            st = os.stat(key)
+        with self._lock:
+            cached = self._digests.get(key)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+
+        h = hashlib.blake2b(digest_size=8)
+        with open(key, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self._lock:
+            self._digests[key] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def forget(self, path: PathLike):
+        with self._lock:
+            self._digests.pop(os.path.realpath(path), None)
+
+
+content_hashes = ContentHashes()
+
+
+def versioned_url(url: str, path: PathLike) -> str:
+    """`url` with the content hash of `path` appended as `?v=`."""
+    try:
+        return f"{url}?v={content_hashes.digest(path)}"
+    except OSError:
+        return url
+
+
+def static_file_response(request: Request, path: PathLike) -> Response:
+    """FileResponse for `path` with ETag, Cache-Control and encoding negotiation.
+
+    Blocking (stats and, on first use, hashes the file); run it through the
+    offloader. Raises OSError when the file cannot be read.
+    """
+    path = Path(path)
+    st = os.stat(path)
+    digest = content_hashes.digest(path, st)
+    media_type = guess_type(path.name)[0] or "application/octet-stream"
+
+    headers = {
+        "ETag": quote_etag(digest),
+        # Only a URL naming the current content may be cached forever
+        "Cache-Control": IMMUTABLE if request.query_params.get("v") == digest else REVALIDATE,
+    }
+    serve_path, serve_st = path, st
+
+    if is_compressible(media_type):
+        headers["Vary"] = "Accept-Encoding"
+        # Ranges refer to the identity encoding, so never answer them from a variant
+        if "range" not in request.headers:
+            accepted = accepted_encodings(request)
+            for coding, suffix in ENCODINGS:
+                if coding not in accepted:
+                    continue
+                sibling = path.with_name(path.name + suffix)
+                try:
+                    sibling_st = os.stat(sibling)
+                except OSError:
+                    continue
+                # A sibling older than the file is stale
+                if sibling_st.st_mtime_ns < st.st_mtime_ns:
+                    continue
+                serve_path, serve_st = sibling, sibling_st
+                headers["Content-Encoding"] = coding
+                headers["ETag"] = quote_etag(f"{digest}-{coding}")
+                break
+
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(serve_path, headers=headers, media_type=media_type, stat_result=serve_st)
@@ -0,0 +1,234 @@
+"""
+Chapter links of a script
+Follows `chapter_end` events (next_chapter and branching options) to order
+chapters by their distance along the play path, and keeps a per-script
+graph of every chapter and its conditional edges for the flow canvas.
+Links are extracted once per chapter version, and the graph is updated
+from workspace changes, so only chapters that changed are parsed again
+"""
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Collection, Dict, Iterator, List, Optional, Set, Tuple
+
+from .chapter_cache import chapter_cache
+from .fs_watcher import WorkspaceWatcher
+from .workspace import BASE_DIR, workspace_index, workspace_watcher
+
+END_CHAPTER = "end"
+
+
+def chapter_edges(chapter: Any) -> List[Dict[str, Any]]:
+    """Outgoing edges of a parsed chapter, in event order.
+
+    Each edge has the raw `ref`, the `event` index, the `option` index (None
+    for next_chapter), the event's `end_type`, the option's `label` and the
+    `conditions` that must hold to take it (the event's, then the option's).
+    """
+    edges: List[Dict[str, Any]] = []
+    events = chapter.get("events") if isinstance(chapter, dict) else None
+    for index, event in enumerate(events or []):
+        if not isinstance(event, dict):
+            continue
+        if event.get("type") == "chapter_end":
+            candidates = [(None, event.get("next_chapter"), None, None)]
+            candidates.extend(
+                (i, option.get("next_chapter"), option.get("text") or option.get("description"), option.get("condition"))
+                for i, option in enumerate(event.get("options") or []) if isinstance(option, dict)
+            )
+        elif event.get("type") == "end":
+            # Legacy chapter end
+            candidates = [(None, event.get("next"), None, None)]
+        else:
+            continue
+        conditions = [event["condition"]] if event.get("condition") not in (None, "") else []
+        for option, ref, label, condition in candidates:
+            if not isinstance(ref, str) or not ref:
+                continue
+            edges.append({
+                "ref": ref,
+                "event": index,
+                "option": option,
+                "end_type": event.get("end_type") or "linear",
+                "label": label,
+                "conditions": conditions + ([condition] if condition not in (None, "") else []),
+            })
+    return edges
+
+
+def chapter_links(chapter: Any) -> List[str]:
+    """Chapter references of a parsed chapter, in event order, without duplicates."""
+    refs: List[str] = []
+    for edge in chapter_edges(chapter):
+        ref = edge["ref"]
+        if ref != END_CHAPTER and ref not in refs:
+            refs.append(ref)
+    return refs
+
+
+def resolve_chapter(ref: str, chapters: Collection[str]) -> Optional[str]:
+    """Chapter file (relative to Chapters/) a reference points to, if any."""
+    ref = ref.strip().replace("\\", "/")
+    if ref.startswith("Chapters/"):
+        ref = ref[len("Chapters/"):]
+    for candidate in (ref, ref + ".yaml", ref + ".yml"):
+        if candidate in chapters:
+            return candidate
+    return None
+
+
+class _ScriptGraph:
+    __slots__ = ("nodes", "dirty", "payload", "lock")
+
+    def __init__(self):
+        # chapter -> (version, node, edges)
+        self.nodes: Dict[str, Tuple[Optional[str], Dict[str, Any], List[Dict[str, Any]]]] = {}
+        # Changed paths below Chapters/; None when everything must be checked
+        self.dirty: Optional[Set[str]] = None
+        self.payload: Optional[Dict[str, Any]] = None
+        self.lock = threading.Lock()
+
+
+class StoryGraph:
+    """Resolved outgoing links of each chapter, cached per chapter version."""
+
+    def __init__(self, base_dir: Path, watcher: WorkspaceWatcher):
+        self.base_dir = base_dir
+        self._lock = threading.Lock()
+        self._links: Dict[Tuple[str, str], Tuple[str, List[str]]] = {}
+        self._graphs: Dict[str, _ScriptGraph] = {}
+        watcher.subscribe(self._on_change)
+
+    def _on_change(self, paths: Set[Path]):
+        with self._lock:
+            for path in paths:
+                try:
+                    parts = path.relative_to(self.base_dir).parts
+                except ValueError:
+                    continue
+                if not parts:
+                    self._graphs.clear()
+                    return
+                graph = self._graphs.get(parts[0])
+                if graph is None or graph.dirty is None:
+                    continue
+                if len(parts) < 3:
+                    if len(parts) == 1 or parts[1] == "Chapters":
+                        graph.dirty = None
+                elif parts[1] == "Chapters":
+                    graph.dirty.add("/".join(parts[2:]))
+
+    def links(self, script_id: str, chapter: str) -> List[str]:
+        """Raw references of `chapter`; parses it only when it changed."""
+        path = self.base_dir / script_id / "Chapters" / chapter
+        key = (script_id, chapter)
+        try:
+            version = chapter_cache.version(path)
+        except OSError:
+            return []
+        with self._lock:
+            cached = self._links.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        try:
+            data, version = chapter_cache.load_versioned(path)
+        except Exception:
+            return []
+        refs = chapter_links(data)
+        with self._lock:
+            self._links[key] = (version, refs)
+        return refs
+
+    def walk(self, script_id: str, start: Optional[str]) -> Iterator[Tuple[str, Optional[int]]]:
+        """`(chapter, distance)` breadth-first from `start`.
+
+        Chapters that cannot be reached follow with a distance of None.
+        Chapters are only parsed as the walk reaches them.
+        """
+        chapters = workspace_index.chapters(script_id)
+        present = set(chapters)
+        seen = set()
+        if start in present:
+            queue = deque([(start, 0)])
+            seen.add(start)
+            while queue:
+                chapter, distance = queue.popleft()
+                yield chapter, distance
+                for ref in self.links(script_id, chapter):
+                    target = resolve_chapter(ref, present)
+                    if target is not None and target not in seen:
+                        seen.add(target)
+                        queue.append((target, distance + 1))
+        for chapter in chapters:
+            if chapter not in seen:
+                yield chapter, None
+
+
+    def _read_node(self, script_id: str, chapter: str, version: Optional[str]) -> Tuple[Optional[str], Dict[str, Any], List[Dict[str, Any]]]:
+        path = self.base_dir / script_id / "Chapters" / chapter
+        node: Dict[str, Any] = {"id": chapter}
+        try:
+            data, version = chapter_cache.load_versioned(path)
+        except Exception as e:
+            node.update(events=0, error=str(e))
+            return version, node, []
+        events = data.get("events") if isinstance(data, dict) else None
+        node["events"] = len(events) if isinstance(events, list) else 0
+        return version, node, chapter_edges(data)
+
+    def graph(self, script_id: str) -> Dict[str, Any]:
+        """Every chapter of a script with its outgoing edges.
+
+        Returns `{nodes, edges}`: nodes carry the chapter `id` and its event
+        count (plus `error` when it cannot be read); edges carry `source`,
+        `target` (a chapter, "end", or None when the reference is broken)
+        and the fields of chapter_edges. Only chapters that changed since
+        the last call are parsed again. Blocking; run it through the
+        offloader.
+        """
+        with self._lock:
+            graph = self._graphs.setdefault(script_id, _ScriptGraph())
+        with graph.lock:
+            with self._lock:
+                dirty, graph.dirty = graph.dirty, set()
+            try:
+                chapters = workspace_index.chapters(script_id)
+                present = set(chapters)
+                changed = False
+                for chapter in [c for c in graph.nodes if c not in present]:
+                    del graph.nodes[chapter]
+                    changed = True
+                for chapter in chapters:
+                    cached = graph.nodes.get(chapter)
+                    if cached is not None and dirty is not None and not any(
+                        chapter == key or chapter.startswith(key + "/") for key in dirty
+                    ):
+                        continue
+                    try:
+                        version = chapter_cache.version(self.base_dir / script_id / "Chapters" / chapter)
+                    except OSError:
+                        version = None
+                    if cached is not None and version is not None and cached[0] == version:
+                        continue
+                    graph.nodes[chapter] = self._read_node(script_id, chapter, version)
+                    changed = True
+            except BaseException:
+                with self._lock:
+                    graph.dirty = None
+                raise
+
+            if changed or graph.payload is None:
+                edges = []
+                for chapter in chapters:
+                    for edge in graph.nodes[chapter][2]:
+                        ref = edge["ref"]
+                        target = END_CHAPTER if ref == END_CHAPTER else resolve_chapter(ref, present)
+                        edges.append({"source": chapter, "target": target, **edge})
+                graph.payload = {
+                    "nodes": [graph.nodes[chapter][1] for chapter in chapters],
+                    "edges": edges,
+                }
+            return graph.payload
+
+
+story_graph = StoryGraph(BASE_DIR, workspace_watcher)
@@ -0,0 +1,160 @@
+"""
+Compiled chapter timelines
+Turns a chapter's events into a flat timeline the preview can play without
+normalizing anything itself: durations are coerced the way the chapter
+emitter stores them, every event gets an absolute start time, asset paths
+are resolved to versioned URLs and each character change carries the
+resulting stage. Timelines are cached per chapter version and
+asset/character folder generation
+"""
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .chapter_assets import BUILTIN_CHARACTERS, resolve_reference
+from .chapter_cache import chapter_cache
+from .fs_watcher import DirectoryGenerations
+from .workspace import BASE_DIR, directory_generations
+
+# Reading speed used to time text events without a duration
+READING_CPS = float(os.environ.get("SCRIPT_EDITOR_READING_CPS", "10"))
+MIN_TEXT_HOLD = 1.0
+
+TEXT_FIELDS = {"narration": "text", "player": "text", "dialogue": "text", "ai_dialogue": "prompt"}
+INTERACTIVE_TYPES = ("choices", "input")
+
+
+def normalize_duration(value: Any) -> float:
+    """Duration in seconds for the timeline.
+
+    Strings are coerced to float like the chapter emitter does; unset,
+    invalid, negative and non-finite values count as 0 here, although the
+    emitter writes negative and non-finite values back unchanged.
+    """
+    if value is None or isinstance(value, bool):
+        return 0.0
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return 0.0
+    if not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+        return 0.0
+    return float(value)
+
+
+def text_hold(text: Any) -> float:
+    """Seconds a text event stays on screen when it has no duration."""
+    length = len(text) if isinstance(text, str) else 0
+    return max(MIN_TEXT_HOLD, length / READING_CPS) if READING_CPS > 0 else MIN_TEXT_HOLD
+
+
+class Timelines:
+    """Compiled timelines per chapter, rebuilt when the chapter or the script's assets change."""
+
+    def __init__(self, base_dir: Path, generations: DirectoryGenerations):
+        self.base_dir = base_dir
+        self._generations = generations
+        self._lock = threading.Lock()
+        self._timelines: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def _compile(self, script_id: str, chapter: str, data: Any) -> Dict[str, Any]:
+        events = data.get("events") if isinstance(data, dict) else None
+        stage: Dict[str, Dict[str, Any]] = {}
+        resolved: Dict[Tuple[str, str, Optional[str]], Tuple[str, Optional[str]]] = {}
+        missing: List[str] = []
+        entries = []
+        clock = 0.0
+
+        def resolve(kind: str, ref: str, emotion: Optional[str] = None) -> Tuple[str, Optional[str]]:
+            key = (kind, ref, emotion)
+            if key not in resolved:
+                asset_key, url, _ = resolve_reference(script_id, kind, ref, emotion)
+                resolved[key] = (asset_key, url)
+                if url is None and asset_key not in missing:
+                    missing.append(asset_key)
+            return resolved[key]
+
+        for index, event in enumerate(events or []):
+            if not isinstance(event, dict):
+                continue
+            event_type = event.get("type")
+            entry = {k: v for k, v in event.items() if v is not None}
+            duration = normalize_duration(event.get("duration"))
+            entry.update(index=index, start=round(clock, 3), duration=duration)
+            # Time until the next event starts
+            hold = duration
+
+            if event_type in TEXT_FIELDS:
+                if not duration:
+                    hold = text_hold(event.get(TEXT_FIELDS[event_type]))
+            elif event_type == "background" and event.get("imagePath"):
+                entry["key"], entry["url"] = resolve("background", str(event["imagePath"]))
+            elif event_type == "music" and event.get("musicPath"):
+                entry["key"], entry["url"] = resolve("music", str(event["musicPath"]))
+                # Music plays alongside the following events; duration is its length
+                hold = 0.0
+            elif event_type == "modify_character" and event.get("character"):
+                character = str(event["character"])
+                emotion = str(event["emotion"]) if event.get("emotion") else None
+                if event.get("action") == "hide_character":
+                    stage.pop(character, None)
+                elif emotion or event.get("action") == "show_character" or character in stage:
+                    if emotion is None and character in stage:
+                        # move/shake keep the current expression
+                        emotion = stage[character]["emotion"]
+                    frame = {"character": character, "emotion": emotion, "key": None, "url": None}
+                    if character not in BUILTIN_CHARACTERS:
+                        frame["key"], frame["url"] = resolve("character", character, emotion)
+                    stage[character] = frame
+                    entry["frame"] = frame
+                entry["stage"] = list(stage.values())
+            elif event_type == "choices":
+                entry["allow_free"] = event.get("allow_free") in (True, "true")
+            elif event_type in ("chapter_end", "end"):
+                entry.setdefault("end_type", "linear")
+                refs = [event.get("next_chapter") or event.get("next")]
+                refs.extend(option.get("next_chapter") for option in event.get("options") or [] if isinstance(option, dict))
+                entry["next"] = [ref for ref in refs if isinstance(ref, str) and ref]
+
+            entry["interactive"] = event_type in INTERACTIVE_TYPES
+            entry["hold"] = round(hold, 3)
+            entries.append(entry)
+            clock += hold
+
+        return {
+            "chapter": chapter,
+            "duration": round(clock, 3),
+            "events": entries,
+            "missing": missing,
+        }
+
+    def get(self, script_id: str, chapter: str) -> Dict[str, Any]:
+        """Compiled timeline of a chapter (relative to Chapters/).
+
+        Start times assume every condition holds and interactive events
+        (choices, input) take only their own duration. The timeline's
+        `etag` changes whenever it may have. Raises OSError when the
+        chapter cannot be read. Blocking; run it through the offloader.
+        """
+        path = self.base_dir / script_id / "Chapters" / chapter
+        token = self._generations.token(script_id, "Assets", "Characters")
+        version = chapter_cache.version(path)
+        key = (script_id, chapter)
+        with self._lock:
+            cached = self._timelines.get(key)
+        if cached is not None and cached["etag"] == f"{version}.{token}":
+            return cached
+
+        data, version = chapter_cache.load_versioned(path)
+        timeline = self._compile(script_id, chapter, data)
+        timeline["version"] = version
+        timeline["etag"] = f"{version}.{token}"
+        with self._lock:
+            self._timelines[key] = timeline
+        return timeline
+
+
+timelines = Timelines(BASE_DIR, directory_generations)
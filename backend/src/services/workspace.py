@@ -0,0 +1,341 @@
+"""
+Scripts workspace: where it lives and what is in it
+Resolves the scripts folder once and keeps an in-memory index of every
+script's chapters, assets and characters, updated from the watcher's change
+feed so listings never rescan the disk
+"""
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from .asset_lookup import AssetLookup
+from .fs_watcher import DirectoryGenerations, WorkspaceWatcher
+from .script_catalog import ScriptCatalog
+
+# Avatar image formats, in order of preference when an emotion has several
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+DEFAULT_EMOTION = "正常"
+ASSET_CATEGORIES = ("Backgrounds", "Musics", "Sounds", "Effects", "Other")
+
+
+def resolve_base_dir() -> Path:
+    """Locate the scripts folder.
+
+    SCRIPT_EDITOR_BASE_DIR overrides it (tests point it at a temporary
+    folder). When running as PyInstaller exe, look for the scripts folder at
+    the main app level; when running from source, use the project's scripts
+    folder.
+    """
+    if os.environ.get("SCRIPT_EDITOR_BASE_DIR"):
+        return Path(os.environ["SCRIPT_EDITOR_BASE_DIR"])
+
+    if getattr(sys, 'frozen', False):
+        # Running as compiled exe
+        exe_dir = Path(sys.executable).parent
+
+        # Try multiple possible locations for scripts folder
+        possible_paths = [
+            exe_dir.parent.parent / "scripts",  # win-unpacked/scripts/ (portable)
+            exe_dir / "scripts",                 # resources/backend/scripts/
+            exe_dir.parent / "scripts",          # resources/scripts/
+        ]
+        for p in possible_paths:
+            if p.exists():
+                return p
+        return exe_dir.parent.parent / "scripts"
+
+    # Running from source
+    return Path(__file__).resolve().parent.parent.parent / "scripts"
+
+
+class AvatarSet:
+    """Resolved avatar images of one character.
+
+    `files` maps each emotion to the file that backs it, `formats` lists
+    every suffix an emotion exists in, and `default` is the emotion served
+    when none (or an unknown one) is requested.
+    """
+
+    __slots__ = ("files", "formats", "default")
+
+    def __init__(self, file_names: Iterable[str]):
+        self.formats: Dict[str, List[str]] = {}
+        for file in file_names:
+            emotion, suffix = os.path.splitext(file)
+            self.formats.setdefault(emotion, []).append(suffix)
+        self.files: Dict[str, str] = {}
+        for emotion, suffixes in self.formats.items():
+            suffixes.sort(key=lambda suffix: IMAGE_SUFFIXES.index(suffix.lower()))
+            self.files[emotion] = emotion + suffixes[0]
+        if DEFAULT_EMOTION in self.files:
+            self.default: Optional[str] = DEFAULT_EMOTION
+        else:
+            self.default = min(self.files) if self.files else None
+
+    def resolve(self, emotion: Optional[str] = None) -> Optional[str]:
+        """File name for `emotion`, falling back to the default emotion."""
+        if emotion is not None and emotion in self.files:
+            return self.files[emotion]
+        if self.default is None:
+            return None
+        return self.files[self.default]
+
+
+class _ScriptIndex:
+    """Entries below one script folder, keyed by top-level folder.
+
+    `entries[folder]` maps each path relative to that folder (posix style)
+    to whether it is a directory. `asset_lookup` indexes the files of
+    Assets/ for fuzzy lookups; it is built on first use and then updated
+    along with the entries. `avatar_sets` holds the resolved avatars of
+    each character and is invalidated per character.
+    """
+
+    __slots__ = ("entries", "asset_lookup", "avatar_sets")
+
+    def __init__(self):
+        self.entries: Dict[str, Dict[str, bool]] = {}
+        self.asset_lookup: Optional[AssetLookup] = None
+        self.avatar_sets: Dict[str, AvatarSet] = {}
+
+
+class WorkspaceIndex:
+    """Listings of every script's Chapters, Assets and Characters folders.
+
+    A script is walked once, on first use. After that the watcher's change
+    notifications are queued and applied on the next query, touching only
+    the changed paths (plus the subtree of a directory that appeared).
+    """
+
+    def __init__(self, base_dir: Path, watcher: WorkspaceWatcher):
+        self.base_dir = base_dir
+        self._watcher = watcher
+        self._lock = threading.Lock()
+        self._scripts: Dict[str, _ScriptIndex] = {}
+        self._changes: Dict[str, Set[tuple]] = {}
+        watcher.subscribe(self._on_change)
+
+    def _on_change(self, paths: Set[Path]):
+        with self._lock:
+            for path in paths:
+                try:
+                    parts = path.relative_to(self.base_dir).parts
+                except ValueError:
+                    continue
+                if not parts:
+                    # The workspace itself changed: drop everything
+                    self._scripts.clear()
+                    self._changes.clear()
+                    return
+                if parts[0] in self._scripts:
+                    self._changes.setdefault(parts[0], set()).add(parts[1:])
+
+    # --- Building and updating ---
+
+    def _walk(self, folder_dir: Path, prefix: str, entries: Dict[str, bool]):
+        for root, dirs, files in os.walk(folder_dir):
+            rel_root = Path(root).relative_to(folder_dir).as_posix()
+            rel_root = prefix + ("" if rel_root == "." else rel_root + "/")
+            for name in dirs:
+                entries[rel_root + name] = True
+            for name in files:
+                entries[rel_root + name] = False
+
+    def _scan_folder(self, script_dir: Path, folder: str) -> Dict[str, bool]:
+        entries: Dict[str, bool] = {}
+        folder_dir = script_dir / folder
+        if folder_dir.is_dir():
+            self._walk(folder_dir, "", entries)
+        return entries
+
+    def _build(self, script_id: str) -> Optional[_ScriptIndex]:
+        script_dir = self.base_dir / script_id
+        if not script_dir.is_dir():
+            return None
+        index = _ScriptIndex()
+        for item in script_dir.iterdir():
+            if item.is_dir():
+                index.entries[item.name] = self._scan_folder(script_dir, item.name)
+        return index
+
+    def _apply(self, script_id: str, index: _ScriptIndex, parts: tuple) -> bool:
+        """Apply one change; returns False when the whole script must be rebuilt."""
+        if not parts:
+            return False
+        script_dir = self.base_dir / script_id
+        folder = parts[0]
+        lookup = index.asset_lookup if folder == "Assets" else None
+        if folder == "Characters":
+            if len(parts) > 1:
+                index.avatar_sets.pop(parts[1], None)
+            else:
+                index.avatar_sets.clear()
+        if len(parts) == 1 or folder not in index.entries:
+            # The whole folder is rescanned, so the lookup is rebuilt on demand
+            if folder == "Assets":
+                index.asset_lookup = None
+        if len(parts) == 1:
+            if (script_dir / folder).is_dir():
+                if folder not in index.entries:
+                    index.entries[folder] = self._scan_folder(script_dir, folder)
+            else:
+                index.entries.pop(folder, None)
+            return True
+
+        entries = index.entries.get(folder)
+        if entries is None:
+            # Folder not known yet, e.g. created together with its content
+            if (script_dir / folder).is_dir():
+                index.entries[folder] = self._scan_folder(script_dir, folder)
+            return True
+
+        rel = "/".join(parts[1:])
+        full_path = script_dir.joinpath(*parts)
+        try:
+            is_dir = full_path.is_dir()
+            exists = is_dir or full_path.exists()
+        except OSError:
+            exists = False
+        was_dir = entries.get(rel)
+        if not exists or (was_dir is not None and was_dir != is_dir):
+            below = rel + "/"
+            removed = [key for key in entries if key.startswith(below)]
+            if rel in entries:
+                removed.append(rel)
+            for key in removed:
+                if lookup is not None and not entries[key]:
+                    lookup.remove(key)
+                del entries[key]
+            if not exists:
+                return True
+            was_dir = None
+
+        entries[rel] = is_dir
+        if lookup is not None and not is_dir:
+            lookup.add(rel)
+        # Parents may have been created without a notification of their own
+        parent = rel.rpartition("/")[0]
+        while parent and parent not in entries:
+            entries[parent] = True
+            parent = parent.rpartition("/")[0]
+        if is_dir and not was_dir:
+            # A directory that was created or moved in brings its content along
+            walked: Dict[str, bool] = {}
+            self._walk(full_path, rel + "/", walked)
+            entries.update(walked)
+            if lookup is not None:
+                for key, key_is_dir in walked.items():
+                    if not key_is_dir:
+                        lookup.add(key)
+        return True
+
+    def _get(self, script_id: str) -> Optional[_ScriptIndex]:
+        """Current index of a script (caller holds the lock)."""
+        index = self._scripts.get(script_id)
+        changes = self._changes.pop(script_id, None)
+        if index is not None and changes:
+            for parts in changes:
+                if not self._apply(script_id, index, parts):
+                    index = None
+                    break
+        if index is None:
+            index = self._build(script_id)
+            if index is None:
+                self._scripts.pop(script_id, None)
+                return None
+            self._scripts[script_id] = index
+        return index
+
+    def _folder(self, script_id: str, folder: str) -> Dict[str, bool]:
+        self._watcher.start()
+        index = self._get(script_id)
+        if index is None:
+            return {}
+        return index.entries.get(folder, {})
+
+    # --- Queries ---
+
+    def chapters(self, script_id: str) -> List[str]:
+        """Chapter files relative to Chapters/."""
+        with self._lock:
+            entries = self._folder(script_id, "Chapters")
+            return sorted(
+                rel for rel, is_dir in entries.items()
+                if not is_dir and (rel.endswith(".yaml") or rel.endswith(".yml"))
+            )
+
+    def asset_files(self, script_id: str) -> List[str]:
+        """Every file below Assets/, relative to it."""
+        with self._lock:
+            entries = self._folder(script_id, "Assets")
+            return sorted(rel for rel, is_dir in entries.items() if not is_dir)
+
+    def assets(self, script_id: str) -> Dict[str, List[str]]:
+        """Asset files grouped by their top folder; files directly in Assets/ go to 'Other'."""
+        assets: Dict[str, List[str]] = {category: [] for category in ASSET_CATEGORIES}
+        for rel in self.asset_files(script_id):
+            category = rel.split("/", 1)[0] if "/" in rel else "Other"
+            assets.setdefault(category, []).append(rel)
+        return assets
+
+    def find_asset(self, script_id: str, asset_path: str) -> Optional[str]:
+        """Asset file (relative to Assets/) that `asset_path` most likely means."""
+        with self._lock:
+            self._watcher.start()
+            index = self._get(script_id)
+            if index is None:
+                return None
+            if index.asset_lookup is None:
+                entries = index.entries.get("Assets", {})
+                index.asset_lookup = AssetLookup(rel for rel, is_dir in entries.items() if not is_dir)
+            return index.asset_lookup.find(asset_path)
+
+    def characters(self, script_id: str) -> List[str]:
+        """Names of the entries directly in Characters/."""
+        with self._lock:
+            entries = self._folder(script_id, "Characters")
+            return sorted(rel for rel in entries if "/" not in rel)
+
+    def character_dirs(self, script_id: str) -> List[str]:
+        with self._lock:
+            entries = self._folder(script_id, "Characters")
+            return sorted(rel for rel, is_dir in entries.items() if is_dir and "/" not in rel)
+
+    def _avatar_files(self, entries: Dict[str, bool], character_id: str) -> List[str]:
+        prefix = f"{character_id}/avatar/"
+        return sorted(
+            rel[len(prefix):] for rel, is_dir in entries.items()
+            if not is_dir and rel.startswith(prefix) and "/" not in rel[len(prefix):]
+            and rel.lower().endswith(IMAGE_SUFFIXES)
+        )
+
+    def avatars(self, script_id: str, character_id: str) -> List[str]:
+        """Image file names in Characters/<character_id>/avatar/."""
+        with self._lock:
+            return self._avatar_files(self._folder(script_id, "Characters"), character_id)
+
+    def avatar_set(self, script_id: str, character_id: str) -> AvatarSet:
+        """Emotion -> file resolution for a character, built once per change."""
+        with self._lock:
+            entries = self._folder(script_id, "Characters")
+            index = self._scripts.get(script_id)
+            if index is None:
+                return AvatarSet(())
+            avatar_set = index.avatar_sets.get(character_id)
+            if avatar_set is None:
+                avatar_set = AvatarSet(self._avatar_files(entries, character_id))
+                index.avatar_sets[character_id] = avatar_set
+            return avatar_set
+
+
+BASE_DIR = resolve_base_dir()
+# Generated files (image variants, persisted indexes); not watched
+CACHE_DIR = Path(os.environ.get("SCRIPT_EDITOR_CACHE_DIR") or BASE_DIR / ".cache")
+
+# Shared change feed for the workspace and the indexes built on it
+workspace_watcher = WorkspaceWatcher(BASE_DIR, ignore=[CACHE_DIR.name] if CACHE_DIR.parent == BASE_DIR else [])
+script_catalog = ScriptCatalog(BASE_DIR, workspace_watcher)
+directory_generations = DirectoryGenerations(BASE_DIR, workspace_watcher)
+workspace_index = WorkspaceIndex(BASE_DIR, workspace_watcher)
@@ -0,0 +1,94 @@
+"""
+YAML serialization for scripts and chapters
+Uses the libyaml C loader/emitter when PyYAML was built with it and falls back
+to the pure-Python implementation otherwise; both produce identical output
+"""
+import re
+from typing import Any, IO, Optional
+
+import yaml
+
+try:
+    from yaml import CSafeDumper as _FastDumper
+    from yaml import CSafeLoader as _FastLoader
+    LIBYAML = True
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeDumper as _FastDumper
+    from yaml import SafeLoader as _FastLoader
+    LIBYAML = False
+
+
+# Add | if there is multiline string
+def str_representer(dumper, data):
+    if '\n' in data:
+        return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='|')
+    return dumper.represent_scalar('tag:yaml.org,2002:str', data)
+
+
+class Loader(_FastLoader):
+    pass
+
+
+class Dumper(_FastDumper):
+    pass
+
+
+class PureLoader(yaml.SafeLoader):
+    pass
+
+
+class PureDumper(yaml.SafeDumper):
+    pass
+
+
+Dumper.add_representer(str, str_representer)
+PureDumper.add_representer(str, str_representer)
+
+
+# libyaml and the Python emitter disagree on a few corner cases: characters
+# outside the BMP or the YAML 1.1 line-break set, double-quoted line folding,
+# keep-chomped literals at document end and long mapping keys. Documents that
+# contain any of those are emitted by the Python emitter so output stays
+# byte-for-byte identical whichever backend is installed.
+_NON_PORTABLE_CHARS = re.compile('[^\n\x20-\x7e\xa0-\u2027\u202a-\ud7ff\ue000-\ufefe\uff00-\ufffd]')
+
+
+def _portable_str(value: str, is_key: bool) -> bool:
+    if _NON_PORTABLE_CHARS.search(value):
+        return False
+    if is_key and len(value.encode("utf-8")) > 100:
+        return False
+    if '\n' in value:
+        if is_key or value.endswith(' ') or ' \n' in value or value.endswith('\n\n') or value == '\n':
+            return False
+    return True
+
+
+def emits_identically(data: Any) -> bool:
+    """True when libyaml is known to emit `data` exactly like the Python emitter."""
+    stack = [(data, False)]
+    while stack:
+        item, is_key = stack.pop()
+        if isinstance(item, str):
+            if not _portable_str(item, is_key):
+                return False
+        elif isinstance(item, dict):
+            for k, v in item.items():
+                stack.append((k, True))
+                stack.append((v, False))
+        elif isinstance(item, list):
+            stack.extend((v, False) for v in item)
+    return True
+
+
+def load(stream, loader=Loader) -> Any:
+    return yaml.load(stream, Loader=loader)
+
+
+def dump(data: Any, stream: Optional[IO[str]] = None, dumper=None, **kwargs) -> Optional[str]:
+    if dumper is None:
+        dumper = Dumper if LIBYAML and emits_identically(data) else PureDumper
+    kwargs.setdefault("allow_unicode", True)
+    kwargs.setdefault("sort_keys", False)
+    kwargs.setdefault("default_flow_style", False)
+    return yaml.dump(data, stream, Dumper=dumper, **kwargs)
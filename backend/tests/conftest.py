@@ -0,0 +1,101 @@
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Tests import the app as `src.…`, the way run.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# The workspace singletons read these on import, so they are set before any
+# test module imports the app: scripts live in a throwaway folder, and CPU
+# work stays in-process
+_BASE_DIR = Path(tempfile.mkdtemp(prefix="script-editor-tests-"))
+os.environ["SCRIPT_EDITOR_BASE_DIR"] = str(_BASE_DIR)
+os.environ["SCRIPT_EDITOR_CPU_PROCESSES"] = "0"
+
+INTRO_CHAPTER = """\
+events:
+- type: background
+  imagePath: room.png
+
+- type: music
+  musicPath: bgm.mp3
+
+- type: dialogue
+  character: Alice
+  text: Hello Alice
+  duration: 1.5
+
+- type: set_variable
+  name: love
+  value: 1
+
+- type: narration
+  text: love high
+  condition: love > 1
+
+- type: chapter_end
+  end_type: linear
+  next_chapter: sub/next.yaml
+"""
+
+NEXT_CHAPTER = """\
+events:
+- type: narration
+  text: end
+"""
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_BASE_DIR, ignore_errors=True)
+
+
+def build_script(script_dir: Path):
+    """A small script: two chapters, two assets and one character."""
+    (script_dir / "Chapters" / "sub").mkdir(parents=True)
+    (script_dir / "Assets" / "Backgrounds").mkdir(parents=True)
+    (script_dir / "Assets" / "Musics").mkdir(parents=True)
+    (script_dir / "Characters" / "Alice" / "avatar").mkdir(parents=True)
+    (script_dir / "story_config.yaml").write_text(
+        "script_name: s0\nintro_chapter: intro.yaml\ndescription: test script\n", encoding="utf-8"
+    )
+    (script_dir / "Chapters" / "intro.yaml").write_text(INTRO_CHAPTER, encoding="utf-8")
+    (script_dir / "Chapters" / "sub" / "next.yaml").write_text(NEXT_CHAPTER, encoding="utf-8")
+    (script_dir / "Assets" / "Backgrounds" / "room.png").write_bytes(b"img" * 100)
+    (script_dir / "Assets" / "Musics" / "bgm.mp3").write_bytes(bytes(range(256)) * 40)
+    (script_dir / "Characters" / "Alice" / "avatar" / "正常.png").write_bytes(b"png" * 10)
+
+
+@pytest.fixture
+def workspace() -> Path:
+    """A fresh script `s0` in the test workspace; yields its folder."""
+    from src.services.chapter_cache import chapter_cache
+    from src.services.chapter_writer import chapter_writer
+    from src.services.workspace import BASE_DIR, workspace_watcher
+
+    def reset():
+        chapter_writer.flush()
+        for child in BASE_DIR.iterdir():
+            if child.name != ".cache":
+                shutil.rmtree(child)
+        chapter_cache.clear()
+        # A change of the root resets every index
+        workspace_watcher.notify([BASE_DIR])
+
+    reset()
+    build_script(BASE_DIR / "s0")
+    workspace_watcher.notify([BASE_DIR])
+    yield BASE_DIR / "s0"
+    reset()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from src.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
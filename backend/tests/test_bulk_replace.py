@@ -0,0 +1,120 @@
+import json
+
+import pytest
+
+from src.services import yaml_io
+from src.services.bulk_replace import replace_values, splice_scalars, write_batch
+from src.services.chapter_cache import chapter_cache
+from src.services.search_index import search_index
+from src.services.workspace import workspace_watcher
+
+URL = "/api/scripts/s0/replace"
+
+COMMENTED = """\
+# Opening scene
+events:
+- type: dialogue
+  character: Alice   # the lead
+  text: 'Hello Alice'
+  options: [Alice, Bob]
+
+- type: narration
+  text: |
+    Alice walks in.
+    Nobody looks up.
+"""
+
+
+def records(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_replace_values_reports_locations():
+    chapter = yaml_io.load(COMMENTED)
+    changes = replace_values(chapter, "Alice", "Carol")
+    assert sorted(change["location"] for change in changes) == [
+        "events[0].character", "events[0].text", "events[1].text",
+    ]
+    assert [change["event"] for change in changes] == [0, 0, 1]
+    # Only values stored under a field are replaced
+    assert chapter["events"][0]["options"] == ["Alice", "Bob"]
+
+
+def test_replace_values_fields_and_whole_value():
+    chapter = {"events": [{"type": "narration", "text": "narration"}, {"type": "dialogue", "character": "Al", "text": "Al"}]}
+    assert replace_values(chapter, "narration", "x") == [
+        {"event": 0, "location": "events[0].text", "field": "text", "before": "narration", "after": "x"},
+    ]
+    changes = replace_values(chapter, "Al", "Bo", fields=["character"], whole_value=True)
+    assert [change["location"] for change in changes] == ["events[1].character"]
+    assert chapter["events"][1] == {"type": "dialogue", "character": "Bo", "text": "Al"}
+
+
+def test_splice_keeps_comments_and_quoting():
+    updated = yaml_io.load(COMMENTED)
+    replace_values(updated, "Alice", "Carol")
+    text = splice_scalars(COMMENTED, updated)
+    assert text == COMMENTED.replace("Alice   #", "Carol   #").replace("'Hello Alice'", "'Hello Carol'") \
+        .replace("    Alice walks", "    Carol walks")
+    assert yaml_io.load(text) == updated
+
+
+def test_splice_quotes_values_that_need_it():
+    updated = yaml_io.load(COMMENTED)
+    updated["events"][0]["character"] = "yes"
+    updated["events"][0]["text"] = "it's: here"
+    text = splice_scalars(COMMENTED, updated)
+    assert "character: \"yes\"   # the lead" in text
+    assert "text: 'it''s: here'" in text
+    assert yaml_io.load(text) == updated
+
+
+def test_write_batch_refuses_changed_files(workspace):
+    path = workspace / "Chapters" / "intro.yaml"
+    version = chapter_cache.version(path)
+    path.write_text("events: []\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        write_batch([(path, version, "events:\n- type: narration\n")])
+    assert path.read_text(encoding="utf-8") == "events: []\n"
+    assert [p.name for p in path.parent.iterdir() if p.name.endswith(".tmp")] == []
+
+
+def test_candidates_skip_chapters_without_the_literal(workspace):
+    assert search_index.candidate_chapters("s0", "llo Ali") == ["intro.yaml"]
+    assert search_index.candidate_chapters("s0", "zebra") == []
+    # Too short for a trigram: every chapter has to be read
+    assert search_index.candidate_chapters("s0", "en") is None
+
+
+def test_dry_run_then_apply(client, workspace):
+    body = {"find": "Alice", "replace": "Carol", "fields": ["text"]}
+    dry = records(client.post(URL, json=body))
+    assert dry[-1] == {"summary": {"checked": 1, "chapters": 1, "replacements": 1}}
+    assert dry[0]["chapter"] == "intro.yaml"
+    assert "-  text: Hello Alice\n+  text: Hello Carol\n" in dry[0]["diff"]
+    assert "Hello Alice" in (workspace / "Chapters" / "intro.yaml").read_text(encoding="utf-8")
+
+    applied = client.post(URL, json={**body, "dry_run": False, "base_versions": {"intro.yaml": dry[0]["version"]}})
+    assert applied.status_code == 200
+    assert applied.json()["replacements"] == 1
+    text = (workspace / "Chapters" / "intro.yaml").read_text(encoding="utf-8")
+    assert "  character: Alice\n  text: Hello Carol\n" in text
+
+    # The dry run's versions are now stale
+    again = client.post(URL, json={**body, "find": "Carol", "dry_run": False,
+                                   "base_versions": {"intro.yaml": dry[0]["version"]}})
+    assert again.status_code == 409
+
+
+def test_replace_follows_queued_saves(client, workspace):
+    chapter = client.get("/api/scripts/s0/chapters/intro.yaml").json()
+    chapter["events"][2]["text"] = "Goodbye Alice"
+    assert client.post("/api/scripts/s0/chapters/intro.yaml", json=chapter).status_code == 200
+    workspace_watcher.notify([workspace / "Chapters" / "intro.yaml"])
+
+    dry = records(client.post(URL, json={"find": "Goodbye", "replace": "Bye"}))
+    assert dry[-1]["summary"]["replacements"] == 1
+
+
+def test_empty_find_is_rejected(client, workspace):
+    assert client.post(URL, json={"find": "", "replace": "x"}).status_code == 400
@@ -0,0 +1,58 @@
+from src.services.chapter_cache import chapter_cache
+from src.services.chapter_emitter import clean_chapter
+from src.services.chapter_writer import ChapterWriter
+
+
+def test_clean_chapter_drops_nulls_and_zero_durations():
+    chapter = {"events": [
+        {"type": "narration", "text": "a", "duration": 0, "condition": None, "isFinal": None},
+        {"type": "dialogue", "text": "b", "duration": "1.5", "options": [{"text": "x", "condition": None}]},
+    ]}
+    assert clean_chapter(chapter) == {"events": [
+        {"type": "narration", "text": "a"},
+        {"type": "dialogue", "text": "b", "duration": 1.5, "options": [{"text": "x"}]},
+    ]}
+
+
+def test_queued_save_serves_the_written_body(client, workspace):
+    saved = client.post("/api/scripts/s0/chapters/intro.yaml",
+                        json={"events": [{"type": "narration", "text": "b"}]})
+    assert saved.status_code == 200
+
+    pending = client.get("/api/scripts/s0/chapters/intro.yaml")
+    assert pending.json()["events"] == [{"type": "narration", "text": "b"}]
+
+    assert client.post("/api/scripts/flush").status_code == 200
+    written = client.get("/api/scripts/s0/chapters/intro.yaml")
+    # One version token, one body
+    assert written.headers["etag"] == pending.headers["etag"]
+    assert written.json() == pending.json()
+    assert (workspace / "Chapters" / "intro.yaml").read_text(encoding="utf-8") == "events:\n- type: narration\n  text: b\n"
+
+
+def test_discard_stops_a_dequeued_write(tmp_path):
+    path = tmp_path / "chapter.yaml"
+    path.write_text("events: []\n", encoding="utf-8")
+    writer = ChapterWriter(delay=60)
+    writer.save(path, {"events": [{"type": "narration", "text": "a"}]})
+    # What the writer thread holds between dequeuing a job and writing it
+    with writer._cond:
+        job = writer._pending.pop(chapter_cache.key(path))
+
+    writer.discard(path)
+    path.unlink()
+    chapter_cache.invalidate(path)
+    writer._write_jobs([job])
+
+    assert not path.exists()
+
+
+def test_save_after_discard_is_written(tmp_path):
+    path = tmp_path / "chapter.yaml"
+    path.write_text("events: []\n", encoding="utf-8")
+    writer = ChapterWriter(delay=60)
+    writer.save(path, {"events": [{"type": "narration", "text": "a"}]})
+    writer.discard(path)
+    writer.save(path, {"events": [{"type": "narration", "text": "b"}]})
+    assert writer.flush(path) == {"written": 1, "errors": []}
+    assert "text: b" in path.read_text(encoding="utf-8")
@@ -0,0 +1,99 @@
+import pytest
+
+from src.services.conditions import ConditionError, check_chapter, compile_condition, evaluate
+
+
+@pytest.mark.parametrize("source, variables, expected", [
+    ("love > 1", {"love": 2}, True),
+    ("love > 1", {"love": 1}, False),
+    ("love > 1 && met_alice", {"love": 2, "met_alice": True}, True),
+    ("love > 1 || met_alice", {"love": 0}, False),
+    ("!met_alice", {}, True),
+    ("flag === true", {"flag": True}, True),
+    ("name !== 'Bob'", {"name": "Alice"}, True),
+    ("'&&' == sep", {"sep": "&&"}, True),
+    ("missing == 0", {}, True),
+    ("love + 1 >= 3", {"love": 2}, True),
+    ("route in ['a', 'b']", {"route": "b"}, True),
+    # Type errors make a condition false instead of raising
+    ("name > 1", {"name": "Alice"}, False),
+])
+def test_evaluate(source, variables, expected):
+    assert evaluate(source, variables) is expected
+
+
+def test_empty_condition_always_holds():
+    assert compile_condition("") is None
+    assert compile_condition("   ") is None
+    assert evaluate(None, {}) is True
+
+
+def test_compiled_conditions_are_shared():
+    condition = compile_condition("love > 1 && met_alice")
+    assert compile_condition(" love > 1 && met_alice ") is condition
+    assert condition.names == {"love", "met_alice"}
+
+
+@pytest.mark.parametrize("source, column", [
+    ("love >", 7),
+    ("love > > 1", 8),
+    ("__import__('os')", 1),
+    ("love.real > 1", 1),
+    ("x = 1", 3),
+])
+def test_errors_point_at_the_column(source, column):
+    with pytest.raises(ConditionError) as info:
+        compile_condition(source)
+    assert info.value.column == column
+    assert info.value.source == source
+
+
+@pytest.mark.parametrize("source", ["'a' * 1000000000", "[1] * 10", "'%s' % name"])
+def test_repetition_and_formatting_are_refused(source):
+    with pytest.raises(ConditionError):
+        compile_condition(source)
+
+
+def test_repetition_of_variables_is_false():
+    assert evaluate("name * 3 == 'aaa'", {"name": "a"}) is False
+    assert evaluate("count * 3 == 6", {"count": 2}) is True
+
+
+def test_invalid_condition_evaluates_false():
+    assert evaluate("love >", {"love": 5}) is False
+
+
+def test_cached_errors_are_fresh_exceptions():
+    errors = []
+    for _ in range(2):
+        with pytest.raises(ConditionError) as info:
+            compile_condition("love >")
+        errors.append(info.value)
+    assert errors[0] is not errors[1]
+    assert errors[0].message == errors[1].message
+    # Re-raising a cached exception would grow its traceback every time
+    assert _depth(errors[0]) == _depth(errors[1])
+
+
+def _depth(error):
+    depth, tb = 0, error.__traceback__
+    while tb is not None:
+        depth, tb = depth + 1, tb.tb_next
+    return depth
+
+
+def test_check_chapter_reports_locations():
+    chapter = {"events": [
+        {"type": "narration", "condition": "love > 1"},
+        {"type": "choice", "options": [
+            {"text": "a", "condition": "love >"},
+            {"text": "b", "actions": [{"type": "set_variable", "condition": 3}]},
+        ]},
+    ]}
+    problems = check_chapter(chapter)
+    assert [(p["event"], p["location"]) for p in problems] == [
+        (1, "events[1].options[0]"),
+        (1, "events[1].options[1].actions[0]"),
+    ]
+    assert problems[0]["column"] == 7
+    assert problems[1]["error"] == "condition must be a string"
@@ -0,0 +1,81 @@
+from src.services.workspace import workspace_watcher
+
+BROKEN_CHAPTER = """\
+events:
+- type: dialogue
+  character: Bob
+  text: hi
+
+- type: background
+  imagePath: missing.png
+
+- type: narration
+  text: maybe
+  condition: love >
+
+- type: chapter_end
+  end_type: linear
+  next_chapter: nowhere.yaml
+"""
+
+
+def lint(client, *chapters):
+    response = client.get("/api/analysis/s0/lint", params={"chapter": list(chapters)} if chapters else None)
+    assert response.status_code == 200
+    return response.json()
+
+
+def write_chapter(workspace, name, text):
+    path = workspace / "Chapters" / name
+    path.write_text(text, encoding="utf-8")
+    workspace_watcher.notify([path])
+
+
+def test_clean_script_has_no_issues(client, workspace):
+    result = lint(client)
+    assert result["chapters"] == 2
+    assert result["errors"] == result["warnings"] == 0
+
+
+def test_issues_name_rule_and_location(client, workspace):
+    write_chapter(workspace, "broken.yaml", BROKEN_CHAPTER)
+    result = lint(client, "broken.yaml")
+    assert result["chapters"] == 1
+    found = {(issue["rule"], issue["location"]) for issue in result["issues"]}
+    assert found == {
+        ("unknown_character", "events[0].character"),
+        ("missing_asset", "events[1].imagePath"),
+        ("condition", "events[2]"),
+        ("broken_link", "events[3].next_chapter"),
+    }
+    assert result["errors"] == 4
+
+
+def test_unknown_script_is_404(client, workspace):
+    assert client.get("/api/analysis/nope/lint").status_code == 404
+
+
+def test_only_changed_chapters_are_checked_again(client, workspace):
+    lint(client)
+    assert lint(client)["checked"] == 0
+
+    write_chapter(workspace, "intro.yaml", "events:\n- type: narration\n  text: changed\n")
+    assert lint(client)["checked"] == 1
+
+    # A chapter is checked again when a chapter it links to changes
+    write_chapter(workspace, "intro.yaml", "events:\n- type: chapter_end\n  next_chapter: sub/next.yaml\n")
+    lint(client)
+    write_chapter(workspace, "sub/next.yaml", "events:\n- type: narration\n  text: changed\n")
+    assert lint(client)["checked"] == 2
+
+
+def test_workspace_changes_recheck_dependent_chapters(client, workspace):
+    write_chapter(workspace, "broken.yaml", BROKEN_CHAPTER)
+    assert any(issue["rule"] == "unknown_character" for issue in lint(client)["issues"])
+
+    bob = workspace / "Characters" / "Bob"
+    bob.mkdir()
+    workspace_watcher.notify([bob])
+    result = lint(client)
+    assert result["checked"] == 1
+    assert not any(issue["rule"] == "unknown_character" for issue in result["issues"])
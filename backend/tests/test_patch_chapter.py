@@ -0,0 +1,68 @@
+URL = "/api/scripts/s0/chapters/intro.yaml"
+
+
+def events(client):
+    return client.get(URL).json()["events"]
+
+
+def patch(client, version, *operations):
+    return client.patch(URL, json={"base_version": version, "operations": list(operations)})
+
+
+def test_operations_apply_in_order(client, workspace):
+    before = events(client)
+    version = client.get(URL).headers["x-chapter-version"]
+    response = patch(
+        client, version,
+        {"op": "insert", "index": 0, "event": {"type": "narration", "text": "first"}},
+        {"op": "update", "index": 1, "event": {"type": "background", "imagePath": "other.png"}},
+        {"op": "move", "index": 0, "to": 2},
+        {"op": "delete", "index": len(before)},
+    )
+    assert response.status_code == 200
+    assert response.json()["total_events"] == len(before)
+
+    after = events(client)
+    assert after[0] == {"type": "background", "imagePath": "other.png"}
+    assert after[2] == {"type": "narration", "text": "first"}
+    assert after[1] == before[1]
+    assert after[-1] == before[-2]
+
+
+def test_version_is_returned_and_required(client, workspace):
+    version = client.get(URL).headers["x-chapter-version"]
+    first = patch(client, version, {"op": "delete", "index": 0})
+    assert first.status_code == 200
+    assert client.get(URL).headers["x-chapter-version"] == first.json()["version"]
+
+    stale = patch(client, version, {"op": "delete", "index": 0})
+    assert stale.status_code == 409
+    assert stale.json()["detail"]["version"] == first.json()["version"]
+
+
+def test_bad_operation_changes_nothing(client, workspace):
+    before = events(client)
+    version = client.get(URL).headers["x-chapter-version"]
+    response = patch(
+        client, version,
+        {"op": "delete", "index": 0},
+        {"op": "move", "index": 0, "to": 99},
+    )
+    assert response.status_code == 400
+    assert "Operation 1" in response.json()["detail"]
+    assert events(client) == before
+    assert client.get(URL).headers["x-chapter-version"] == version
+
+
+def test_insert_and_update_need_an_event(client, workspace):
+    version = client.get(URL).headers["x-chapter-version"]
+    assert patch(client, version, {"op": "insert", "index": 0}).status_code == 400
+    assert patch(client, version, {"op": "update", "index": 99, "event": {"type": "narration"}}).status_code == 400
+
+
+def test_patched_chapter_is_written(client, workspace):
+    version = client.get(URL).headers["x-chapter-version"]
+    patch(client, version, {"op": "update", "index": 0, "event": {"type": "narration", "text": "new"}})
+    assert client.post("/api/scripts/flush").status_code == 200
+    text = (workspace / "Chapters" / "intro.yaml").read_text(encoding="utf-8")
+    assert text.startswith("events:\n- type: narration\n  text: new\n\n- type: music\n")
@@ -0,0 +1,58 @@
+import shutil
+
+import pytest
+
+from src.services.preview_manifest import preview_manifests
+from src.services.workspace import workspace_watcher
+
+PIL = pytest.importorskip("PIL.Image")
+
+
+def add_avatar(script_dir, character, emotion, color):
+    avatar_dir = script_dir / "Characters" / character / "avatar"
+    avatar_dir.mkdir(parents=True, exist_ok=True)
+    PIL.new("RGBA", (8, 16), color).save(avatar_dir / f"{emotion}.png")
+    workspace_watcher.notify([avatar_dir])
+
+
+def test_atlas_sheet_is_served_for_its_character(client, workspace):
+    add_avatar(workspace, "Alice", "正常", (255, 0, 0, 255))
+    add_avatar(workspace, "Bob", "正常", (0, 0, 255, 255))
+    frame_map = client.get("/api/preview/s0/atlas/Alice", params={"height": 16}).json()
+    sheet_url = frame_map["image"].partition("?")[0]
+    assert client.get(sheet_url).status_code == 200
+
+    sheet_name = sheet_url.rpartition("/")[2]
+    assert client.get(f"/api/preview/s0/atlas/Bob/{sheet_name}").status_code == 404
+
+
+def test_atlas_sheet_is_not_served_under_another_script(client, workspace):
+    add_avatar(workspace, "Alice", "正常", (255, 0, 0, 255))
+    shutil.copytree(workspace, workspace.parent / "s1")
+    workspace_watcher.notify([workspace.parent / "s1"])
+    sheet_url = client.get("/api/preview/s0/atlas/Alice", params={"height": 16}).json()["image"].partition("?")[0]
+    assert client.get(sheet_url.replace("/s0/", "/s1/")).status_code == 404
+
+    # Once s1 builds the same atlas, the shared sheet is its own as well
+    client.get("/api/preview/s1/atlas/Alice", params={"height": 16})
+    assert client.get(sheet_url.replace("/s0/", "/s1/")).status_code == 200
+
+
+def test_unknown_sheet_is_404(client, workspace):
+    assert client.get("/api/preview/s0/atlas/Alice/0123abcd.png").status_code == 404
+    assert client.get("/api/preview/s0/atlas/Alice/0123abcd.gif").status_code == 404
+
+
+def test_lazy_preview_of_a_removed_script_is_404(client, workspace, monkeypatch):
+    version = client.get("/api/preview/s0/data").json()["version"]
+    get = preview_manifests.get
+
+    def removed_after_first_read(script_id, since=None, sections=None):
+        if sections == ("config",):
+            # The script is removed between the two reads of the lazy preview
+            return None
+        return get(script_id, since, sections)
+
+    monkeypatch.setattr(preview_manifests, "get", removed_after_first_read)
+    response = client.get("/api/preview/s0/data", params={"lazy": True, "since": version})
+    assert response.status_code == 404
@@ -0,0 +1,75 @@
+from src.services.search_index import literal_terms, query_terms, tokenize
+from src.services.workspace import workspace_watcher
+
+CHOICE_CHAPTER = """\
+events:
+- type: narration
+  text: 你好世界
+
+- type: choice
+  options:
+  - text: Greet Alice warmly
+  - text: Leave
+
+- type: dialogue
+  character: Alice
+  text: Alice says hello to Alice
+"""
+
+
+def search(client, q, **params):
+    response = client.get("/api/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+def add_chapter(workspace, name, text):
+    path = workspace / "Chapters" / name
+    path.write_text(text, encoding="utf-8")
+    workspace_watcher.notify([path])
+
+
+def test_tokenize_splits_words_and_cjk():
+    assert tokenize("Hello, World_2") == ["hello", "world", "2"]
+    assert tokenize("你好世") == ["你", "好", "世", "你好", "好世"]
+    assert query_terms("你好 hello hello") == ["你好", "hello"]
+    assert query_terms("你") == ["你"]
+
+
+def test_literal_terms_use_trigrams_for_cut_off_words():
+    # "lice say" may be the end of "Alice" and the start of "says"
+    assert literal_terms("lice say") == ["#lic", "#ice", "#say"]
+    assert literal_terms("a hello b") == ["hello"]
+    assert literal_terms("lice say", whole_value=True) == ["lice", "say"]
+    assert literal_terms("!!") == []
+
+
+def test_every_term_must_match(client, workspace):
+    result = search(client, "hello alice")
+    assert [(r["chapter"], r["event"], r["field"]) for r in result["results"]] == [("intro.yaml", 2, "text")]
+    assert search(client, "hello nobody")["total"] == 0
+
+
+def test_results_are_ranked_and_point_at_events(client, workspace):
+    add_chapter(workspace, "choice.yaml", CHOICE_CHAPTER)
+    result = search(client, "alice", script="s0")
+    assert result["total"] == 3
+    # The event naming Alice twice comes first
+    assert result["results"][0]["chapter"] == "choice.yaml"
+    assert result["results"][0]["event"] == 2
+    options = [r for r in result["results"] if r["type"] == "choice"]
+    assert options[0]["field"] == "options[0]"
+
+    assert search(client, "世界")["results"][0]["text"] == "你好世界"
+    assert len(search(client, "alice", limit=1, offset=1)["results"]) == 1
+
+
+def test_index_follows_changes(client, workspace):
+    assert search(client, "goodbye")["total"] == 0
+    add_chapter(workspace, "intro.yaml", "events:\n- type: narration\n  text: goodbye\n")
+    assert search(client, "goodbye")["total"] == 1
+    assert search(client, "hello")["total"] == 0
+
+
+def test_unknown_script_is_404(client, workspace):
+    assert client.get("/api/search", params={"q": "hello", "script": "nope"}).status_code == 404
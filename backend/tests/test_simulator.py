@@ -0,0 +1,37 @@
+from src.services.simulator import assigned_value, literal_value
+from src.services.workspace import workspace_watcher
+
+LIST_VALUE_CHAPTER = """\
+events:
+- type: set_variable
+  name: items
+  value: '[1, 2]'
+- type: set_variable
+  name: pair
+  value: (love, 2)
+- type: narration
+  text: done
+"""
+
+
+def test_expressions_are_evaluated():
+    assert assigned_value(literal_value("love + 1"), {"love": 2}) == 3
+    assert assigned_value(literal_value("'a' + name"), {"name": "b"}) == "ab"
+
+
+def test_unset_variables_keep_the_text():
+    assert assigned_value(literal_value("love + 1"), {}) == "love + 1"
+
+
+def test_non_scalar_results_keep_the_text():
+    assert assigned_value(literal_value("[1, 2]"), {}) == "[1, 2]"
+    assert assigned_value(literal_value("(love, 2)"), {"love": 1}) == "(love, 2)"
+
+
+def test_simulate_with_list_valued_set_variable(client, workspace):
+    (workspace / "Chapters" / "intro.yaml").write_text(LIST_VALUE_CHAPTER, encoding="utf-8")
+    workspace_watcher.notify([workspace / "Chapters" / "intro.yaml"])
+
+    response = client.get("/api/analysis/s0/simulate")
+    assert response.status_code == 200
+    assert [ending["kind"] for ending in response.json()["endings"]] == ["dead_end"]
@@ -0,0 +1,139 @@
+import gzip
+import os
+
+import pytest
+
+from src.services.workspace import workspace_watcher
+
+TEXT = "line of text\n" * 200
+
+
+@pytest.fixture
+def text_asset(workspace):
+    """Assets/notes.txt with .gz and .br siblings."""
+    path = workspace / "Assets" / "notes.txt"
+    path.write_text(TEXT, encoding="utf-8")
+    path.with_name("notes.txt.gz").write_bytes(gzip.compress(TEXT.encode()))
+    # Never decoded by the server, so any bytes do
+    path.with_name("notes.txt.br").write_bytes(b"brotli bytes")
+    workspace_watcher.notify([path.parent])
+    return path
+
+
+def raw_get(client, url, **headers):
+    """Status, headers and undecoded body of a GET."""
+    with client.stream("GET", url, headers=headers) as response:
+        return response.status_code, response.headers, b"".join(response.iter_raw())
+
+
+def test_plain_url_revalidates(client, workspace):
+    status, headers, body = raw_get(client, "/api/preview/s0/assets/Musics/bgm.mp3", **{"accept-encoding": "identity"})
+    assert status == 200
+    assert body == (workspace / "Assets" / "Musics" / "bgm.mp3").read_bytes()
+    assert headers["cache-control"] == "no-cache"
+    assert headers["etag"].startswith('"')
+
+
+def test_if_none_match_returns_304(client, workspace):
+    url = "/api/preview/s0/assets/Musics/bgm.mp3"
+    etag = client.get(url).headers["etag"]
+    status, headers, body = raw_get(client, url, **{"if-none-match": etag})
+    assert status == 304
+    assert body == b""
+    assert headers["etag"] == etag
+
+
+def test_edited_file_gets_a_new_etag(client, workspace):
+    url = "/api/preview/s0/assets/Musics/bgm.mp3"
+    etag = client.get(url).headers["etag"]
+    path = workspace / "Assets" / "Musics" / "bgm.mp3"
+    path.write_bytes(b"changed")
+    os.utime(path, ns=(path.stat().st_mtime_ns + 10**9,) * 2)
+    response = client.get(url, headers={"if-none-match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_versioned_url_is_immutable_only_for_current_content(client, workspace):
+    url = "/api/preview/s0/assets/Musics/bgm.mp3"
+    digest = client.get(url).headers["etag"].strip('"')
+    assert client.get(f"{url}?v={digest}").headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert client.get(f"{url}?v=0000").headers["cache-control"] == "no-cache"
+
+
+def test_versioned_urls_in_preview_data(client, workspace):
+    assets = client.get("/api/preview/s0/data").json()["assets"]
+    url = assets["Musics/bgm.mp3"]
+    assert "?v=" in url
+    assert client.get(url).headers["cache-control"] == "public, max-age=31536000, immutable"
+
+
+def test_range_returns_206(client, workspace):
+    data = (workspace / "Assets" / "Musics" / "bgm.mp3").read_bytes()
+    status, headers, body = raw_get(client, "/api/preview/s0/assets/Musics/bgm.mp3", range="bytes=10-19")
+    assert status == 206
+    assert body == data[10:20]
+    assert headers["content-range"] == f"bytes 10-19/{len(data)}"
+
+
+def test_open_ended_and_suffix_ranges(client, workspace):
+    data = (workspace / "Assets" / "Musics" / "bgm.mp3").read_bytes()
+    url = "/api/preview/s0/assets/Musics/bgm.mp3"
+    assert raw_get(client, url, range=f"bytes={len(data) - 5}-")[2] == data[-5:]
+    assert raw_get(client, url, range="bytes=-7")[2] == data[-7:]
+
+
+def test_unsatisfiable_range(client, workspace):
+    status, _, _ = raw_get(client, "/api/preview/s0/assets/Musics/bgm.mp3", range="bytes=999999-")
+    assert status == 416
+
+
+def test_gzip_sibling_is_served_when_accepted(client, text_asset):
+    status, headers, body = raw_get(client, "/api/preview/s0/assets/notes.txt", **{"accept-encoding": "gzip"})
+    assert status == 200
+    assert headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in headers["vary"]
+    assert headers["etag"].endswith('-gzip"')
+    assert gzip.decompress(body).decode() == TEXT
+
+
+def test_brotli_is_preferred(client, text_asset):
+    status, headers, body = raw_get(client, "/api/preview/s0/assets/notes.txt", **{"accept-encoding": "gzip, br"})
+    assert headers["content-encoding"] == "br"
+    assert body == b"brotli bytes"
+
+
+def test_refused_coding_is_skipped(client, text_asset):
+    _, headers, body = raw_get(client, "/api/preview/s0/assets/notes.txt", **{"accept-encoding": "br;q=0, gzip"})
+    assert headers["content-encoding"] == "gzip"
+    _, headers, body = raw_get(client, "/api/preview/s0/assets/notes.txt", **{"accept-encoding": "identity"})
+    assert "content-encoding" not in headers
+    assert body.decode() == TEXT
+
+
+def test_range_skips_compressed_siblings(client, text_asset):
+    status, headers, body = raw_get(client, "/api/preview/s0/assets/notes.txt",
+                                    **{"accept-encoding": "gzip, br", "range": "bytes=0-3"})
+    assert status == 206
+    assert "content-encoding" not in headers
+    assert body == TEXT[:4].encode()
+
+
+def test_stale_sibling_is_skipped(client, text_asset):
+    mtime = text_asset.stat().st_mtime_ns
+    for suffix in (".gz", ".br"):
+        sibling = text_asset.with_name(text_asset.name + suffix)
+        os.utime(sibling, ns=(mtime - 10**9, mtime - 10**9))
+    _, headers, body = raw_get(client, "/api/preview/s0/assets/notes.txt", **{"accept-encoding": "gzip, br"})
+    assert "content-encoding" not in headers
+    assert body.decode() == TEXT
+
+
+def test_compressed_etag_revalidates(client, text_asset):
+    url = "/api/preview/s0/assets/notes.txt"
+    etag = raw_get(client, url, **{"accept-encoding": "gzip"})[1]["etag"]
+    status, headers, _ = raw_get(client, url, **{"accept-encoding": "gzip", "if-none-match": etag})
+    assert status == 304
+    assert headers["content-encoding"] == "gzip"
+    # The identity ETag differs, so it does not revalidate the gzip body
+    assert raw_get(client, url, **{"accept-encoding": "identity", "if-none-match": etag})[0] == 200
@@ -0,0 +1,24 @@
+from pathlib import Path
+
+from src.services.workspace import BASE_DIR, workspace_watcher
+
+
+def test_workspace_is_outside_the_source_tree():
+    assert Path(__file__).resolve().parent.parent not in BASE_DIR.resolve().parents
+
+
+def test_lists_fixture_script(client, workspace):
+    scripts = client.get("/api/scripts/").json()
+    assert [script["id"] for script in scripts] == ["s0"]
+
+
+def test_fixture_is_rebuilt_for_each_test(client, workspace):
+    (workspace / "Chapters" / "extra.yaml").write_text("events: []\n", encoding="utf-8")
+    workspace_watcher.notify([workspace / "Chapters" / "extra.yaml"])
+    chapters = client.get("/api/scripts/s0/chapters").json()
+    assert "extra.yaml" in chapters
+
+
+def test_fixture_starts_clean(client, workspace):
+    chapters = client.get("/api/scripts/s0/chapters").json()
+    assert "extra.yaml" not in chapters
@@ -0,0 +1,133 @@
+"""
+Parity of the libyaml and pure-Python YAML paths
+Whatever backend is installed, scripts and chapters must be written
+byte-for-byte the same way; these cases pin the corner cases the
+portability check in yaml_io exists for
+"""
+import io
+import random
+
+import pytest
+
+from src.services import yaml_io
+from src.services.chapter_emitter import ChapterDumper, PureChapterDumper, write_chapter
+
+needs_libyaml = pytest.mark.skipif(not yaml_io.LIBYAML, reason="PyYAML built without libyaml")
+
+STRINGS = [
+    "plain",
+    "你好，世界",
+    "第一行\n第二行",
+    "line\n",
+    "line\n\n",
+    "\n",
+    "trailing space ",
+    "trailing space \nnext",
+    "inner  \n  indented",
+    "  leading",
+    "tab\there",
+    "bell\x07",
+    "nel\x85line",
+    "ls\u2028ps\u2029",
+    "emoji \U0001f600",
+    "bom\ufeff",
+    "quote's \"double\"",
+    "colon: value",
+    "- dash",
+    "# hash",
+    "yes",
+    "null",
+    "1.5",
+    "",
+    "x" * 200,
+    "很长的一句话" * 40,
+    "mixed 中文 and English\n带\t制表符\n",
+]
+
+
+def pure_dump(data):
+    return yaml_io.dump(data, dumper=yaml_io.PureDumper)
+
+
+def emit(chapter, dumper):
+    out = io.StringIO()
+    write_chapter(chapter, out, dumper=dumper)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("value", STRINGS)
+def test_dump_matches_pure_python(value):
+    data = {"text": value, "list": [value], value or "empty": 1}
+    assert yaml_io.dump(data) == pure_dump(data)
+
+
+# YAML 1.1 reads these as line breaks whichever backend wrote them
+LINE_BREAKS = ("\x85", "\u2028", "\u2029")
+
+
+@pytest.mark.parametrize("value", [s for s in STRINGS if not any(c in s for c in LINE_BREAKS)])
+def test_round_trip(value):
+    data = {"events": [{"type": "narration", "text": value}]}
+    assert yaml_io.load(yaml_io.dump(data)) == data
+
+
+@needs_libyaml
+@pytest.mark.parametrize("value", STRINGS)
+def test_portable_strings_emit_identically(value):
+    data = {"text": value, "options": [value]}
+    if yaml_io.emits_identically(data):
+        assert yaml_io.dump(data, dumper=yaml_io.Dumper) == pure_dump(data)
+
+
+def test_multiline_uses_literal_block():
+    assert yaml_io.dump({"text": "a\nb"}) == "text: |-\n  a\n  b\n"
+
+
+def test_blank_line_between_events():
+    chapter = {"events": [
+        {"type": "narration", "text": "一\n二"},
+        {"type": "choices", "options": [{"text": "A"}, {"text": "B"}]},
+        {"type": "chapter_end", "end_type": "linear", "next_chapter": "end"},
+    ]}
+    text = emit(chapter, ChapterDumper if yaml_io.LIBYAML else PureChapterDumper)
+    assert text == emit(chapter, PureChapterDumper)
+    assert text == (
+        "events:\n"
+        "- type: narration\n"
+        "  text: |-\n"
+        "    一\n"
+        "    二\n"
+        "\n"
+        "- type: choices\n"
+        "  options:\n"
+        "  - text: A\n"
+        "  - text: B\n"
+        "\n"
+        "- type: chapter_end\n"
+        "  end_type: linear\n"
+        "  next_chapter: end\n"
+    )
+
+
+def test_emitter_drops_empty_fields():
+    chapter = {"events": [{"type": "narration", "text": "x", "duration": "0", "condition": None}]}
+    out = io.StringIO()
+    cleaned = write_chapter(chapter, out)
+    assert cleaned == {"events": [{"type": "narration", "text": "x"}]}
+    assert yaml_io.load(out.getvalue()) == cleaned
+
+
+@needs_libyaml
+def test_random_chapters_match_pure_python():
+    rng = random.Random(20240601)
+    alphabet = "abc 中文，。！\n\t:-#'\"\\\x07\x85\u2028\U0001f600\ufeff"
+    for _ in range(300):
+        def text():
+            return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 24)))
+        chapter = {"events": [
+            {"type": rng.choice(["narration", "dialogue"]), "character": text(), "text": text(),
+             "duration": rng.choice([None, 0, 1.5, "2"])}
+            for _ in range(rng.randint(1, 6))
+        ]}
+        assert emit(chapter, None) == emit(chapter, PureChapterDumper)
+        assert yaml_io.dump(chapter) == pure_dump(chapter)